@@ -34,323 +34,84 @@
 #***********************************************************
 
 from __future__ import print_function
-from bluetooth import *
-import select
-import fcntl
 import os
 import time
 import sys                    
-import traceback
-import subprocess
-
-L2CAP_PSM_HIDP_CTRL = 17
-L2CAP_PSM_HIDP_INTR = 19
-
-class uinput:
-    EV_KEY = 1
-    EV_REL = 2
-    EV_ABS = 3
-    BUS_USB = 3
-    ABS_MAX = 0x3f
-
-class uinputjoy:
-    def open_uinput(self):
-        for name in ["/dev/input/uinput", "/dev/misc/uinput", "/dev/uinput"]:
-            try:
-                return os.open(name, os.O_WRONLY)
-                break
-            except Exception as e:
-                #print >> sys.stderr, "Error opening uinput: %s"%str(e)
-                pass
-        return None
-
-    def __init__(self, buttons, axes, axmin, axmax, axfuzz, axflat):
-        self.file = self.open_uinput()
-        if self.file == None:
-            print("Trying to modprobe uinput.", file=sys.stderr)
-            os.system("modprobe uinput > /dev/null 2>&1")
-            time.sleep(1) # uinput isn't ready to go right away.
-            self.file = self.open_uinput()
-            if self.file == None:
-                print("Can't open uinput device. Is it accessible by this user? Did you mean to run as root?", file=sys.stderr)
-                raise IOError
-        #id = uinput.input_id()
-        #id.bustype = uinput.BUS_USB
-        #id.vendor = 0x054C
-        #id.product = 0x0268
-        #id.version = 0
-        #info = uinput.uinput_user_dev()
-        #info.name = "Sony Playstation SixAxis/DS3"
-        #info.id = id
-        
-        UI_SET_EVBIT   = 0x40045564
-        UI_SET_KEYBIT  = 0x40045565
-        UI_SET_RELBIT  = 0x40045566
-        UI_DEV_CREATE  = 0x5501
-        UI_SET_RELBIT  = 0x40045566
-        UI_SET_ABSBIT  = 0x40045567
-        uinput_user_dev = "80sHHHHi" + (uinput.ABS_MAX+1)*4*'i'
-
-        if len(axes) != len(axmin) or len(axes) != len(axmax):
-            raise Exception("uinputjoy.__init__: axes, axmin and axmax should have same length")
-        absmin = [0] * (uinput.ABS_MAX+1)
-        absmax = [0] * (uinput.ABS_MAX+1)
-        absfuzz = [2] * (uinput.ABS_MAX+1)
-        absflat = [4] * (uinput.ABS_MAX+1)
-        for i in range(0, len(axes)):
-            absmin[axes[i]] = axmin[i]
-            absmax[axes[i]] = axmax[i]
-            absfuzz[axes[i]] = axfuzz[i]
-            absflat[axes[i]] = axflat[i]
-
-        os.write(self.file, struct.pack(uinput_user_dev, "Sony Playstation SixAxis/DS3",
-            uinput.BUS_USB, 0x054C, 0x0268, 0, 0, *(absmax + absmin + absfuzz + absflat)))
-
-        fcntl.ioctl(self.file, UI_SET_EVBIT, uinput.EV_KEY)
-        
-        for b in buttons:
-            fcntl.ioctl(self.file, UI_SET_KEYBIT, b)
-        
-        for a in axes:
-            fcntl.ioctl(self.file, UI_SET_EVBIT, uinput.EV_ABS)
-            fcntl.ioctl(self.file, UI_SET_ABSBIT, a)
-        
-        fcntl.ioctl(self.file, UI_DEV_CREATE)
-
-        self.value = [None] * (len(buttons) + len(axes))
-        self.type = [uinput.EV_KEY] * len(buttons) + [uinput.EV_ABS] * len(axes)
-        self.code = buttons + axes
-    
-    def update(self, value):
-        input_event = "LLHHi"
-        t = time.time()
-        th = int(t)
-        tl = int((t - th) * 1000000)
-        if len(value) != len(self.value):
-            print("Unexpected length for value in update (%i instead of %i). This is a bug."%(len(value), len(self.value)), file=sys.stderr)
-        for i in range(0, len(value)):
-            if value[i] != self.value[i]:
-                os.write(self.file, struct.pack(input_event, th, tl, self.type[i], self.code[i], value[i]))
-        self.value = list(value)
-
-class BadJoystickException(Exception):
-    def __init__(self):
-        Exception.__init__(self, "Unsupported joystick.")
-
-class decoder:
-    def __init__(self, inactivity_timeout = float(1e3000), continuous_motion_output = False):
-        #buttons=[uinput.BTN_SELECT, uinput.BTN_THUMBL, uinput.BTN_THUMBR, uinput.BTN_START, 
-        #         uinput.BTN_FORWARD, uinput.BTN_RIGHT, uinput.BTN_BACK, uinput.BTN_LEFT, 
-        #         uinput.BTN_TL, uinput.BTN_TR, uinput.BTN_TL2, uinput.BTN_TR2,
-        #         uinput.BTN_X, uinput.BTN_A, uinput.BTN_B, uinput.BTN_Y,
-        #         uinput.BTN_MODE]
-        #axes=[uinput.ABS_X, uinput.ABS_Y, uinput.ABS_Z, uinput.ABS_RX,
-        #         uinput.ABS_RX, uinput.ABS_RY, uinput.ABS_PRESSURE, uinput.ABS_DISTANCE,
-        #         uinput.ABS_THROTTLE, uinput.ABS_RUDDER, uinput.ABS_WHEEL, uinput.ABS_GAS,
-        #         uinput.ABS_HAT0Y, uinput.ABS_HAT1Y, uinput.ABS_HAT2Y, uinput.ABS_HAT3Y,
-        #         uinput.ABS_TILT_X, uinput.ABS_TILT_Y, uinput.ABS_MISC, uinput.ABS_RZ,
-        #         ]
-        buttons = range(0x100,0x111)
-        axes = range(0, 20)
-        axmin = [0] * 20
-        axmax = [255] * 20
-        axfuzz = [2] * 20
-        axflat = [4] * 20
-        for i in range(-4,0): # Gyros have more bits than other axes
-            axmax[i] = 1023
-            axfuzz[i] = 4
-            axflat[i] = 4
-            if continuous_motion_output:
-              axfuzz[i] = 0
-              axflat[i] = 0
-        for i in range(4,len(axmin)-4): # Buttons should be zero when not pressed
-            axmin[i] = -axmax[i]
-        self.joy = uinputjoy(buttons, axes, axmin, axmax, axfuzz, axflat)
-        self.axmid = [sum(pair)/2 for pair in zip(axmin, axmax)]
-        self.fullstop() # Probably useless because of uinput startup bug
-        self.outlen = len(buttons) + len(axes)           
-        self.inactivity_timeout = inactivity_timeout
-
-    step_active = 1
-    step_idle = 2
-    step_error = 3
-
-    def step(self, rawdata): # Returns true if the packet was legal
-        if len(rawdata) == 50:
-            joy_coding = "!1B2x3B1x4B4x12B15x4H"
-            data = list(struct.unpack(joy_coding, rawdata))
-            prefix = data.pop(0)
-            if prefix != 161:
-                print("Unexpected prefix (%i). Is this a PS3 Dual Shock or Six Axis?"%prefix, file=sys.stderr)
-                return self.step_error
-            out = []
-            for j in range(0,2): # Split out the buttons.
-                curbyte = data.pop(0)
-                for k in range(0,8):
-                    out.append(int((curbyte & (1 << k)) != 0))
-            out = out + data
-            self.joy.update(out)
-            axis_motion = [abs(out[17:][i] - self.axmid[i]) > 20 for i in range(0,len(out)-17-4)]  
-                                                                       # 17 buttons, 4 inertial sensors
-            if any(out[0:17]) or any(axis_motion):
-                return self.step_active
-            return self.step_idle
-        elif len(rawdata) == 13:
-            #print list(rawdata)
-            print("Your bluetooth adapter is not supported. Does it support Bluetooth 2.0? Please report its model to blaise@willowgarage.com", file=sys.stderr)
-            raise BadJoystickException()
-        else:
-            print("Unexpected packet length (%i). Is this a PS3 Dual Shock or Six Axis?"%len(rawdata), file=sys.stderr)
-            return self.step_error
-
-    def fullstop(self):
-        self.joy.update([0] * 17 + self.axmid)
+from ps3joy_core.capture import open_capture
+from ps3joy_core.device import axis_config, decoder_core, uinput_output, open_ring
+from ps3joy_core.hci import adapter_monitor, hci_adapter
+from ps3joy_core import multiplexer
+
+class decoder(decoder_core):
+    def __init__(self, inactivity_timeout = float(1e3000), continuous_motion_output = False,
+                 capture = None, event_file = None, userspace_filter = False, ring = None):
+        # capture: report_writer logging every received report.
+        # event_file: file descriptor taking the events instead of a new uinput device.
+        # userspace_filter: apply axfuzz before writing events instead of in the kernel.
+        # ring: ring_output sharing the frames with local readers, in addition to uinput.
+        axes = axis_config(continuous_motion_output)
+        self.uinput = uinput_output(axes, event_file, userspace_filter)
+        self.joy = self.uinput.joy
+        outputs = [self.uinput]
+        if ring is not None:
+            outputs.append(ring)
+        decoder_core.__init__(self, outputs, axes, inactivity_timeout, capture,
+                              on_activated = self.activated)
+
+    def activated(self, ctrl):
+        print("Connection activated")
 
     def run(self, intr, ctrl):
-        activated = False
-        try:
-            self.fullstop()
-            lastactivitytime = lastvalidtime = time.time()
-            while True:
-                (rd, wr, err) = select.select([intr], [], [], 0.1)
-                curtime = time.time()
-                if len(rd) + len(wr) + len(err) == 0: # Timeout
-                    #print "Activating connection."
-                    ctrl.send("\x53\xf4\x42\x03\x00\x00") # Try activating the stream.
-                else: # Got a frame.
-                    #print "Got a frame at ", curtime, 1 / (curtime - lastvalidtime)
-                    if not activated:
-                        print("Connection activated")
-                        activated = True
-                    try:
-                        rawdata = intr.recv(128)
-                    except BluetoothError as s:
-                        print("Got Bluetooth error %s. Disconnecting."%s)
-                        return
-                    if len(rawdata) == 0: # Orderly shutdown of socket
-                        print("Joystick shut down the connection, battery may be discharged.")
-                        return
-                    stepout = self.step(rawdata)
-                    if stepout != self.step_error:
-                        lastvalidtime = curtime
-                    if stepout == self.step_active:
-                        lastactivitytime = curtime
-                if curtime - lastactivitytime > self.inactivity_timeout:
-                    print("Joystick inactive for %.0f seconds. Disconnecting to save battery."%self.inactivity_timeout)
-                    return
-                if curtime - lastvalidtime >= 0.1: # Zero all outputs if we don't hear a valid frame for 0.1 to 0.2 seconds
-                    self.fullstop()
-                if curtime - lastvalidtime >= 5: # Disconnect if we don't hear a valid frame for 5 seconds
-                    print("No valid data for 5 seconds. Disconnecting. This should not happen, please report it.")
-                    return
-                time.sleep(0.005) # No need to blaze through the loop when there is an error
-        finally:
-            self.fullstop()
+        self.receiver.run(intr, ctrl)
+        self.print_stats()
+
+    def print_stats(self):
+        stats = self.receiver.stats
+        print("Received %i packets (%i invalid), mean latency %.3f ms, max %.3f ms."%(
+            stats.packets, stats.invalid, stats.latency_mean() * 1000., stats.latency_max * 1000.))
+        events = self.joy.events
+        if events.filters:
+            print("Wrote %i events, suppressed %i."%(events.events, events.suppressed))
 
 class Quit(Exception):
     def __init__(self, errorcode):
         Exception.__init__(self)
         self.errorcode = errorcode
 
+hci = adapter_monitor(hci_adapter(0))
+
 def check_hci_status():
     # Check if hci0 is up and pscanning, take action as necessary.
-    proc = subprocess.Popen(['hciconfig'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (out, err) = proc.communicate()
-    if out.find('UP') == -1:
-        os.system("hciconfig hci0 up > /dev/null 2>&1")
-    if out.find('PSCAN') == -1:
-        os.system("hciconfig hci0 pscan > /dev/null 2>&1")   
-
-class connection_manager:
-    def __init__(self, decoder):
-        self.decoder = decoder
-        self.shutdown = False
-
-    def prepare_bluetooth_socket(self, port):
-        sock = BluetoothSocket(L2CAP)
-        return self.prepare_socket(sock, port)
-
-    def prepare_net_socket(self, port):
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        return self.prepare_socket(sock, port)
+    hci.check()
 
-    def prepare_socket(self, sock, port):
-        first_loop = True
-        while True:
-            try:
-                sock.bind(("", port))
-            except Exception as e:
-                print(repr(e))
-                if first_loop:
-                    print("Error binding to socket, will retry every 5 seconds. Do you have another ps3joy.py running? This error occurs on some distributions (such as Ubuntu Karmic). Please read http://www.ros.org/wiki/ps3joy/Troubleshooting for solutions.", file=sys.stderr)
-                first_loop = False
-                time.sleep(0.5)
-                continue 
-            sock.listen(1)
-            return sock
+class connection_manager(multiplexer.connection_manager):
+    def __init__(self, decoder, make_decoder = None, max_controllers = 1):
+        multiplexer.connection_manager.__init__(self, decoder, make_decoder, max_controllers,
+                                                on_idle = check_hci_status)
 
-    def listen_net(self,intr_port, ctrl_port):
-        intr_sock = self.prepare_net_socket(intr_port)
-        ctrl_sock = self.prepare_net_socket(ctrl_port)
-        self.listen(intr_sock, ctrl_sock)
+    def closed(self, address, reason):
+        decoder = multiplexer.connection_manager.closed(self, address, reason)
+        if decoder is not None:
+            decoder.print_stats()
 
-    def listen_bluetooth(self):
-        intr_sock = self.prepare_bluetooth_socket(L2CAP_PSM_HIDP_INTR)
-        ctrl_sock = self.prepare_bluetooth_socket(L2CAP_PSM_HIDP_CTRL)
-        self.listen(intr_sock, ctrl_sock)
-    
-    def listen(self, intr_sock, ctrl_sock):
-        self.n = 0
-        while not self.shutdown:
-            print("Waiting for connection. Disconnect your PS3 joystick from USB and press the pairing button.")
-            try:
-                intr_sock.settimeout(5)
-                ctrl_sock.settimeout(1)
-                while True:
-                    try:
-                        (intr, (idev, iport)) = intr_sock.accept();
-                        break
-                    except Exception as e:
-                        if str(e) == 'timed out':
-                            check_hci_status()
-                        else:
-                            raise
-                    
-                try:
-                    try:
-                        (ctrl, (cdev, cport)) = ctrl_sock.accept();
-                    except Exception as e:
-                        print("Got interrupt connection without control connection. Giving up on it.", file=sys.stderr)
-                        continue
-                    try:
-                        if idev == cdev:
-                            self.decoder.run(intr, ctrl)
-                            print("Connection terminated.")
-                        else:
-                            print("Simultaneous connection from two different devices. Ignoring both.", file=sys.stderr)
-                    finally:
-                        ctrl.close()
-                finally:
-                    intr.close()        
-            except BadJoystickException:
-                pass
-            except KeyboardInterrupt:
-                print("CTRL+C detected. Exiting.")
-                quit(0)
-            except Exception as e:
-                traceback.print_exc()
-                print("Caught exception: %s"%str(e), file=sys.stderr)
-                time.sleep(1)
-            print()
-                    
 inactivity_timout_string = "--inactivity-timeout"
 no_disable_bluetoothd_string = "--no-disable-bluetoothd"
 redirect_output_string = "--redirect-output"
 continuous_motion_output_string = "--continuous-output"
+max_controllers_string = "--max-controllers"
+asyncio_string = "--asyncio"
+capture_string = "--capture"
+userspace_filter_string = "--userspace-filter"
+shm_ring_string = "--shm-ring"
                     
 def usage(errcode):
-    print("usage: ps3joy.py ["+inactivity_timout_string+"=<n>] ["+no_disable_bluetoothd_string+"] ["+redirect_output_string+"] ["+continuous_motion_output_string+"]=<f>")
+    print("usage: ps3joy.py ["+inactivity_timout_string+"=<n>] ["+max_controllers_string+"=<m>] ["+asyncio_string+"] ["+capture_string+"=<c>] ["+userspace_filter_string+"] ["+shm_ring_string+"=<r>] ["+no_disable_bluetoothd_string+"] ["+redirect_output_string+"] ["+continuous_motion_output_string+"]=<f>")
     print("<n>: inactivity timeout in seconds (saves battery life).")
+    print("<m>: number of joysticks to serve at once, each with its own device (default 1).")
+    print(asyncio_string+" runs all connections as coroutines on one asyncio event loop (Python 3 only).")
+    print("<c>: file to append raw reports to, for ps3joy_replay.py; joystick i > 0 uses <c>.i.")
+    print(userspace_filter_string+" drops axis jitter before writing events, instead of in the kernel.")
+    print("<r>: shared-memory ring to also write the frames to, such as /dev/shm/ps3joy; joystick i > 0 uses <r>.i.")
     print("<f>: file name to redirect output to.")
     print("Unless "+no_disable_bluetoothd_string+" is specified, bluetoothd will be stopped.")
     raise Quit(errcode)
@@ -379,6 +140,11 @@ if __name__ == "__main__":
         inactivity_timeout = float(1e3000)
         disable_bluetoothd = True
         continuous_output = False
+        max_controllers = 1
+        use_asyncio = False
+        capture_path = None
+        userspace_filter = False
+        ring_path = None
         for arg in sys.argv[1:]: # Be very tolerant in case we are roslaunched.
             if arg == "--help":
                 usage(0)
@@ -394,6 +160,30 @@ if __name__ == "__main__":
                     print("Error parsing inactivity timeout: "+str_value)
                     print()
                     usage(1)
+            elif is_arg_with_param(arg, max_controllers_string):
+                str_value = arg[len(max_controllers_string)+1:]
+                try:
+                    max_controllers = int(str_value)
+                    if max_controllers < 1:
+                        print("Number of controllers must be at least 1.")
+                        print()
+                        usage(1)
+                except ValueError:
+                    print("Error parsing number of controllers: "+str_value)
+                    print()
+                    usage(1)
+            elif is_arg_with_param(arg, capture_string):
+                capture_path = arg[len(capture_string)+1:]
+            elif is_arg_with_param(arg, shm_ring_string):
+                ring_path = arg[len(shm_ring_string)+1:]
+            elif arg == asyncio_string:
+                if sys.version_info < (3, 5):
+                    print(asyncio_string+" requires Python 3.5 or newer.")
+                    print()
+                    usage(1)
+                use_asyncio = True
+            elif arg == userspace_filter_string:
+                userspace_filter = True
             elif arg == no_disable_bluetoothd_string:
                 disable_bluetoothd = False
             elif arg == continuous_motion_output_string:
@@ -414,14 +204,28 @@ if __name__ == "__main__":
             os.system("/etc/init.d/bluetooth stop > /dev/null 2>&1")
             time.sleep(1) # Give the socket time to be available.
         try:
-            while os.system("hciconfig hci0 > /dev/null 2>&1") != 0:
-                print("No bluetooth dongle found or bluez rosdep not installed. Will retry in 5 seconds.", file=sys.stderr)
-                time.sleep(5)
+            hci.wait_for_adapter(on_missing = lambda delay:
+                print("No bluetooth dongle found or bluez rosdep not installed. Will retry in %.1f seconds."%delay, file=sys.stderr))
             if inactivity_timeout == float(1e3000):
                 print("No inactivity timeout was set. (Run with --help for details.)")
             else:
                 print("Inactivity timeout set to %.0f seconds."%inactivity_timeout)
-            cm = connection_manager(decoder(inactivity_timeout = inactivity_timeout, continuous_motion_output = continuous_output))
+            decoders_made = []
+            def make_decoder():
+                capture = None
+                if capture_path is not None:
+                    capture = open_capture(capture_path, len(decoders_made))
+                ring = None
+                if ring_path is not None:
+                    ring = open_ring(ring_path, len(decoders_made))
+                decoders_made.append(decoder(inactivity_timeout = inactivity_timeout,
+                                             continuous_motion_output = continuous_output,
+                                             capture = capture,
+                                             userspace_filter = userspace_filter,
+                                             ring = ring))
+                return decoders_made[-1]
+            cm = connection_manager(make_decoder(), make_decoder, max_controllers)
+            cm.use_asyncio = use_asyncio
             cm.listen_bluetooth()
         finally:
             if disable_bluetoothd:
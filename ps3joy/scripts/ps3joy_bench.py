@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+#***********************************************************
+
+# Times the decode-to-uinput pipeline of the ps3joy.py and ps3joy_node.py
+# decoders on synthetic or captured reports, with the uinput events going
+# to /dev/null, a pipe or memory instead of a uinput device.
+
+from __future__ import print_function
+import sys
+import ps3joy
+from ps3joy_core.bench import SINKS, SINK_NULL, event_sink, synthetic_reports, measure_pipeline, measure_allocations
+from ps3joy_core.device import axis_config, decoder_core
+from ps3joy_core.capture import read_reports
+from ps3joy_core.loadgen import PATTERNS
+
+decoder_string = "--decoder"
+sink_string = "--sink"
+packets_string = "--packets"
+pattern_string = "--pattern"
+userspace_filter_string = "--userspace-filter"
+DECODERS = ("ps3joy", "node", "both")
+
+def usage(errcode):
+    print("usage: ps3joy_bench.py ["+decoder_string+"=<d>] ["+sink_string+"=<s>] ["+packets_string+"=<n>] ["+pattern_string+"=<p>] ["+userspace_filter_string+"] [<capture>]")
+    print(decoder_string+" selects the decoder of ps3joy.py, of ps3joy_node.py, or both (default ps3joy).")
+    print("    The ps3joy_node.py decoder needs a running roscore.")
+    print(sink_string+" is where the uinput events go: "+", ".join(SINKS)+" (default null).")
+    print(packets_string+" sets the number of synthetic reports (default 20000).")
+    print(pattern_string+" sets the synthetic report pattern: "+", ".join(PATTERNS)+" (default sweep).")
+    print(userspace_filter_string+" filters axis jitter before writing, as ps3joy.py "+userspace_filter_string+" does.")
+    print("    The ps3joy_node.py decoder reads its ~userspace_filter parameter instead.")
+    print("Reports are read from <capture> instead when it is given.")
+    exit(errcode)
+
+def print_summary(title, pairs):
+    print(title)
+    for (key, value) in pairs:
+        print("  %-32s %s" % (key + ":", value))
+
+def allocation_summary(allocated):
+    if allocated is None:
+        return "unavailable (needs Python 3.9)"
+    return "mean %.1f, max %i" % (float(sum(allocated)) / len(allocated), max(allocated))
+
+def print_allocations(reports, kind, userspace_filter):
+    # The decode path alone, then with the ps3joy.py uinput output.
+    # Inertial words beyond 10 bits, such as the sequence tags of
+    # synthetic reports, cost an int each, so pass untagged reports.
+    core = decoder_core([], axis_config())
+    sink = event_sink(kind)
+    dec = ps3joy.decoder(event_file = sink.file, userspace_filter = userspace_filter)
+    print_summary("Allocated bytes per packet", [
+        ("Decode", allocation_summary(measure_allocations(core.step, reports))),
+        ("Decode and uinput write", allocation_summary(measure_allocations(dec.step, reports)))])
+    sink.close()
+
+def bench_ps3joy(reports, sink, userspace_filter):
+    dec = ps3joy.decoder(event_file = sink.file, userspace_filter = userspace_filter)
+    return measure_pipeline(dec.step, dec.joy.events, reports)
+
+def bench_node(reports, sink, userspace_filter):
+    import ps3joy_node # Needs rospy and a master.
+    dec = ps3joy_node.decoder(False, event_file = sink.file)
+    return measure_pipeline(dec.step, dec.outputs[0].events, reports)
+
+if __name__ == "__main__":
+    which = "ps3joy"
+    kind = SINK_NULL
+    count = 20000
+    pattern = "sweep"
+    userspace_filter = False
+    paths = []
+    for arg in sys.argv[1:]:
+        if arg == "--help":
+            usage(0)
+        elif arg.startswith(decoder_string + "="):
+            which = arg[len(decoder_string)+1:]
+        elif arg.startswith(sink_string + "="):
+            kind = arg[len(sink_string)+1:]
+        elif arg.startswith(packets_string + "="):
+            count = int(arg[len(packets_string)+1:])
+        elif arg.startswith(pattern_string + "="):
+            pattern = arg[len(pattern_string)+1:]
+        elif arg == userspace_filter_string:
+            userspace_filter = True
+        else:
+            paths.append(arg)
+    if len(paths) > 1 or which not in DECODERS or kind not in SINKS or pattern not in PATTERNS:
+        usage(1)
+
+    if paths:
+        with open(paths[0], "rb") as f:
+            reports = [rawdata for (timestamp, rawdata) in read_reports(f)]
+        print("Loaded %i reports from %s." % (len(reports), paths[0]))
+    else:
+        reports = synthetic_reports(count, pattern)
+    benches = []
+    if which != "node":
+        benches.append(("ps3joy.py decoder", bench_ps3joy))
+    if which != "ps3joy":
+        benches.append(("ps3joy_node.py decoder", bench_node))
+    for (title, bench) in benches:
+        sink = event_sink(kind)
+        stats = bench(reports, sink, userspace_filter)
+        sink.close()
+        print_summary("%s, %s sink" % (title, kind), stats.summary())
+    print_allocations(reports if paths else synthetic_reports(count, pattern, tags = False),
+                      kind, userspace_filter)
@@ -37,160 +37,128 @@ import roslib; roslib.load_manifest('ps3joy')
 import rospy
 from diagnostic_msgs.msg import DiagnosticArray, DiagnosticStatus, KeyValue
 
-from bluetooth import *
-import select
-import fcntl
 import os
 import time
 import sys
-import traceback
-import subprocess
-from array import array
+from ps3joy_core.device import BUTTONS, axis_config, decoder_core, uinput_output, output, open_ring
+from ps3joy_core.monitor import health_monitor
+from ps3joy_core.joy import joy_output
+from ps3joy_core.imu import imu_calibration, sample_batch
+from ps3joy_core.capture import open_capture
+from ps3joy_core.hci import adapter_monitor, hci_adapter
+from ps3joy_core.feedback import feedback_command, feedback_worker
+from ps3joy_core.receiver import receiver
+from ps3joy_core import multiplexer
 import sensor_msgs.msg
 import rosgraph.masterapi
 
-L2CAP_PSM_HIDP_CTRL = 17
-L2CAP_PSM_HIDP_INTR = 19
-
-class uinput:
-    EV_KEY = 1
-    EV_REL = 2
-    EV_ABS = 3
-    BUS_USB = 3
-    ABS_MAX = 0x3f
-
-
-class uinputjoy:
-    def open_uinput(self):
-        for name in ["/dev/input/uinput", "/dev/misc/uinput", "/dev/uinput"]:
-            try:
-                return os.open(name, os.O_WRONLY)
-                break
-            except Exception as e:
-                #print >> sys.stderr, "Error opening uinput: %s"%str(e)
-                pass
-        return None
-
-    def __init__(self, buttons, axes, axmin, axmax, axfuzz, axflat):
-        self.file = self.open_uinput()
-        if self.file == None:
-            print("Trying to modprobe uinput.", file=sys.stderr)
-            os.system("modprobe uinput > /dev/null 2>&1")
-            time.sleep(1) # uinput isn't ready to go right away.
-            self.file = self.open_uinput()
-            if self.file == None:
-                print("Can't open uinput device. Is it accessible by this user? Did you mean to run as root?", file=sys.stderr)
-                raise IOError
-        #id = uinput.input_id()
-        #id.bustype = uinput.BUS_USB
-        #id.vendor = 0x054C
-        #id.product = 0x0268
-        #id.version = 0
-        #info = uinput.uinput_user_dev()
-        #info.name = "Sony Playstation SixAxis/DS3"
-        #info.id = id
-
-        UI_SET_EVBIT   = 0x40045564
-        UI_SET_KEYBIT  = 0x40045565
-        UI_SET_RELBIT  = 0x40045566
-        UI_DEV_CREATE  = 0x5501
-        UI_SET_RELBIT  = 0x40045566
-        UI_SET_ABSBIT  = 0x40045567
-        uinput_user_dev = "80sHHHHi" + (uinput.ABS_MAX+1)*4*'i'
-
-        if len(axes) != len(axmin) or len(axes) != len(axmax):
-            raise Exception("uinputjoy.__init__: axes, axmin and axmax should have same length")
-        absmin = [0] * (uinput.ABS_MAX+1)
-        absmax = [0] * (uinput.ABS_MAX+1)
-        absfuzz = [2] * (uinput.ABS_MAX+1)
-        absflat = [4] * (uinput.ABS_MAX+1)
-        for i in range(0, len(axes)):
-            absmin[axes[i]] = axmin[i]
-            absmax[axes[i]] = axmax[i]
-            absfuzz[axes[i]] = axfuzz[i]
-            absflat[axes[i]] = axflat[i]
-
-        os.write(self.file, struct.pack(uinput_user_dev, "Sony Playstation SixAxis/DS3",
-            uinput.BUS_USB, 0x054C, 0x0268, 0, 0, *(absmax + absmin + absfuzz + absflat)))
-
-        fcntl.ioctl(self.file, UI_SET_EVBIT, uinput.EV_KEY)
-
-        for b in buttons:
-            fcntl.ioctl(self.file, UI_SET_KEYBIT, b)
-
-        for a in axes:
-            fcntl.ioctl(self.file, UI_SET_EVBIT, uinput.EV_ABS)
-            fcntl.ioctl(self.file, UI_SET_ABSBIT, a)
-
-        fcntl.ioctl(self.file, UI_DEV_CREATE)
-
-        self.value = [None] * (len(buttons) + len(axes))
-        self.type = [uinput.EV_KEY] * len(buttons) + [uinput.EV_ABS] * len(axes)
-        self.code = buttons + axes
-
-    def update(self, value):
-        input_event = "LLHHi"
-        t = time.time()
-        th = int(t)
-        tl = int((t - th) * 1000000)
-        if len(value) != len(self.value):
-            print("Unexpected length for value in update (%i instead of %i). This is a bug."%(len(value), len(self.value)), file=sys.stderr)
-        for i in range(0, len(value)):
-            if value[i] != self.value[i]:
-                os.write(self.file, struct.pack(input_event, th, tl, self.type[i], self.code[i], value[i]))
-        self.value = list(value)
-
-class BadJoystickException(Exception):
-    def __init__(self):
-        Exception.__init__(self, "Unsupported joystick.")
-
-class decoder:
-    def __init__(self, deamon, inactivity_timeout = float(1e3000)):
-        #buttons=[uinput.BTN_SELECT, uinput.BTN_THUMBL, uinput.BTN_THUMBR, uinput.BTN_START,
-        #         uinput.BTN_FORWARD, uinput.BTN_RIGHT, uinput.BTN_BACK, uinput.BTN_LEFT,
-        #         uinput.BTN_TL, uinput.BTN_TR, uinput.BTN_TL2, uinput.BTN_TR2,
-        #         uinput.BTN_X, uinput.BTN_A, uinput.BTN_B, uinput.BTN_Y,
-        #         uinput.BTN_MODE]
-        #axes=[uinput.ABS_X, uinput.ABS_Y, uinput.ABS_Z, uinput.ABS_RX,
-        #         uinput.ABS_RX, uinput.ABS_RY, uinput.ABS_PRESSURE, uinput.ABS_DISTANCE,
-        #         uinput.ABS_THROTTLE, uinput.ABS_RUDDER, uinput.ABS_WHEEL, uinput.ABS_GAS,
-        #         uinput.ABS_HAT0Y, uinput.ABS_HAT1Y, uinput.ABS_HAT2Y, uinput.ABS_HAT3Y,
-        #         uinput.ABS_TILT_X, uinput.ABS_TILT_Y, uinput.ABS_MISC, uinput.ABS_RZ,
-        #         ]
-        buttons = range(0x100,0x111)
-        axes = range(0, 20)
-        axmin = [0] * 20
-        axmax = [255] * 20
-        axfuzz = [2] * 20
-        axflat = [4] * 20
-        for i in range(-4,0): # Gyros have more bits than other axes
-            axmax[i] = 1023
-            axfuzz[i] = 4
-            axflat[i] = 4
-        for i in range(4,len(axmin)-4): # Buttons should be zero when not pressed
-            axmin[i] = -axmax[i]
-        self.joy = uinputjoy(buttons, axes, axmin, axmax, axfuzz, axflat)
-        self.axmid = [sum(pair)/2 for pair in zip(axmin, axmax)]
-        self.fullstop() # Probably useless because of uinput startup bug
-        self.outlen = len(buttons) + len(axes)
-        self.inactivity_timeout = inactivity_timeout
+OUTPUT_UINPUT = "uinput"
+OUTPUT_JOY = "joy"
+OUTPUT_BOTH = "both"
+
+class joy_publisher(output):
+    """Publishes sensor_msgs/Joy directly, as joy_node would from the uinput device."""
+
+    def __init__(self, topic, num_buttons, axmin, axmax, axflat, axfuzz):
+        self.output = joy_output(num_buttons, axmin, axmax, axflat, axfuzz,
+                                 deadzone = rospy.get_param("~deadzone", 0.05),
+                                 coalesce_interval = rospy.get_param("~coalesce_interval", 0.001),
+                                 autorepeat_rate = rospy.get_param("~autorepeat_rate", 0.))
+        self.pub = rospy.Publisher(topic, sensor_msgs.msg.Joy, queue_size = 1)
+
+    def update(self, frame):
+        if self.output.update(frame.out, frame.time.to_sec()):
+            msg = sensor_msgs.msg.Joy()
+            msg.header.stamp = frame.time
+            msg.axes = list(self.output.axes)
+            msg.buttons = list(self.output.buttons)
+            self.pub.publish(msg)
+
+class imu_publisher(output):
+    """Publishes sensor_msgs/Imu from the inertial words of each report.
+
+    Only the vertical gyro is measured; angular velocities about x and y
+    are published as zero with a large variance. Orientation is not
+    estimated (orientation_covariance[0] is -1).
+    """
+
+    def __init__(self, topic):
+        self.frame_id = rospy.get_param("~imu_frame_id", "ps3joy")
+        self.calibration = imu_calibration(**rospy.get_param("~imu_calibration", {}))
+        self.batch = sample_batch(rospy.get_param("~imu_batch", 1))
+        self.linear_acceleration_covariance = rospy.get_param("~imu_linear_acceleration_covariance",
+                                                              [0.01, 0., 0., 0., 0.01, 0., 0., 0., 0.01])
+        self.angular_velocity_covariance = rospy.get_param("~imu_angular_velocity_covariance",
+                                                           [1e6, 0., 0., 0., 1e6, 0., 0., 0., 0.001])
+        self.pub = rospy.Publisher(topic, sensor_msgs.msg.Imu, queue_size = 2 * self.batch.size)
+
+    def update(self, frame):
+        samples = self.batch.add((frame.time, self.calibration.convert(frame.out[-4:])))
+        if samples is not None:
+            self.publish(samples)
+
+    def fullstop(self, frame):
+        self.publish(self.batch.flush())
+
+    def publish(self, samples):
+        for (stamp, ((ax, ay, az), wz)) in samples:
+            msg = sensor_msgs.msg.Imu()
+            msg.header.stamp = stamp
+            msg.header.frame_id = self.frame_id
+            msg.orientation_covariance[0] = -1.
+            msg.angular_velocity.z = wz
+            msg.angular_velocity_covariance = self.angular_velocity_covariance
+            msg.linear_acceleration.x = ax
+            msg.linear_acceleration.y = ay
+            msg.linear_acceleration.z = az
+            msg.linear_acceleration_covariance = self.linear_acceleration_covariance
+            self.pub.publish(msg)
+
+class decoder(decoder_core):
+    def __init__(self, deamon, inactivity_timeout = float(1e3000), namespace = "", master = None,
+                 capture = None, event_file = None, ring_path = None, index = 0):
+        # event_file: file descriptor taking the uinput events instead of a new uinput device.
+        # ring_path: shared-memory ring to also write the frames to (index-th decoder's, see open_ring).
         self.deamon = deamon
+        self.namespace = namespace
+        self.master = master
         self.init_ros()
-    step_active = 1
-    step_idle = 2
-    step_error = 3
+        axes = axis_config()
+        output = rospy.get_param("~output", OUTPUT_UINPUT)
+        if output not in (OUTPUT_UINPUT, OUTPUT_JOY, OUTPUT_BOTH):
+            rospy.logwarn("Unknown output '%s'; using '%s'.", output, OUTPUT_UINPUT)
+            output = OUTPUT_UINPUT
+        outputs = []
+        if output != OUTPUT_JOY:
+            outputs.append(uinput_output(axes, event_file, rospy.get_param("~userspace_filter", False)))
+        if output != OUTPUT_UINPUT:
+            outputs.append(joy_publisher(self.namespace + "joy", len(BUTTONS), axes.axmin, axes.axmax, axes.axflat,
+                                         axes.axfuzz))
+        if rospy.get_param("~imu", False):
+            outputs.append(imu_publisher(self.namespace + "imu"))
+        if ring_path is not None:
+            outputs.append(open_ring(ring_path, index, stamp = rospy.Time.to_sec))
+        decoder_core.__init__(self, outputs, axes, inactivity_timeout, capture,
+                              clock = rospy.get_rostime,
+                              on_frame = self.publish_diagnostics,
+                              on_activated = self.activated,
+                              before_recv = self.before_recv,
+                              running = lambda: not rospy.is_shutdown())
 
     def init_ros(self):
-        try:
-            rospy.init_node('ps3joy', anonymous=True, disable_signals=True)
-        except:
-            print("rosnode init failed")
-        rospy.Subscriber("joy/set_feedback",sensor_msgs.msg.JoyFeedbackArray,self.set_feedback)
-        self.diagnostics = Diagnostics()
+        if not rospy.core.is_initialized(): # Only the first of several decoders starts the node.
+            try:
+                rospy.init_node('ps3joy', anonymous=True, disable_signals=True)
+            except:
+                print("rosnode init failed")
         self.led_values = [1,0,0,0]
         self.rumble_cmd = [0, 255]
         self.led_cmd  = 2
         self.core_down = False
+        self.feedback_worker = feedback_worker(self.build_feedback, rospy.get_param("~feedback_interval", 0.05))
+        self.feedback_worker.start()
+        rospy.Subscriber(self.namespace + "joy/set_feedback",sensor_msgs.msg.JoyFeedbackArray,self.set_feedback)
+        self.diagnostics = Diagnostics(self.namespace)
 
     #********************************************************************************
     #Raw Data Format
@@ -226,40 +194,8 @@ class decoder:
     #unsigned int AccelerometerZ;      // Z axis accelerometer Big Endian 0 - 1023
     #unsigned int GyrometerX;          // Z axis Gyro Big Endian 0 - 1023
     #*********************************************************************************
-    def step(self, rawdata): # Returns true if the packet was legal
-        if len(rawdata) == 50:
-            joy_coding = "!1B2x3B1x4B4x12B3x1B1B1B9x4H"
-            all_data = list(struct.unpack(joy_coding, rawdata)) #removing power data
-            state_data = all_data[20:23]
-            data = all_data[0:20]+all_data[23:]
-            prefix = data.pop(0)
-            self.diagnostics.publish(state_data)
-            if prefix != 161:
-                print("Unexpected prefix (%i). Is this a PS3 Dual Shock or Six Axis?"%prefix, file=sys.stderr)
-                return self.step_error
-            out = []
-            for j in range(0,2): # Split out the buttons.
-                curbyte = data.pop(0)
-                for k in range(0,8):
-                    out.append(int((curbyte & (1 << k)) != 0))
-            out = out + data
-            self.joy.update(out)
-            axis_motion = [abs(out[17:][i] - self.axmid[i]) > 20 for i in range(0,len(out)-17-4)]
-                                                                       # 17 buttons, 4 inertial sensors
-            if any(out[0:17]) or any(axis_motion):
-                return self.step_active
-            return self.step_idle
-        elif len(rawdata) == 13:
-            #print list(rawdata)
-            print("Your bluetooth adapter is not supported. Does it support Bluetooth 2.0? Please report its model to blaise@willowgarage.com", file=sys.stderr)
-            raise BadJoystickException()
-        else:
-            print("Unexpected packet length (%i). Is this a PS3 Dual Shock or Six Axis?"%len(rawdata), file=sys.stderr)
-            return self.step_error
-
-    def fullstop(self):
-        self.joy.update([0] * 17 + self.axmid)
-
+    def publish_diagnostics(self, frame):
+        self.diagnostics.publish(frame.state, self.receiver.stats, self.feedback_worker)
 
     def set_feedback(self,msg):
         for feedback in msg.array:
@@ -270,90 +206,47 @@ class decoder:
             else:
                 rospy.logwarn("Feedback %s of type %s does not exist for this joystick.",feedback.id, feedback.type)
         self.led_cmd = self.led_values[0]*pow(2,1) + self.led_values[1]*pow(2,2) + self.led_values[2]*pow(2,3) + self.led_values[3]*pow(2,4) 
-        self.new_msg = True
-    
-    def send_cmd(self, ctrl):
-        command = [0x52,
-                   0x01,
-                   0x00, 0xfe, self.rumble_cmd[1], 0xfe, self.rumble_cmd[0],        # rumble values
-                   0x00, 0x00, 0x00, 0x00, self.led_cmd,
-                   0xff, 0x27, 0x10, 0x00, 0x32,        # LED 4
-                   0xff, 0x27, 0x10, 0x00, 0x32,        # LED 3
-                   0xff, 0x27, 0x10, 0x00, 0x32,        # LED 2
-                   0xff, 0x27, 0x10, 0x00, 0x32,        # LED 1
-                   0x00, 0x00, 0x00, 0x00, 0x00
-                   ]
-        ctrl.send(array('B', command).tostring())
-        self.new_msg = False
-
-    def run(self, intr, ctrl):
-        activated = False
-        try:
-            self.fullstop()
-            lastactivitytime = lastvalidtime = time.time()
-            while not rospy.is_shutdown():
-                (rd, wr, err) = select.select([intr], [], [], 0.1)
-                curtime = time.time()
-                if len(rd) + len(wr) + len(err) == 0: # Timeout
-                    #print "Activating connection."
-                    ctrl.send("\x53\xf4\x42\x03\x00\x00") # Try activating the stream.
-                else: # Got a frame.
-                    #print "Got a frame at ", curtime, 1 / (curtime - lastvalidtime)
-                    if not activated:
-                        self.send_cmd(ctrl)
-                        time.sleep(0.5)
-                        self.rumble_cmd[1] = 0
-                        self.send_cmd(ctrl)
-                        print("Connection activated")
-                        activated = True
-                    try:
-                        if(self.new_msg):
-                            self.send_cmd(ctrl)
-                        rawdata = intr.recv(128)
-                    except BluetoothError as s:
-                        print("Got Bluetooth error %s. Disconnecting."%s)
-                        return
-                    if len(rawdata) == 0: # Orderly shutdown of socket
-                        print("Joystick shut down the connection, battery may be discharged.")
-                        return
-                    if not rosgraph.masterapi.is_online():
-                        print("The roscore or node shutdown, ps3joy shutting down.")
-                        return
-                        #for when we can restart a rosnode
-#                        if self.deamon:
-#                            self.core_down= True
-#                        else:
-#                            print "The roscore shutdown, ps3joy shutting down. Run with --deamon if you want ps3joy to respawn"
-#                            return
-#                    if self.core_down == True:
-#                        try:
-#                            rosgraph.masterapi.is_online()
-#                            self.init_ros()
-#                            self.core_down = False
-#                            print "succeeded bringing node up"
-#                        except:
-#                            print "failed to bring node up"
-#                            pass
-
-                    stepout = self.step(rawdata)
-                    if stepout != self.step_error:
-                        lastvalidtime = curtime
-                    if stepout == self.step_active:
-                        lastactivitytime = curtime
-                if curtime - lastactivitytime > self.inactivity_timeout:
-                    print("Joystick inactive for %.0f seconds. Disconnecting to save battery."%self.inactivity_timeout)
-                    return
-                if curtime - lastvalidtime >= 0.1: # Zero all outputs if we don't hear a valid frame for 0.1 to 0.2 seconds
-                    self.fullstop()
-                if curtime - lastvalidtime >= 5: # Disconnect if we don't hear a valid frame for 5 seconds
-                    print("No valid data for 5 seconds. Disconnecting. This should not happen, please report it.")
-                    return
-                time.sleep(0.005) # No need to blaze through the loop when there is an error
-        finally:
-            self.fullstop()
+        self.feedback_worker.request() # Sent from the worker thread, merged with other pending requests.
+
+    def build_feedback(self):
+        return feedback_command(self.rumble_cmd, self.led_cmd)
+
+    def activated(self, ctrl):
+        self.feedback_worker.attach(ctrl) # Sends the LEDs and starts the rumble pulse.
+        self.feedback_worker.call_later(0.5, self.end_rumble_pulse)
+        print("Connection activated")
+
+    def end_rumble_pulse(self):
+        self.rumble_cmd[1] = 0
+        self.feedback_worker.request()
+
+    def disconnected(self):
+        self.feedback_worker.detach()
+
+    def before_recv(self, ctrl):
+        if self.master is not None and not self.master.online: # Checked in the background; no I/O here.
+            print("The roscore or node shutdown, ps3joy shutting down.")
+            return False
+            #for when we can restart a rosnode
+#            if self.deamon:
+#                self.core_down= True
+#            else:
+#                print "The roscore shutdown, ps3joy shutting down. Run with --deamon if you want ps3joy to respawn"
+#                return False
+#        if self.core_down == True:
+#            try:
+#                rosgraph.masterapi.is_online()
+#                self.init_ros()
+#                self.core_down = False
+#                print "succeeded bringing node up"
+#            except:
+#                print "failed to bring node up"
+#                pass
+        return True
 
 class Diagnostics():
-    def __init__(self):
+    def __init__(self, namespace = ""):
+        self.namespace = namespace
         self.STATE_TEXTS_CHARGING = {
                                 0:"Charging", 
                                 1:"Not Charging"}
@@ -372,7 +265,7 @@ class Diagnostics():
         self.diag_pub = rospy.Publisher('/diagnostics', DiagnosticArray)
         self.last_diagnostics_time = rospy.get_rostime()
 
-    def publish(self, state):
+    def publish(self, state, receive_stats = None, feedback = None):
         STATE_INDEX_CHARGING = 0
         STATE_INDEX_BATTERY = 1
         STATE_INDEX_CONNECTION = 2
@@ -387,7 +280,7 @@ class Diagnostics():
         diag = DiagnosticArray()
         diag.header.stamp = curr_time
         # battery info
-        stat = DiagnosticStatus(name="Battery", level=DiagnosticStatus.OK, message="OK")
+        stat = DiagnosticStatus(name=self.namespace+"Battery", level=DiagnosticStatus.OK, message="OK")
         try:
             battery_state_code = state[STATE_INDEX_BATTERY]
             stat.message = self.STATE_TEXTS_BATTERY[battery_state_code]
@@ -402,7 +295,7 @@ class Diagnostics():
             stat.level = DiagnosticStatus.ERROR
         diag.status.append(stat)
         # connection info
-        stat = DiagnosticStatus(name='ps3joy'": Connection Type", level=DiagnosticStatus.OK, message="OK")
+        stat = DiagnosticStatus(name=self.namespace+'ps3joy'": Connection Type", level=DiagnosticStatus.OK, message="OK")
         try:
             stat.message = self.STATE_TEXTS_CONNECTION[state[STATE_INDEX_CONNECTION]]
         except KeyError as ex:
@@ -411,7 +304,7 @@ class Diagnostics():
             stat.level = DiagnosticStatus.ERROR
         diag.status.append(stat)
         # charging info
-        stat = DiagnosticStatus(name='ps3joy'": Charging State", level=DiagnosticStatus.OK, message="OK")
+        stat = DiagnosticStatus(name=self.namespace+'ps3joy'": Charging State", level=DiagnosticStatus.OK, message="OK")
         try:
             stat.message = self.STATE_TEXTS_CHARGING[state[STATE_INDEX_CHARGING]]
         except KeyError as ex:
@@ -419,6 +312,26 @@ class Diagnostics():
             rospy.logwarn("Invalid Charging State %s"%ex)
             stat.level = DiagnosticStatus.ERROR
         diag.status.append(stat)
+        # receive loop throughput and latency
+        if receive_stats is not None:
+            link = receive_stats.link_quality()
+            stat = DiagnosticStatus(name=self.namespace+'ps3joy'": Receive Loop", level=DiagnosticStatus.OK,
+                                    message="%.0f packets/s, inter-arrival p99 %.1f ms" % (link["rate"], link["interarrival_p99"] * 1000.))
+            if link["invalid"] or link["interarrival_p99"] >= receiver.fullstop_timeout:
+                # Recent gaps long enough to zero the outputs, or garbled reports: likely congestion.
+                stat.level = DiagnosticStatus.WARN
+            stat.values = [KeyValue(key, value) for (key, value) in receive_stats.summary()]
+            diag.status.append(stat)
+        # rumble/LED output
+        if feedback is not None:
+            stat = DiagnosticStatus(name=self.namespace+'ps3joy'": Feedback", level=DiagnosticStatus.OK, message="OK")
+            if feedback.errors:
+                stat.level = DiagnosticStatus.WARN
+                stat.message = "%i commands could not be sent" % feedback.errors
+            stat.values = [KeyValue("Requests", str(feedback.requests)),
+                           KeyValue("Commands sent", str(feedback.sent)),
+                           KeyValue("Requests merged", str(feedback.merged))]
+            diag.status.append(stat)
         # publish message
         self.diag_pub.publish(diag)
 
@@ -427,106 +340,50 @@ class Quit(Exception):
         Exception.__init__(self)
         self.errorcode = errorcode
 
+hci = adapter_monitor(hci_adapter(0))
+
 def check_hci_status():
     # Check if hci0 is up and pscanning, take action as necessary.
-    proc = subprocess.Popen(['hciconfig'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (out, err) = proc.communicate()
-    if out.find('UP') == -1:
-        os.system("hciconfig hci0 up > /dev/null 2>&1")
-    if out.find('PSCAN') == -1:
-        os.system("hciconfig hci0 pscan > /dev/null 2>&1")
-
-class connection_manager:
-    def __init__(self, decoder):
-        self.decoder = decoder
-
-    def prepare_bluetooth_socket(self, port):
-        sock = BluetoothSocket(L2CAP)
-        return self.prepare_socket(sock, port)
-
-    def prepare_net_socket(self, port):
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        return self.prepare_socket(sock, port)
-
-    def prepare_socket(self, sock, port):
-        first_loop = True
-        while True:
-            try:
-                sock.bind(("", port))
-            except Exception as e:
-                print(repr(e))
-                if first_loop:
-                    print("Error binding to socket, will retry every 5 seconds. Do you have another ps3joy.py running? This error occurs on some distributions (such as Ubuntu Karmic). Please read http://www.ros.org/wiki/ps3joy/Troubleshooting for solutions.", file=sys.stderr)
-                first_loop = False
-                time.sleep(0.5)
-                continue
-            sock.listen(1)
-            return sock
-
-    def listen_net(self,intr_port, ctrl_port):
-        intr_sock = self.prepare_net_socket(intr_port)
-        ctrl_sock = self.prepare_net_socket(ctrl_port)
-        self.listen(intr_sock, ctrl_sock)
-
-    def listen_bluetooth(self):
-        intr_sock = self.prepare_bluetooth_socket(L2CAP_PSM_HIDP_INTR)
-        ctrl_sock = self.prepare_bluetooth_socket(L2CAP_PSM_HIDP_CTRL)
-        self.listen(intr_sock, ctrl_sock)
-
-    def listen(self, intr_sock, ctrl_sock):
-        self.n = 0
-        while not rospy.is_shutdown():
-            print("Waiting for connection. Disconnect your PS3 joystick from USB and press the pairing button.")
-            try:
-                intr_sock.settimeout(5)
-                ctrl_sock.settimeout(1)
-                while True:
-                    try:
-                        (intr, (idev, iport)) = intr_sock.accept();
-                        break
-                    except Exception as e:
-                        if str(e) == 'timed out':
-                            check_hci_status()
-                        else:
-                            raise
-
-                try:
-                    try:
-                        (ctrl, (cdev, cport)) = ctrl_sock.accept();
-                    except Exception as e:
-                        print("Got interrupt connection without control connection. Giving up on it.", file=sys.stderr)
-                        continue
-                    try:
-                        if idev == cdev:
-                            self.decoder.run(intr, ctrl)
-                            print("Connection terminated.")
-                            quit(0)
-                        else:
-                            print("Simultaneous connection from two different devices. Ignoring both.", file=sys.stderr)
-                    finally:
-                        ctrl.close()
-                finally:
-                    intr.close()
-            except BadJoystickException:
-                pass
-            except KeyboardInterrupt:
-                print("\nCTRL+C detected. Exiting.")
-                rospy.signal_shutdown("\nCTRL+C detected. Exiting.")
-                quit(0)
-            except Exception as e:
-                traceback.print_exc()
-                print("Caught exception: %s"%str(e), file=sys.stderr)
-                time.sleep(1)
+    hci.check()
+
+class connection_manager(multiplexer.connection_manager):
+    def __init__(self, decoder, make_decoder = None, max_controllers = 1):
+        multiplexer.connection_manager.__init__(self, decoder, make_decoder, max_controllers,
+                                                on_idle = check_hci_status,
+                                                running = lambda: not rospy.is_shutdown())
+        rospy.on_shutdown(self.stop)
+
+    def closed(self, address, reason):
+        decoder = multiplexer.connection_manager.closed(self, address, reason)
+        if decoder is not None:
+            decoder.disconnected()
+        if reason == multiplexer.CLOSED_ENDED and not self.multiplexer.sessions:
+            quit(0) # The node exits when its last controller disconnects.
+
+    def interrupted(self):
+        print("\nCTRL+C detected. Exiting.")
+        rospy.signal_shutdown("\nCTRL+C detected. Exiting.")
+        quit(0)
 
 inactivity_timout_string = "--inactivity-timeout"
 no_disable_bluetoothd_string = "--no-disable-bluetoothd"
 redirect_output_string = "--redirect-output"
+max_controllers_string = "--max-controllers"
+asyncio_string = "--asyncio"
+master_check_period_string = "--master-check-period"
+capture_string = "--capture"
+shm_ring_string = "--shm-ring"
 #deamon_string = "--deamon"
 
 def usage(errcode):
 #    print "usage: ps3joy.py ["+inactivity_timout_string+"=<n>] ["+no_disable_bluetoothd_string+"] ["+redirect_output_string+"]=<f> ["+deamon_string+"]=<d>"
-    print("usage: ps3joy.py ["+inactivity_timout_string+"=<n>] ["+no_disable_bluetoothd_string+"] ["+redirect_output_string+"]=<f>")
+    print("usage: ps3joy.py ["+inactivity_timout_string+"=<n>] ["+max_controllers_string+"=<m>] ["+asyncio_string+"] ["+master_check_period_string+"=<p>] ["+capture_string+"=<c>] ["+shm_ring_string+"=<r>] ["+no_disable_bluetoothd_string+"] ["+redirect_output_string+"]=<f>")
     print("<n>: inactivity timeout in seconds (saves battery life).")
+    print("<m>: number of joysticks to serve at once (default 1). Joystick i > 0 uses the joy<i>/ namespace.")
+    print(asyncio_string+" runs all connections as coroutines on one asyncio event loop (Python 3 only).")
+    print("<p>: seconds between checks that the roscore is still running (default 1).")
+    print("<c>: file to append raw reports to, for ps3joy_replay.py; joystick i > 0 uses <c>.i.")
+    print("<r>: shared-memory ring to also write the frames to, such as /dev/shm/ps3joy; joystick i > 0 uses <r>.i.")
     print("<f>: file name to redirect output to.")
 #    print "<d>: runs in deamon mode respawning node when roscore goes down."
     print("Unless "+no_disable_bluetoothd_string+" is specified, bluetoothd will be stopped.")
@@ -547,6 +404,11 @@ if __name__ == "__main__":
         inactivity_timeout = float(1e3000)
         disable_bluetoothd = True
         deamon = False
+        max_controllers = 1
+        use_asyncio = False
+        master_check_period = 1.0
+        capture_path = None
+        ring_path = None
         for arg in sys.argv[1:]: # Be very tolerant in case we are roslaunched.
             if arg == "--help":
                 usage(0)
@@ -562,6 +424,40 @@ if __name__ == "__main__":
                     print("Error parsing inactivity timeout: "+str_value)
                     print()
                     usage(1)
+            elif is_arg_with_param(arg, max_controllers_string):
+                str_value = arg[len(max_controllers_string)+1:]
+                try:
+                    max_controllers = int(str_value)
+                    if max_controllers < 1:
+                        print("Number of controllers must be at least 1.")
+                        print()
+                        usage(1)
+                except ValueError:
+                    print("Error parsing number of controllers: "+str_value)
+                    print()
+                    usage(1)
+            elif is_arg_with_param(arg, master_check_period_string):
+                str_value = arg[len(master_check_period_string)+1:]
+                try:
+                    master_check_period = float(str_value)
+                    if master_check_period <= 0:
+                        print("Master check period must be positive.")
+                        print()
+                        usage(1)
+                except ValueError:
+                    print("Error parsing master check period: "+str_value)
+                    print()
+                    usage(1)
+            elif is_arg_with_param(arg, capture_string):
+                capture_path = arg[len(capture_string)+1:]
+            elif is_arg_with_param(arg, shm_ring_string):
+                ring_path = arg[len(shm_ring_string)+1:]
+            elif arg == asyncio_string:
+                if sys.version_info < (3, 5):
+                    print(asyncio_string+" requires Python 3.5 or newer.")
+                    print()
+                    usage(1)
+                use_asyncio = True
             elif arg == no_disable_bluetoothd_string:
                 disable_bluetoothd = False
             elif is_arg_with_param(arg, redirect_output_string):
@@ -586,14 +482,27 @@ if __name__ == "__main__":
             os.system("/etc/init.d/bluetooth stop > /dev/null 2>&1")
             time.sleep(1) # Give the socket time to be available.
         try:
-            while os.system("hciconfig hci0 > /dev/null 2>&1") != 0:
-                print("No bluetooth dongle found or bluez rosdep not installed. Will retry in 5 seconds.", file=sys.stderr)
-                time.sleep(5)
+            hci.wait_for_adapter(on_missing = lambda delay:
+                print("No bluetooth dongle found or bluez rosdep not installed. Will retry in %.1f seconds."%delay, file=sys.stderr))
             if inactivity_timeout == float(1e3000):
                 print("No inactivity timeout was set. (Run with --help for details.)")
             else:
                 print("Inactivity timeout set to %.0f seconds."%inactivity_timeout)
-            cm = connection_manager(decoder(deamon, inactivity_timeout = inactivity_timeout))
+            master = health_monitor(rosgraph.masterapi.is_online, master_check_period)
+            decoders_made = []
+            def make_decoder():
+                index = len(decoders_made)
+                capture = None
+                if capture_path is not None:
+                    capture = open_capture(capture_path, index)
+                decoders_made.append(decoder(deamon, inactivity_timeout = inactivity_timeout,
+                                             namespace = "joy%i/"%index if index else "",
+                                             master = master, capture = capture,
+                                             ring_path = ring_path, index = index))
+                return decoders_made[-1]
+            cm = connection_manager(make_decoder(), make_decoder, max_controllers)
+            cm.use_asyncio = use_asyncio
+            master.start() # After init_node, which waits for the master to come up.
             cm.listen_bluetooth()
         finally:
             if disable_bluetoothd:
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+#***********************************************************
+
+# Replays a report capture made with ps3joy.py --capture into a ps3joy
+# decoder, and reports decode throughput, uinput writes and the timing
+# of activity and inactivity decisions.
+
+from __future__ import print_function
+import os
+import socket
+import sys
+import threading
+import time
+import ps3joy
+from ps3joy_core.capture import read_reports, replay
+from ps3joy_core.receiver import ACTIVATE_COMMAND
+
+speed_string = "--speed"
+inactivity_timout_string = "--inactivity-timeout"
+net_string = "--net"
+uinput_string = "--uinput"
+
+def usage(errcode):
+    print("usage: ps3joy_replay.py ["+speed_string+"=<s>] ["+inactivity_timout_string+"=<n>] ["+net_string+"] ["+uinput_string+"] <capture>")
+    print("<s>: replay speed relative to the capture (1 = original pace). Flat out if not given.")
+    print("<n>: inactivity timeout in seconds, as for ps3joy.py.")
+    print(net_string+" sends the reports over local TCP sockets to a ps3joy connection manager,")
+    print("    exercising the whole receive path, instead of calling the decoder directly.")
+    print("    Reports are then sent at the original pace unless "+speed_string+" is given.")
+    print(uinput_string+" writes events to a real uinput device (needs root) instead of /dev/null.")
+    exit(errcode)
+
+def print_summary(title, pairs):
+    print(title)
+    for (key, value) in pairs:
+        print("  %-32s %s" % (key + ":", value))
+
+def replay_direct(reports, dec, speed, inactivity_timeout):
+    stats = replay(reports, dec.step, speed, inactivity_timeout)
+    print_summary("Replay", stats.summary())
+    for (t, active) in stats.transitions:
+        print("  %10.3f s  %s" % (t, "active" if active else "idle"))
+    for t in stats.fullstops:
+        print("  %10.3f s  fullstop" % t)
+    if stats.disconnect is not None:
+        print("  %10.3f s  inactivity disconnect" % stats.disconnect)
+
+def mk_in_socket():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(1)
+    return sock
+
+def replay_net(reports, dec, speed):
+    intr_in = mk_in_socket()
+    ctrl_in = mk_in_socket()
+    cm = ps3joy.connection_manager(dec)
+    driver = threading.Thread(target = cm.listen, args = (intr_in, ctrl_in))
+    driver.daemon = True
+    driver.start()
+    ctrl = socket.create_connection(ctrl_in.getsockname())
+    intr = socket.create_connection(intr_in.getsockname())
+    intr.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    ctrl.settimeout(5)
+    if ctrl.recv(128) != ACTIVATE_COMMAND:
+        print("Did not get the activation command.", file=sys.stderr)
+        exit(1)
+    start = time.time()
+    first = None
+    for (timestamp, rawdata) in reports:
+        if first is None:
+            first = timestamp
+        if speed is not None:
+            delay = start + (timestamp - first) / speed - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        intr.sendall(rawdata)
+    intr.close()
+    ctrl.close()
+    elapsed = time.time() - start
+    time.sleep(0.5) # Let the receiver drain and notice the disconnect.
+    cm.shutdown = True
+    print_summary("Replay over TCP (%.3f s)" % elapsed, dec.receiver.stats.summary())
+
+if __name__ == "__main__":
+    speed = None
+    inactivity_timeout = float(1e3000)
+    net = False
+    use_uinput = False
+    paths = []
+    for arg in sys.argv[1:]:
+        if arg == "--help":
+            usage(0)
+        elif arg.startswith(speed_string + "="):
+            speed = float(arg[len(speed_string)+1:])
+        elif arg.startswith(inactivity_timout_string + "="):
+            inactivity_timeout = float(arg[len(inactivity_timout_string)+1:])
+        elif arg == net_string:
+            net = True
+        elif arg == uinput_string:
+            use_uinput = True
+        else:
+            paths.append(arg)
+    if len(paths) != 1:
+        usage(1)
+
+    event_file = None if use_uinput else os.open(os.devnull, os.O_WRONLY)
+    dec = ps3joy.decoder(inactivity_timeout = inactivity_timeout, event_file = event_file)
+    with open(paths[0], "rb") as f:
+        reports = list(read_reports(f))
+    print("Loaded %i reports from %s." % (len(reports), paths[0]))
+    if net:
+        # TCP does not keep report boundaries, so reports sent flat out
+        # would merge; default to the original pace instead.
+        replay_net(reports, dec, speed if speed is not None else 1.)
+    else:
+        replay_direct(reports, dec, speed, inactivity_timeout)
+    events = dec.joy.events
+    print_summary("uinput", [("Writes", str(events.writes)), ("Events", str(events.events))])
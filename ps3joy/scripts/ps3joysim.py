@@ -33,130 +33,192 @@
 #*  POSSIBILITY OF SUCH DAMAGE.
 #***********************************************************
 from __future__ import print_function
-from bluetooth import *
-import select
-import fcntl
 import os
-import time
-import sys                    
-import traceback
+import select
+import socket
+import sys
 import threading
+import time
 import ps3joy
-import socket
-import signal
-
-def mk_in_socket():
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.bind(("127.0.0.1",0))
-    sock.listen(1)
-    return sock,sock.getsockname()[1]
+from ps3joy_core.loadgen import PATTERNS, PATTERN_IDLE, channel_listener, report_generator, latency_stats, output_monitor
+from ps3joy_core.receiver import ACTIVATE_COMMAND, BadJoystickException
+from ps3joy_core.hci import static_adapter
 
 # Class to spawn the ps3joy.py infrastructure in its own thread
 class driversim(threading.Thread):
-    def __init__(self, intr, ctrl):
+    def __init__(self, intr, ctrl, controllers, on_frame):
         threading.Thread.__init__(self)
+        self.daemon = True
         self.intr = intr
         self.ctrl = ctrl
+        self.on_frame = on_frame
+        self.decoders = []
+        self.monitors = []
+        self.cm = ps3joy.connection_manager(self.make_decoder(), self.make_decoder, controllers)
         self.start()
 
+    def make_decoder(self):
+        # Each decoder writes its events into a pipe watched by an output_monitor.
+        (pipe_r, pipe_w) = os.pipe()
+        monitor = output_monitor(pipe_r, self.on_frame)
+        monitor.start()
+        self.monitors.append(monitor)
+        decoder = ps3joy.decoder(event_file = pipe_w)
+        self.decoders.append(decoder)
+        return decoder
+
     def run(self):
-        self.cm = ps3joy.connection_manager(ps3joy.decoder())
+        ps3joy.hci.adapter = static_adapter() # There is no adapter behind the simulated controllers.
         self.cm.listen(self.intr, self.ctrl)
         print("driversim exiting")
 
     def shutdown(self):
         self.cm.shutdown = True
-                    
+
 class joysim(threading.Thread):
-    def __init__(self, intr, ctrl):
+    def __init__(self, index, intr_in, ctrl_in, generator, rate, stats):
         threading.Thread.__init__(self)
-        print("Starting joystick simulator on ports", intr, "and", ctrl)
-        self.intr = socket.socket()
-        self.intr.connect(("127.0.0.1", intr))
-        if self.intr == -1:
-            raise "Error creating interrput socket."
-        self.ctrl = socket.socket()
-        self.ctrl.connect(("127.0.0.1", ctrl))
-        if self.ctrl == -1:
-            raise "Error creating control socket."
-        self.active = False
+        self.daemon = True
+        self.index = index
+        self.address = "127.0.0.%i" % (index + 1) # The driver pairs channels by address.
+        self.intr_in = intr_in
+        self.ctrl_in = ctrl_in
+        self.generator = generator
+        self.period = 1. / rate
+        self.stats = stats
+        self.connections = 0
         self.shutdown = False
         self.start()
 
-    def run(self):
-        while not self.active and not self.shutdown:
-            (rd, wr, err) = select.select([self.ctrl], [], [], 1)
+    def wait_activation(self, ctrl):
+        while not self.shutdown:
+            (rd, wr, err) = select.select([ctrl], [], [], 0.2)
             if len(rd) == 1:
-                cmd = self.ctrl.recv(128)
-                if cmd == "\x53\xf4\x42\x03\x00\x00":
-                    self.active = True
-                    print("Got activate command")
-                else:
-                    print("Got unknown command (len=%i)"%len(cmd), end=' ')
-                    time.sleep(1);
-                    for c in cmd:
-                        print("%x"%ord(c), end=' ')
-                    print()
-        print("joyactivate exiting")
-
-    def publishstate(self, ax, butt):
-        if self.active:
-            ranges = [255] * 17 + [8191] * 20
-            axval = [ int((v + 1) * s / 2) for (v,s) in zip(ax, ranges)]
-            buttout = []
-            for i in range(0,2):
-                newval = 0
-                for j in range(0,8):
-                    newval = (newval << 1)
-                    if butt[i * 8 + j]:
-                        newval = newval + 1
-                buttout.append(newval)
-            joy_coding = "!1B2x3B1x4B4x12B15x4H"
-            #print buttout, axval
-            self.intr.send(struct.pack(joy_coding, 161, *(buttout + [0] + axval)))
-        else:
-            print("Tried to publish while inactive")
+                cmd = ctrl.recv(128)
+                if cmd == ACTIVATE_COMMAND:
+                    return True
+                if not cmd:
+                    return False
+                print("Controller %i got unknown command (len=%i)" % (self.index, len(cmd)))
+        return False
+
+    def run(self):
+        seq = 0
+        while not self.shutdown:
+            ctrl = self.ctrl_in.connect(self.address)
+            intr = self.intr_in.connect(self.address)
+            try:
+                if not self.wait_activation(ctrl):
+                    continue
+                self.connections += 1
+                seq = self.send(intr, seq)
+            except socket.error:
+                time.sleep(self.period) # Dropped by the driver; reconnect.
+            finally:
+                intr.close()
+                ctrl.close()
+
+    def send(self, intr, seq):
+        # Sends reports until shutdown or a disconnect is due. Returns the next seq.
+        generator = self.generator
+        next_time = time.time()
+        while not self.shutdown:
+            next_time = max(next_time + generator.delay(seq, self.period), time.time() - self.period)
+            delay = next_time - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            now = time.time()
+            for (rawdata, tagged) in generator.packets(seq, now):
+                if tagged:
+                    self.stats.record_send(seq, now)
+                intr.send(rawdata)
+            seq += 1
+            if generator.disconnect(seq - 1):
+                time.sleep(self.period) # Let the last report through before hanging up.
+                break
+        return seq
+
+controllers_string = "--controllers"
+rate_string = "--rate"
+pattern_string = "--pattern"
+duration_string = "--duration"
+
+def usage(errcode):
+    print("usage: ps3joysim.py ["+controllers_string+"=<n>] ["+rate_string+"=<hz>] ["+pattern_string+"=<p>[,<p>...]] ["+duration_string+"=<s>]")
+    print(controllers_string+" sets the number of simulated controllers (default 1).")
+    print(rate_string+" sets the report rate of each controller in Hz (default 100).")
+    print(pattern_string+" sets the report patterns, assigned to the controllers in turn (default idle).")
+    print("    Patterns: "+", ".join(PATTERNS)+".")
+    print(duration_string+" stops the simulation and prints a summary after <s> seconds (default 10).")
+    exit(errcode)
+
+def is_arg_with_param(arg, prefix):
+    if not arg.startswith(prefix):
+        return False
+    if not arg.startswith(prefix+"="):
+        print("Expected '=' after "+prefix)
+        print()
+        usage(1)
+    return True
+
+def print_summary(title, pairs):
+    print(title)
+    for (key, value) in pairs:
+        print("  %-32s %s" % (key + ":", value))
 
 if __name__ == "__main__":
-    def stop_all_threads(a, b):
-      #ds.shutdown()
-      #js.shutdown = True
-      #shutdown = True
-      exit(0)
+    controllers = 1
+    rate = 100.
+    patterns = [PATTERN_IDLE]
+    duration = 10.
+    try:
+        for arg in sys.argv[1:]:
+            if arg == "--help":
+                usage(0)
+            elif is_arg_with_param(arg, controllers_string):
+                controllers = int(arg[len(controllers_string)+1:])
+            elif is_arg_with_param(arg, rate_string):
+                rate = float(arg[len(rate_string)+1:])
+            elif is_arg_with_param(arg, pattern_string):
+                patterns = arg[len(pattern_string)+1:].split(",")
+            elif is_arg_with_param(arg, duration_string):
+                duration = float(arg[len(duration_string)+1:])
+            else:
+                print("Ignoring parameter: '%s'"%arg)
+        if controllers < 1 or controllers > 254 or rate <= 0:
+            raise ValueError("need 1 to 254 controllers and a positive rate")
+        generators = [report_generator(i, patterns[i % len(patterns)]) for i in range(controllers)]
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        print()
+        usage(1)
 
-    signal.signal(signal.SIGINT, stop_all_threads)
+    stats = [latency_stats() for i in range(controllers)]
+    def on_frame(index, seq, now):
+        if index < controllers:
+            stats[index].record_output(seq, now)
 
     # Create sockets for the driver side and pass them to the driver
-    (intr_in, intr_port) = mk_in_socket()
-    (ctrl_in, ctrl_port) = mk_in_socket()
-
-    ds = driversim(intr_in, ctrl_in)
-   
-    # Give the simulator a chance to get going
-    time.sleep(2)
-    
-    # Call up the simulator telling it which ports to connect to.
-    js = joysim(intr_port, ctrl_port)
-    buttons1 = [True] * 16
-    axes1 = [1, 0, -1, .5] * 5
-    buttons2 = [False] * 16
-    axes2 = [-1] * 20
-    buttons3 = [False] * 16
-    axes3 = [0] * 20
-    shutdown = False
-    while not js.active and not shutdown:
-        time.sleep(0.2)
-    #js.publishstate(axes2, buttons2)
-    time.sleep(0.01)
-    #js.publishstate(axes3, buttons3)
-    time.sleep(0.01)
-    while not shutdown:
-        js.publishstate(axes1, buttons2)
-        time.sleep(0.01)
-        axes1[0] = -axes1[0]
-        js.publishstate(axes2, buttons2)
-        time.sleep(0.01)
-       # js.publishstate(axes3, buttons3)
-       # time.sleep(0.01)
-    
+    intr_in = channel_listener(controllers)
+    ctrl_in = channel_listener(controllers)
+    ds = driversim(intr_in, ctrl_in, controllers, on_frame)
+
+    # Call up the simulators telling them which listeners to connect to.
+    print("Starting %i simulated controllers at %g Hz" % (controllers, rate))
+    sims = [joysim(i, intr_in, ctrl_in, generators[i], rate, stats[i]) for i in range(controllers)]
+    try:
+        time.sleep(duration)
+    except KeyboardInterrupt:
+        pass
+    for js in sims:
+        js.shutdown = True
+    for js in sims:
+        js.join()
+    time.sleep(0.2) # Let the driver drain what is in flight.
+    ds.shutdown()
+
+    for (i, js) in enumerate(sims):
+        print_summary("Controller %i (%s, %i connections)" % (i, js.generator.pattern, js.connections), stats[i].summary())
+    for (i, decoder) in enumerate(ds.decoders):
+        print_summary("Decoder %i" % i, decoder.receiver.stats.summary())
     print("main exiting")
@@ -0,0 +1,10 @@
+#!/usr/bin/env python
+
+from distutils.core import setup
+from catkin_pkg.python_setup import generate_distutils_setup
+
+d = generate_distutils_setup(
+    packages = ['ps3joy_core'],
+    package_dir = {'': 'src'})
+
+setup(**d)
@@ -0,0 +1,370 @@
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+"""asyncio implementation of the ps3joy connection handling.
+
+async_connection_manager accepts connections, pairs the control and
+interrupt channels of each controller by device address, and runs
+every controller as a set of coroutines on one event loop:
+
+   o read       waits for HID reports and drains them into the decoder,
+   o activate   (re)sends the activation command while no data arrives,
+   o watchdog   zeroes the outputs and ends the connection on timeouts.
+
+Decoders are the same as for the threaded receiver: the manager uses
+their receiver's callbacks, timeouts and statistics. Rumble and LED
+commands are not sent from the loop: as with the threaded receiver,
+the decoder's feedback_worker thread writes them to the control
+channel it was attached to in on_activated, pacing and merging them.
+Any socket object with fileno, accept, recv and send works, so both
+the Bluetooth L2CAP sockets and the TCP sockets of listen_net are
+supported.
+
+This module requires Python 3.
+"""
+
+import asyncio
+import socket
+import sys
+import time
+import traceback
+
+from ps3joy_core.multiplexer import CLOSED_ENDED, CLOSED_ERROR, CLOSED_REPLACED, CLOSED_STOPPED, CLOSED_UNSUPPORTED
+from ps3joy_core.receiver import ACTIVATE_COMMAND, RECV_SIZE, STEP_ACTIVE, STEP_ERROR, BadJoystickException, recv_into_method, would_block
+
+def wait_readable(sock):
+    """Returns a future that completes when sock is readable."""
+    loop = asyncio.get_event_loop()
+    future = loop.create_future()
+    fd = sock.fileno()
+    def ready():
+        if not future.done():
+            future.set_result(None)
+    loop.add_reader(fd, ready)
+    future.add_done_callback(lambda f: loop.remove_reader(fd))
+    return future
+
+class async_session:
+    """Coroutines of one open connection."""
+
+    def __init__(self, decoder, intr, ctrl, accepted = None):
+        # accepted: time the first channel was accepted, as for receiver.open.
+        self.decoder = decoder
+        self.receiver = decoder.receiver
+        self.intr = intr
+        self.ctrl = ctrl
+        self.accepted = accepted
+        self.recv_into = recv_into_method(intr)
+        self.activated = False
+        self.timed = False
+        self.stopped = True
+
+    async def run(self):
+        """Returns when the connection is over, or raises the error that ended it."""
+        receiver = self.receiver
+        receiver.stats.reset()
+        receiver.fullstop()
+        self.lastactivitytime = self.lastvalidtime = self.lastframetime = time.time()
+        receiver.stats.record_open(self.accepted if self.accepted is not None else self.lastframetime,
+                                   self.lastframetime)
+        self.restarted = asyncio.Event()
+        tasks = [asyncio.ensure_future(c) for c in (self.read(), self.activate(), self.watchdog())]
+        try:
+            (done, pending) = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            receiver.fullstop()
+
+    async def read(self):
+        receiver = self.receiver
+        while True:
+            await wait_readable(self.intr)
+            curtime = time.time()
+            if not self.activated:
+                if receiver.on_activated is not None:
+                    receiver.on_activated(self.ctrl)
+                self.activated = True
+            count = 0
+            flags = 0 # The socket is readable, so the first receive finds a report.
+            while True:
+                if receiver.before_recv is not None and not receiver.before_recv(self.ctrl):
+                    return
+                try:
+                    if self.recv_into is not None:
+                        rawdata = receiver.packets[self.recv_into(receiver.buffer, 0, flags)]
+                    else:
+                        rawdata = self.intr.recv(RECV_SIZE, flags)
+                except IOError as s: # BluetoothError is an IOError
+                    if count > 0 and would_block(s):
+                        break # Drained.
+                    print("Got Bluetooth error %s. Disconnecting."%s)
+                    return
+                if len(rawdata) == 0: # Orderly shutdown of socket
+                    print("Joystick shut down the connection, battery may be discharged.")
+                    return
+                if receiver.capture is not None:
+                    receiver.capture.write(curtime, rawdata)
+                stepout = receiver.step(rawdata)
+                receiver.stats.record(curtime, time.time(), stepout != STEP_ERROR, stepout == STEP_ACTIVE)
+                if stepout != STEP_ERROR:
+                    self.lastvalidtime = curtime
+                    if not self.timed:
+                        print(receiver.stats.connect_message())
+                        self.timed = True
+                    if self.stopped:
+                        self.stopped = False
+                        self.restarted.set() # The watchdog has a fullstop deadline again.
+                if stepout == STEP_ACTIVE:
+                    self.lastactivitytime = curtime
+                count += 1
+                if count >= receiver.max_batch:
+                    break
+                flags = socket.MSG_DONTWAIT
+            self.lastframetime = time.time()
+            receiver.stats.record_wakeup(curtime, count, self.lastframetime)
+
+    async def activate(self):
+        # Sends at once, then like session: retries doubling from
+        # activate_retry until the first report, afterwards whenever
+        # reports stop for activate_period.
+        receiver = self.receiver
+        period = receiver.activate_period
+        retry = receiver.activate_retry
+        nexttime = time.time()
+        while True:
+            if self.activated:
+                nexttime = max(nexttime, self.lastframetime + period)
+            delay = nexttime - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            self.ctrl.send(ACTIVATE_COMMAND) # Try activating the stream.
+            receiver.stats.record_activate_command()
+            if self.activated:
+                nexttime = time.time() + period
+            else:
+                nexttime = time.time() + retry
+                retry = min(2 * retry, period)
+
+    async def watchdog(self):
+        receiver = self.receiver
+        while True:
+            deadline = min(self.lastvalidtime + receiver.disconnect_timeout,
+                           self.lastactivitytime + receiver.inactivity_timeout)
+            if not self.stopped:
+                deadline = min(deadline, self.lastvalidtime + receiver.fullstop_timeout)
+            try:
+                await asyncio.wait_for(self.restarted.wait(), max(0., deadline - time.time()))
+                self.restarted.clear()
+                continue
+            except asyncio.TimeoutError:
+                pass
+            curtime = time.time()
+            if curtime - self.lastactivitytime > receiver.inactivity_timeout:
+                print("Joystick inactive for %.0f seconds. Disconnecting to save battery."%receiver.inactivity_timeout)
+                return
+            if not self.stopped and curtime - self.lastvalidtime >= receiver.fullstop_timeout: # Zero all outputs if we don't hear a valid frame for 0.1 seconds
+                receiver.fullstop()
+                receiver.stats.record_fullstop()
+                self.stopped = True
+            if curtime - self.lastvalidtime >= receiver.disconnect_timeout: # Disconnect if we don't hear a valid frame for 5 seconds
+                print("No valid data for 5 seconds. Disconnecting. This should not happen, please report it.")
+                return
+
+class pending_pair:
+    def __init__(self):
+        self.intr = None
+        self.ctrl = None
+        self.expiry = None
+        self.time = time.time()
+
+    def close(self):
+        for sock in (self.intr, self.ctrl):
+            if sock is not None:
+                sock.close()
+
+class async_connection_manager:
+    """Accepts and runs up to max_connections controllers on one event loop.
+
+    open_decoder(address) returns the decoder for a newly paired
+    controller. The optional callbacks are on_closed(address, reason),
+    called after a controller's connection was closed for one of the
+    multiplexer's CLOSED_* reasons, and idle(), called (and
+    awaited if it is a coroutine function) every idle_period seconds.
+    """
+
+    pairing_timeout = 1.0
+    idle_period = 5.0
+
+    def __init__(self, intr_sock, ctrl_sock, open_decoder, max_connections = 1,
+                 on_closed = None, idle = None):
+        self.intr_sock = intr_sock
+        self.ctrl_sock = ctrl_sock
+        self.open_decoder = open_decoder
+        self.max_connections = max_connections
+        self.on_closed = on_closed
+        self.idle = idle
+        self.sessions = {}
+        self.pending = {}
+        self.replacing = set()
+        self.loop = None
+        self.stopping = None
+
+    def run(self):
+        """Runs the manager on a new event loop until stop is called."""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self.serve())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+    def stop(self):
+        """Ends serve; may be called from any thread."""
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.stopping.set)
+
+    async def serve(self):
+        self.loop = asyncio.get_event_loop()
+        self.stopping = asyncio.Event()
+        tasks = [asyncio.ensure_future(self.accept(self.intr_sock)),
+                 asyncio.ensure_future(self.accept(self.ctrl_sock))]
+        if self.idle is not None:
+            tasks.append(asyncio.ensure_future(self.run_idle()))
+        self.announce()
+        try:
+            await self.stopping.wait()
+        finally:
+            for (address, (session, task)) in list(self.sessions.items()):
+                tasks.append(task)
+            for pair in self.pending.values():
+                pair.expiry.cancel()
+                pair.close()
+            self.pending.clear()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.loop = None
+
+    def announce(self):
+        if len(self.sessions) < self.max_connections:
+            print("Waiting for connection. Disconnect your PS3 joystick from USB and press the pairing button.")
+
+    async def run_idle(self):
+        while True:
+            try:
+                result = self.idle()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                traceback.print_exc()
+                print("Caught exception: %s"%str(e), file=sys.stderr)
+            await asyncio.sleep(self.idle_period)
+
+    async def accept(self, listen_sock):
+        while True:
+            await wait_readable(listen_sock)
+            (sock, (address, port)) = listen_sock.accept()
+            pair = self.pending.get(address)
+            if pair is None:
+                pair = self.pending[address] = pending_pair()
+                pair.expiry = asyncio.ensure_future(self.expire(address, pair))
+            if listen_sock is self.intr_sock:
+                if pair.intr is not None:
+                    pair.intr.close()
+                pair.intr = sock
+            else:
+                if pair.ctrl is not None:
+                    pair.ctrl.close()
+                pair.ctrl = sock
+            if pair.intr is not None and pair.ctrl is not None:
+                del self.pending[address]
+                pair.expiry.cancel()
+                await self.start(address, pair)
+
+    async def expire(self, address, pair):
+        await asyncio.sleep(self.pairing_timeout)
+        if self.pending.get(address) is pair:
+            if pair.ctrl is None:
+                print("Got interrupt connection without control connection. Giving up on it.", file=sys.stderr)
+            else:
+                print("Got control connection without interrupt connection. Giving up on it.", file=sys.stderr)
+            pair.close()
+            del self.pending[address]
+
+    async def start(self, address, pair):
+        if address in self.sessions:
+            print("Controller %s reconnected. Dropping its previous connection."%address)
+            (session, task) = self.sessions[address]
+            self.replacing.add(address)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            self.replacing.discard(address)
+        if len(self.sessions) >= self.max_connections:
+            print("Already serving %i controllers. Ignoring connection from %s."%(len(self.sessions), address), file=sys.stderr)
+            pair.close()
+            return
+        session = async_session(self.open_decoder(address), pair.intr, pair.ctrl, pair.time)
+        task = asyncio.ensure_future(self.run_session(address, session))
+        self.sessions[address] = (session, task)
+        print("Controller %s connected (%i of %i)."%(address, len(self.sessions), self.max_connections))
+
+    async def run_session(self, address, session):
+        reason = CLOSED_STOPPED
+        try:
+            await session.run()
+            reason = CLOSED_ENDED
+        except BadJoystickException:
+            reason = CLOSED_UNSUPPORTED
+        except asyncio.CancelledError:
+            if address in self.replacing:
+                reason = CLOSED_REPLACED
+            raise
+        except Exception as e:
+            traceback.print_exc()
+            print("Caught exception: %s"%str(e), file=sys.stderr)
+            reason = CLOSED_ERROR
+        finally:
+            del self.sessions[address]
+            session.ctrl.close()
+            session.intr.close()
+            print("Connection terminated.")
+            if self.on_closed is not None:
+                self.on_closed(address, reason)
+            if not self.stopping.is_set():
+                self.announce()
@@ -0,0 +1,192 @@
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+"""Per-packet cost of the decode-to-uinput pipeline.
+
+A decoder built with a uinput_sink instead of a uinput device runs
+anywhere. event_sink opens such a sink on /dev/null, a pipe drained by
+a thread, or an in-memory buffer, and measure_pipeline times every call
+to the decoder's step and reads the write counters of its events.
+measure_allocations reports how much memory each step allocates, which
+is zero for the receive and decode path when it runs off a reused
+buffer.
+"""
+
+from __future__ import print_function
+import io
+import os
+import threading
+from timeit import default_timer
+
+from ps3joy_core.loadgen import report_generator
+
+SINK_NULL = "null"
+SINK_PIPE = "pipe"
+SINK_MEMORY = "memory"
+SINKS = (SINK_NULL, SINK_PIPE, SINK_MEMORY)
+
+class event_sink:
+    """Somewhere for a decoder's events to go. file is passed as event_file."""
+
+    def __init__(self, kind = SINK_NULL):
+        if kind not in SINKS:
+            raise ValueError("Unknown sink %s, expected one of %s" % (kind, ", ".join(SINKS)))
+        self.kind = kind
+        self.drain = None
+        self.drained = 0
+        if kind == SINK_NULL:
+            self.file = os.open(os.devnull, os.O_WRONLY)
+        elif kind == SINK_MEMORY:
+            self.file = io.BytesIO()
+        else:
+            (self.read_fd, self.file) = os.pipe()
+            self.drain = threading.Thread(target = self.drain_pipe, name = "event_sink")
+            self.drain.daemon = True
+            self.drain.start()
+
+    def drain_pipe(self):
+        while True:
+            data = os.read(self.read_fd, 65536)
+            if not data:
+                break
+            self.drained += len(data)
+        os.close(self.read_fd)
+
+    def close(self):
+        if self.kind == SINK_MEMORY:
+            self.file.close()
+            return
+        os.close(self.file)
+        if self.drain is not None:
+            self.drain.join()
+
+def synthetic_reports(count, pattern = "sweep", seed = 0, tags = True):
+    """Returns count reports of a simulated controller (see report_generator for tags)."""
+    generator = report_generator(0, pattern, seed, tags)
+    return [generator.report(seq, 0.) for seq in range(count)]
+
+class pipeline_stats:
+    """Per-packet step times and uinput output of one run."""
+
+    def __init__(self, times, writes, events, bytes, suppressed = 0):
+        self.times = times
+        self.writes = writes
+        self.events = events
+        self.bytes = bytes
+        self.suppressed = suppressed
+
+    def percentile(self, fraction):
+        times = sorted(self.times)
+        if not times:
+            return 0.
+        return times[min(len(times) - 1, int(fraction * len(times)))]
+
+    def summary(self):
+        """Returns a list of (key, value) string pairs."""
+        packets = len(self.times)
+        total = sum(self.times)
+        per_packet = lambda count: "%.3f" % (float(count) / packets if packets else 0.)
+        return [("Packets", str(packets)),
+                ("Rate (packets/s)", "%.0f" % (packets / total if total else 0.)),
+                ("Step mean (us)", "%.2f" % (total / packets * 1e6 if packets else 0.)),
+                ("Step p50 (us)", "%.2f" % (self.percentile(0.5) * 1e6)),
+                ("Step p99 (us)", "%.2f" % (self.percentile(0.99) * 1e6)),
+                ("Step max (us)", "%.2f" % (max(self.times) * 1e6 if self.times else 0.)),
+                ("Writes per packet", per_packet(self.writes)),
+                ("Events per packet", per_packet(self.events)),
+                ("Suppressed events per packet", per_packet(self.suppressed)),
+                ("Bytes per packet", per_packet(self.bytes))]
+
+def measure_pipeline(step, events, reports, timer = default_timer):
+    """Runs step over reports and returns a pipeline_stats.
+
+    events is the uinput_events instance step writes to; only the writes
+    made during the run are counted.
+    """
+    (writes, count, written, suppressed) = (events.writes, events.events, events.bytes, events.suppressed)
+    times = []
+    append = times.append
+    for rawdata in reports:
+        start = timer()
+        step(rawdata)
+        append(timer() - start)
+    return pipeline_stats(times, events.writes - writes, events.events - count, events.bytes - written,
+                          events.suppressed - suppressed)
+
+def _allocated(call, arg):
+    import tracemalloc
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    call(arg)
+    return tracemalloc.get_traced_memory()[1] - before
+
+def _ignore(arg):
+    pass
+
+def measure_allocations(step, reports, warmup = 100):
+    """Returns the bytes allocated by each call of step over reports.
+
+    Each report is first copied into one reused buffer, and step gets a
+    memoryview of it, as from the receiver. The count is the peak of
+    memory traced during the call, so objects freed before step returns
+    count too; the cost of measuring is subtracted. Returns None if
+    tracemalloc cannot reset its peak (before Python 3.9).
+    """
+    try:
+        import tracemalloc
+        tracemalloc.reset_peak
+    except (ImportError, AttributeError):
+        return None
+    buffer = bytearray(max(len(rawdata) for rawdata in reports))
+    view = memoryview(buffer)
+    packets = []
+    for rawdata in reports:
+        packets.append(view[:len(rawdata)])
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        overhead = min(_allocated(_ignore, None) for i in range(10))
+        # Warm up through _allocated too, so that the first measured call
+        # does not pay for the interpreter adapting to a new callee:
+        for (i, rawdata) in enumerate(reports[:warmup]):
+            buffer[:len(rawdata)] = rawdata
+            _allocated(step, packets[i])
+        allocated = []
+        for (i, rawdata) in enumerate(reports):
+            buffer[:len(rawdata)] = rawdata
+            allocated.append(max(0, _allocated(step, packets[i]) - overhead))
+    finally:
+        if started:
+            tracemalloc.stop()
+    return allocated
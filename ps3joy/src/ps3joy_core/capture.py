@@ -0,0 +1,165 @@
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+"""Capture and replay of raw HID reports.
+
+A capture log is a short header followed by one record per report:
+the receive time as a little-endian double, the report length as an
+unsigned short, and the report bytes.
+
+replay() feeds a log into a decoder's step function, either flat out
+or at the original speed. It reproduces the receiver's fullstop and
+inactivity decisions on the log's own timestamps, so the timing of
+those decisions does not depend on the replay speed.
+"""
+
+from __future__ import print_function
+import struct
+import time
+
+from ps3joy_core.receiver import receiver, STEP_ACTIVE, STEP_ERROR
+
+MAGIC = b"PS3JOYC\x01"
+_RECORD = struct.Struct("<dH")
+
+class report_writer:
+    """Appends reports to a capture log file (opened in binary mode)."""
+
+    def __init__(self, file):
+        self.file = file
+        if file.tell() == 0:
+            file.write(MAGIC)
+        self.reports = 0
+
+    def write(self, timestamp, rawdata):
+        self.file.write(_RECORD.pack(timestamp, len(rawdata)))
+        self.file.write(rawdata)
+        self.reports += 1
+
+    def close(self):
+        self.file.close()
+
+def open_capture(path, index = 0):
+    """Opens the capture log of the index-th decoder: path, then path.1, path.2, ..."""
+    if index:
+        path = "%s.%i" % (path, index)
+    return report_writer(open(path, "ab"))
+
+def read_reports(file):
+    """Yields (timestamp, rawdata) for each report in a capture log."""
+    if file.read(len(MAGIC)) != MAGIC:
+        raise IOError("Not a ps3joy capture log.")
+    while True:
+        header = file.read(_RECORD.size)
+        if len(header) < _RECORD.size:
+            return
+        (timestamp, length) = _RECORD.unpack(header)
+        rawdata = file.read(length)
+        if len(rawdata) < length:
+            return
+        yield (timestamp, rawdata)
+
+class replay_stats:
+    """Outcome of a replay. Decision times are in seconds from the first report."""
+
+    def __init__(self):
+        self.packets = 0
+        self.errors = 0
+        self.active = 0
+        self.decode_time = 0.
+        self.wall_time = 0.
+        self.log_time = 0.
+        self.transitions = []       # (time, active) when activity changes
+        self.fullstops = []         # times at which outputs would be zeroed
+        self.disconnect = None      # time of the inactivity disconnect, if any
+
+    def throughput(self):
+        if self.decode_time <= 0.:
+            return 0.
+        return self.packets / self.decode_time
+
+    def summary(self):
+        """Returns a list of (key, value) string pairs."""
+        return [("Reports", str(self.packets)),
+                ("Invalid reports", str(self.errors)),
+                ("Active reports", str(self.active)),
+                ("Log duration (s)", "%.3f" % self.log_time),
+                ("Replay duration (s)", "%.3f" % self.wall_time),
+                ("Decode throughput (reports/s)", "%.0f" % self.throughput()),
+                ("Activity changes", str(len(self.transitions))),
+                ("Fullstops", str(len(self.fullstops))),
+                ("Inactivity disconnect (s)", "-" if self.disconnect is None else "%.3f" % self.disconnect)]
+
+def replay(reports, step, speed = None, inactivity_timeout = float(1e3000),
+           fullstop_timeout = receiver.fullstop_timeout, clock = time.time, sleep = time.sleep):
+    """Feeds (timestamp, rawdata) pairs to step. speed None replays flat out,
+    1.0 at the original pace. Returns a replay_stats."""
+    stats = replay_stats()
+    start = clock()
+    first = None
+    lastvalid = lastactivity = 0.
+    stopped = True
+    active = None
+    for (timestamp, rawdata) in reports:
+        if first is None:
+            first = timestamp
+        t = timestamp - first
+        if speed is not None:
+            delay = start + t / speed - clock()
+            if delay > 0:
+                sleep(delay)
+        if not stopped and t - lastvalid >= fullstop_timeout:
+            stats.fullstops.append(lastvalid + fullstop_timeout)
+            stopped = True
+        if t - lastactivity > inactivity_timeout:
+            stats.disconnect = lastactivity + inactivity_timeout
+            break
+        before = clock()
+        stepout = step(rawdata)
+        stats.decode_time += clock() - before
+        stats.packets += 1
+        stats.log_time = t
+        if stepout == STEP_ERROR:
+            stats.errors += 1
+            continue
+        lastvalid = t
+        stopped = False
+        is_active = stepout == STEP_ACTIVE
+        if is_active:
+            stats.active += 1
+            lastactivity = t
+        if is_active != active:
+            stats.transitions.append((t, is_active))
+            active = is_active
+    stats.wall_time = clock() - start
+    return stats
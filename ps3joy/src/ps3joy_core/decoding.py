@@ -0,0 +1,159 @@
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+"""Decoding of PS3 SIXAXIS/DUAL SHOCK 3 HID input reports.
+
+Shared by ps3joy.py and ps3joy_node.py. A report is 50 bytes long:
+
+    unsigned char ReportType;         // Report prefix, 161 (0xa1)
+    unsigned char Reserved1[2];       // Unknown
+    unsigned char ButtonState[2];     // Main buttons, one bit each
+    unsigned char PSButtonState;      // PS button
+    unsigned char Reserved2;          // Unknown
+    unsigned char Sticks[4];          // Left X/Y, right X/Y, 0 - 255, 128 is mid
+    unsigned char Reserved3[4];       // Unknown
+    unsigned char Pressure[12];       // Up, right, down, left, L2, R2, L1, R1,
+                                      // triangle, circle, cross, square
+    unsigned char Reserved4[3];       // Unknown
+    unsigned char Charge;             // charging status ? 02 = charge, 03 = normal
+    unsigned char Power;              // Battery status
+    unsigned char Connection;         // Connection Type
+    unsigned char Reserved5[9];       // Unknown
+    unsigned short Inertial[4];       // Accelerometer X/Y/Z, gyro, big endian 0 - 1023
+
+The decoded output vector has 17 buttons (16 button bits, then the PS
+button byte) followed by 20 axes (4 sticks, 12 pressures, 4 inertial
+sensors). This is the vector that is passed on to uinput.
+"""
+
+REPORT_LENGTH = 50
+REPORT_PREFIX = 161
+
+NUM_BUTTONS = 17
+NUM_AXES = 20
+NUM_INERTIAL = 4
+OUTPUT_LENGTH = NUM_BUTTONS + NUM_AXES
+
+# Axes further than this from their rest value count as activity:
+ACTIVITY_THRESHOLD = 20
+
+_PREFIX = 0 # Offset of the prefix; decode() spells out the other offsets.
+_STATE_LENGTH = 3
+
+# Bit k of byte b is _BYTE_BITS[b][k]:
+_BYTE_BITS = tuple(tuple((byte >> k) & 1 for k in range(8)) for byte in range(256))
+
+# The inertial sensors have 10 bits, so their words are looked up in
+# these rows instead of building a new int for each (only ints up to
+# 256 are shared by the interpreter). Other high bytes are computed.
+_WORDS = tuple(tuple((high << 8) | low for low in range(256)) for high in range(4))
+
+# Python 2 indexes str and memoryview as one character strings:
+_INDEX_GIVES_STR = isinstance(memoryview(b"a")[0], str)
+
+class report_decoder:
+    """Decodes reports into a preallocated output vector.
+
+    decode() overwrites out (a list of OUTPUT_LENGTH ints) and state
+    (charging, battery and connection codes) in place, so callers may
+    hold on to both lists across reports. It reads the report in place,
+    without unpacking it into intermediate objects, so decoding a report
+    from a reused buffer allocates nothing (on Python 3).
+    """
+
+    def __init__(self, axmid):
+        if len(axmid) != NUM_AXES:
+            raise Exception("report_decoder.__init__: axmid should have %i entries" % NUM_AXES)
+        self.out = [0] * OUTPUT_LENGTH
+        self.state = [0] * _STATE_LENGTH
+        # Rest band of each non-inertial axis, for activity detection:
+        self.rest_low = [mid - ACTIVITY_THRESHOLD for mid in axmid[:NUM_AXES - NUM_INERTIAL]]
+        self.rest_high = [mid + ACTIVITY_THRESHOLD for mid in axmid[:NUM_AXES - NUM_INERTIAL]]
+
+    def decode(self, rawdata):
+        """Decode one REPORT_LENGTH byte report. Returns the report prefix.
+
+        rawdata may be bytes, a bytearray or a memoryview of one.
+        """
+        if _INDEX_GIVES_STR and not isinstance(rawdata, bytearray):
+            rawdata = bytearray(rawdata)
+        # Written out field by field: slicing rawdata or unpacking it
+        # would allocate copies.
+        out = self.out
+        out[0:8] = _BYTE_BITS[rawdata[3]]
+        out[8:16] = _BYTE_BITS[rawdata[4]]
+        out[16] = rawdata[5]    # PS button
+        out[17] = rawdata[7]    # Sticks
+        out[18] = rawdata[8]
+        out[19] = rawdata[9]
+        out[20] = rawdata[10]
+        out[21] = rawdata[15]   # Pressures
+        out[22] = rawdata[16]
+        out[23] = rawdata[17]
+        out[24] = rawdata[18]
+        out[25] = rawdata[19]
+        out[26] = rawdata[20]
+        out[27] = rawdata[21]
+        out[28] = rawdata[22]
+        out[29] = rawdata[23]
+        out[30] = rawdata[24]
+        out[31] = rawdata[25]
+        out[32] = rawdata[26]
+        state = self.state
+        state[0] = rawdata[30]  # Charging, battery, connection
+        state[1] = rawdata[31]
+        state[2] = rawdata[32]
+        words = _WORDS
+        high = rawdata[42]      # Inertial sensors
+        out[33] = words[high][rawdata[43]] if high < 4 else (high << 8) | rawdata[43]
+        high = rawdata[44]
+        out[34] = words[high][rawdata[45]] if high < 4 else (high << 8) | rawdata[45]
+        high = rawdata[46]
+        out[35] = words[high][rawdata[47]] if high < 4 else (high << 8) | rawdata[47]
+        high = rawdata[48]
+        out[36] = words[high][rawdata[49]] if high < 4 else (high << 8) | rawdata[49]
+        return rawdata[_PREFIX]
+
+    def active(self):
+        """True if any button is pressed, or any stick or pressure axis is away from rest."""
+        out = self.out
+        for i in range(NUM_BUTTONS):
+            if out[i]:
+                return True
+        rest_low = self.rest_low
+        rest_high = self.rest_high
+        for i in range(NUM_AXES - NUM_INERTIAL):
+            value = out[NUM_BUTTONS + i]
+            if value < rest_low[i] or value > rest_high[i]:
+                return True
+        return False
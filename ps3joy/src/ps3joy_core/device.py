@@ -0,0 +1,216 @@
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+"""Decoding core shared by ps3joy.py and ps3joy_node.py.
+
+A decoder_core parses each report once into a frame and hands that
+frame to every output backend: a uinput device, ROS publishers, a
+shared-memory ring or anything else with the output interface. Backends
+can be combined freely, and none of them decodes the report again.
+
+The records of ring_output are RING_FORMAT: the frame time, then the
+17 buttons and 20 axes in the order of the uinput device.
+"""
+
+from __future__ import print_function
+import sys
+import time
+
+from ps3joy_core.decoding import report_decoder, REPORT_LENGTH, REPORT_PREFIX
+from ps3joy_core.receiver import receiver, BadJoystickException, STEP_ACTIVE, STEP_IDLE, STEP_ERROR
+from ps3joy_core.uinput import uinputjoy, uinput_sink, axis_filter
+from ps3joy_core.shmring import ring_writer, SLOTS
+
+#buttons=[uinput.BTN_SELECT, uinput.BTN_THUMBL, uinput.BTN_THUMBR, uinput.BTN_START,
+#         uinput.BTN_FORWARD, uinput.BTN_RIGHT, uinput.BTN_BACK, uinput.BTN_LEFT,
+#         uinput.BTN_TL, uinput.BTN_TR, uinput.BTN_TL2, uinput.BTN_TR2,
+#         uinput.BTN_X, uinput.BTN_A, uinput.BTN_B, uinput.BTN_Y,
+#         uinput.BTN_MODE]
+#axes=[uinput.ABS_X, uinput.ABS_Y, uinput.ABS_Z, uinput.ABS_RX,
+#         uinput.ABS_RX, uinput.ABS_RY, uinput.ABS_PRESSURE, uinput.ABS_DISTANCE,
+#         uinput.ABS_THROTTLE, uinput.ABS_RUDDER, uinput.ABS_WHEEL, uinput.ABS_GAS,
+#         uinput.ABS_HAT0Y, uinput.ABS_HAT1Y, uinput.ABS_HAT2Y, uinput.ABS_HAT3Y,
+#         uinput.ABS_TILT_X, uinput.ABS_TILT_Y, uinput.ABS_MISC, uinput.ABS_RZ,
+#         ]
+BUTTONS = list(range(0x100,0x111))
+AXES = list(range(0, 20))
+RING_FORMAT = "=d%ih" % (len(BUTTONS) + len(AXES))
+
+class axis_config:
+    """Ranges and kernel filtering of the 20 axes."""
+
+    def __init__(self, continuous_motion_output = False):
+        self.axmin = [0] * 20
+        self.axmax = [255] * 20
+        self.axfuzz = [2] * 20
+        self.axflat = [4] * 20
+        for i in range(-4,0): # Gyros have more bits than other axes
+            self.axmax[i] = 1023
+            self.axfuzz[i] = 4
+            self.axflat[i] = 4
+            if continuous_motion_output:
+                self.axfuzz[i] = 0
+                self.axflat[i] = 0
+        for i in range(4,len(self.axmin)-4): # Buttons should be zero when not pressed
+            self.axmin[i] = -self.axmax[i]
+        self.axmid = [sum(pair)//2 for pair in zip(self.axmin, self.axmax)]
+
+class frame:
+    """One parsed report: output vector, state bytes and receive time.
+
+    The decoder_core reuses a single frame, so outputs must copy what
+    they keep beyond their update call.
+    """
+
+    def __init__(self, out, state, time = None):
+        self.out = out
+        self.state = state
+        self.time = time
+
+class output:
+    """Interface of the output backends of a decoder_core."""
+
+    def update(self, frame):
+        """Called with every valid frame. Does nothing by default."""
+        pass
+
+    def fullstop(self, frame):
+        """Called with a frame of rest values when the outputs must be zeroed."""
+        self.update(frame)
+
+    def close(self):
+        pass
+
+class uinput_output(output):
+    """Writes frames to a uinput device, or to event_file if given."""
+
+    def __init__(self, axes, event_file = None, userspace_filter = False):
+        axfilter = axis_filter(axes.axfuzz) if userspace_filter else None
+        if event_file is None:
+            self.joy = uinputjoy(BUTTONS, AXES, axes.axmin, axes.axmax, axes.axfuzz, axes.axflat, axfilter)
+        else:
+            self.joy = uinput_sink(BUTTONS, AXES, event_file, axfilter)
+        self.events = self.joy.events
+
+    def update(self, frame):
+        self.joy.update(frame.out)
+
+class ring_output(output):
+    """Appends frames to a shared-memory ring for local readers.
+
+    stamp converts frame times to seconds (rospy.Time.to_sec for
+    frames stamped with ROS time).
+    """
+
+    def __init__(self, path, slots = SLOTS, stamp = float):
+        self.ring = ring_writer(path, RING_FORMAT, slots)
+        self.stamp = stamp
+
+    def update(self, frame):
+        self.ring.write(self.stamp(frame.time), *frame.out)
+
+    def close(self):
+        self.ring.close()
+
+def open_ring(path, index = 0, stamp = float):
+    """Creates the ring output of the index-th decoder: path, then path.1, path.2, ..."""
+    if index:
+        path = "%s.%i" % (path, index)
+    return ring_output(path, stamp = stamp)
+
+class decoder_core:
+    """Parses reports once and fans the frames out to the outputs.
+
+    on_frame(frame), if given, is called for every report of the right
+    length, before the prefix is checked (diagnostics use the state
+    bytes of every report). clock stamps the frames. The remaining
+    arguments are passed on to the receiver.
+    """
+
+    def __init__(self, outputs, axes, inactivity_timeout = float(1e3000), capture = None,
+                 clock = time.time, on_frame = None, on_activated = None, before_recv = None,
+                 running = None):
+        self.outputs = list(outputs)
+        self.axes = axes
+        self.axmid = axes.axmid
+        self.clock = clock
+        self.on_frame = on_frame
+        self.report = report_decoder(self.axmid)
+        self.frame = frame(self.report.out, self.report.state)
+        self.rest = frame([0] * len(BUTTONS) + self.axmid, self.report.state)
+        self.fullstop() # Probably useless because of uinput startup bug
+        self.outlen = len(BUTTONS) + len(AXES)
+        self.inactivity_timeout = inactivity_timeout
+        self.receiver = receiver(self.step, self.fullstop, inactivity_timeout,
+                                 on_activated = on_activated,
+                                 before_recv = before_recv,
+                                 running = running)
+        self.receiver.capture = capture
+
+    def add_output(self, output):
+        self.outputs.append(output)
+        output.fullstop(self.rest)
+
+    def step(self, rawdata): # Returns true if the packet was legal
+        if len(rawdata) == REPORT_LENGTH:
+            self.frame.time = self.clock() # The report was read just now.
+            prefix = self.report.decode(rawdata)
+            if self.on_frame is not None:
+                self.on_frame(self.frame)
+            if prefix != REPORT_PREFIX:
+                print("Unexpected prefix (%i). Is this a PS3 Dual Shock or Six Axis?"%prefix, file=sys.stderr)
+                return STEP_ERROR
+            for output in self.outputs:
+                output.update(self.frame)
+            if self.report.active():
+                return STEP_ACTIVE
+            return STEP_IDLE
+        elif len(rawdata) == 13:
+            #print list(rawdata)
+            print("Your bluetooth adapter is not supported. Does it support Bluetooth 2.0? Please report its model to blaise@willowgarage.com", file=sys.stderr)
+            raise BadJoystickException()
+        else:
+            print("Unexpected packet length (%i). Is this a PS3 Dual Shock or Six Axis?"%len(rawdata), file=sys.stderr)
+            return STEP_ERROR
+
+    def fullstop(self):
+        self.rest.time = self.clock()
+        for output in self.outputs:
+            output.fullstop(self.rest)
+
+    def run(self, intr, ctrl):
+        self.receiver.run(intr, ctrl)
+
+    def close(self):
+        for output in self.outputs:
+            output.close()
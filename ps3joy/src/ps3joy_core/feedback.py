@@ -0,0 +1,170 @@
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+"""Rumble and LED output to a PS3 joystick, off the receive path.
+
+Feedback requests (from ROS callbacks, say) only update the desired
+state and wake a feedback_worker thread. The worker merges everything
+requested since its last write into a single output report, and writes
+at most once per interval, so a burst of requests costs one control
+channel write and never delays reading the interrupt channel.
+"""
+
+from __future__ import print_function
+import heapq
+import threading
+import time
+
+def feedback_command(rumble, led_mask):
+    """Returns the output report setting the rumble motors and LEDs.
+
+    rumble is (weak, strong), each 0 to 255; bit i + 1 of led_mask lights
+    LED i + 1.
+    """
+    command = [0x52,
+               0x01,
+               0x00, 0xfe, rumble[1], 0xfe, rumble[0],        # rumble values
+               0x00, 0x00, 0x00, 0x00, led_mask,
+               0xff, 0x27, 0x10, 0x00, 0x32,        # LED 4
+               0xff, 0x27, 0x10, 0x00, 0x32,        # LED 3
+               0xff, 0x27, 0x10, 0x00, 0x32,        # LED 2
+               0xff, 0x27, 0x10, 0x00, 0x32,        # LED 1
+               0x00, 0x00, 0x00, 0x00, 0x00
+               ]
+    return bytes(bytearray(command))
+
+class feedback_worker(threading.Thread):
+    """Writes feedback commands to the attached control channel.
+
+    build() returns the command for the current feedback state; it is
+    called on the worker thread just before each write. request() asks
+    for a write and may be called from any thread. call_later(delay, fn)
+    runs fn on the worker thread after delay seconds, e.g. to end a
+    rumble pulse. requests counts calls to request, sent the commands
+    written and merged the requests that shared a write with another.
+    """
+
+    def __init__(self, build, interval = 0.05):
+        threading.Thread.__init__(self, name = "feedback_worker")
+        self.daemon = True
+        self.build = build
+        self.interval = interval
+        self.condition = threading.Condition()
+        self.ctrl = None
+        self.pending = 0
+        self.timers = []
+        self.timer_count = 0
+        self.last_write = None
+        self.running = True
+        self.requests = 0
+        self.sent = 0
+        self.merged = 0
+        self.errors = 0
+
+    def attach(self, ctrl):
+        """Sends future commands on ctrl, starting with the current state."""
+        with self.condition:
+            self.ctrl = ctrl
+            self.timers = []
+            self.last_write = None
+        self.request()
+
+    def detach(self):
+        with self.condition:
+            self.ctrl = None
+            self.pending = 0
+            self.timers = []
+
+    def request(self):
+        with self.condition:
+            self.requests += 1
+            self.pending += 1
+            self.condition.notify()
+
+    def call_later(self, delay, fn):
+        with self.condition:
+            self.timer_count += 1 # Keeps equal times in order without comparing functions.
+            heapq.heappush(self.timers, (time.time() + delay, self.timer_count, fn))
+            self.condition.notify()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                work = self.wait()
+            if work is None:
+                return
+            (ctrl, count, due) = work
+            for fn in due:
+                fn()
+            if not count:
+                continue
+            try:
+                ctrl.send(self.build())
+            except (IOError, OSError) as e: # BluetoothError is an IOError
+                self.errors += 1
+                print("Could not send feedback (%s)."%e)
+                with self.condition:
+                    if self.ctrl is ctrl:
+                        self.ctrl = None
+                continue
+            with self.condition:
+                self.sent += 1
+                self.merged += count - 1
+
+    def wait(self):
+        # Called with the condition held. Returns (ctrl, number of requests
+        # to serve now, timer functions due), or None to stop.
+        while self.running:
+            now = time.time()
+            due = []
+            while self.timers and self.timers[0][0] <= now:
+                due.append(heapq.heappop(self.timers)[2])
+            if due:
+                return (self.ctrl, 0, due)
+            deadline = self.timers[0][0] if self.timers else None
+            if self.pending and self.ctrl is not None:
+                ready = self.last_write is None or now >= self.last_write + self.interval
+                if ready:
+                    count = self.pending
+                    self.pending = 0
+                    self.last_write = now
+                    return (self.ctrl, count, due)
+                wake = self.last_write + self.interval
+                deadline = wake if deadline is None else min(deadline, wake)
+            self.condition.wait(None if deadline is None else max(0., deadline - now))
+        return None
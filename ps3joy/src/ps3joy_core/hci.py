@@ -0,0 +1,235 @@
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+"""State of the local Bluetooth adapter, without spawning hciconfig.
+
+hci_adapter reads the adapter flags with the HCIGETDEVINFO ioctl on a
+raw HCI socket, and brings the adapter up or makes it connectable with
+the same ioctls hciconfig uses. adapter_monitor caches the last reading
+and repairs the adapter when asked, backing off after failed attempts.
+Anything with the read, up and page_scan methods of hci_adapter, such
+as static_adapter, can stand in for it in tests or simulations.
+"""
+
+from __future__ import print_function
+import errno
+import fcntl
+import os
+import random
+import socket
+import struct
+import time
+
+AF_BLUETOOTH = 31
+BTPROTO_HCI = 1
+
+# ioctls from <bluetooth/hci.h>:
+HCIDEVUP = 0x400448c9                   # _IOW('H', 201, int)
+HCIGETDEVINFO = 0x800448d3              # _IOR('H', 211, int)
+HCISETSCAN = 0x400448dd                 # _IOW('H', 221, int)
+
+HCI_UP = 1 << 0
+HCI_PSCAN = 1 << 3
+SCAN_PAGE = 0x02
+
+# struct hci_dev_info up to the flags, padded to its full 92 bytes:
+_DEV_INFO = struct.Struct("=H8s6sI72x")
+# struct hci_dev_req:
+_DEV_REQ = struct.Struct("=HxxI")
+
+class adapter_state:
+    def __init__(self, up, page_scan):
+        self.up = up
+        self.page_scan = page_scan
+
+    def connectable(self):
+        return self.up and self.page_scan
+
+class hci_adapter:
+    """Bluetooth adapter hci<dev_id>, accessed through HCI socket ioctls."""
+
+    def __init__(self, dev_id = 0):
+        self.dev_id = dev_id
+        self.sysfs_path = "/sys/class/bluetooth/hci%i" % dev_id
+        self.sock = None
+
+    def socket(self):
+        if self.sock is None:
+            self.sock = socket.socket(AF_BLUETOOTH, socket.SOCK_RAW, BTPROTO_HCI)
+        return self.sock
+
+    def read(self):
+        """Returns an adapter_state, or None if there is no such adapter."""
+        if not os.path.exists(self.sysfs_path):
+            return None
+        request = bytearray(_DEV_INFO.pack(self.dev_id, b"", b"", 0))
+        try:
+            fcntl.ioctl(self.socket().fileno(), HCIGETDEVINFO, request, True)
+        except (IOError, OSError) as e:
+            if e.errno in (errno.ENODEV, errno.EAFNOSUPPORT):
+                return None
+            raise
+        flags = _DEV_INFO.unpack(bytes(request))[3]
+        return adapter_state(bool(flags & HCI_UP), bool(flags & HCI_PSCAN))
+
+    def up(self):
+        try:
+            fcntl.ioctl(self.socket().fileno(), HCIDEVUP, self.dev_id)
+        except (IOError, OSError) as e:
+            if e.errno != errno.EALREADY:
+                raise
+
+    def page_scan(self):
+        fcntl.ioctl(self.socket().fileno(), HCISETSCAN, _DEV_REQ.pack(self.dev_id, SCAN_PAGE))
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+class static_adapter:
+    """Stands in for hci_adapter in tests and simulations.
+
+    present, up and page_scan hold the simulated state; up() and
+    page_scan() set them unless fail is set, and are counted in calls.
+    """
+
+    def __init__(self, present = True, up = True, page_scan = True):
+        self.dev_id = 0
+        self.present = present
+        self.is_up = up
+        self.is_page_scan = page_scan
+        self.fail = False
+        self.calls = []
+
+    def read(self):
+        self.calls.append("read")
+        if not self.present:
+            return None
+        return adapter_state(self.is_up, self.is_page_scan)
+
+    def up(self):
+        self.calls.append("up")
+        if self.fail:
+            raise IOError(errno.EPERM, "Operation not permitted")
+        self.is_up = True
+
+    def page_scan(self):
+        self.calls.append("page_scan")
+        if self.fail:
+            raise IOError(errno.EPERM, "Operation not permitted")
+        self.is_page_scan = True
+
+class backoff:
+    """Bounded, jittered exponential delays between retries.
+
+    Delays start at initial and grow by factor up to maximum; each is
+    then spread by up to +/- jitter of itself so that retries do not
+    line up.
+    """
+
+    def __init__(self, initial = 0.5, maximum = 5., factor = 2., jitter = 0.2, rng = None):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.random = rng if rng is not None else random.Random()
+        self.reset()
+
+    def reset(self):
+        self.delay = self.initial
+        self.failures = 0
+
+    def next(self):
+        """Returns the delay before the next retry, and lengthens the following one."""
+        delay = self.delay
+        self.delay = min(self.maximum, self.delay * self.factor)
+        self.failures += 1
+        return delay * (1. + self.jitter * (2. * self.random.random() - 1.))
+
+class adapter_monitor:
+    """Keeps an adapter up and connectable, reading its state at most every cache_period seconds."""
+
+    def __init__(self, adapter, cache_period = 1., retry = None, clock = time.time):
+        self.adapter = adapter
+        self.cache_period = cache_period
+        self.retry = retry if retry is not None else backoff()
+        self.clock = clock
+        self.state = None
+        self.read_time = None
+        self.next_repair = 0.
+        self.reads = 0
+        self.repairs = 0
+
+    def read(self, max_age = None):
+        """Returns the adapter_state (None without adapter), reading it if the cached one is too old."""
+        if max_age is None:
+            max_age = self.cache_period
+        now = self.clock()
+        if self.read_time is None or now - self.read_time >= max_age:
+            self.state = self.adapter.read()
+            self.read_time = now
+            self.reads += 1
+        return self.state
+
+    def check(self):
+        """Brings the adapter up and makes it connectable if needed. Returns True if it is."""
+        state = self.read()
+        if state is not None and state.connectable():
+            self.retry.reset()
+            return True
+        now = self.clock()
+        if state is None or now < self.next_repair:
+            return False
+        self.repairs += 1
+        try:
+            if not state.up:
+                self.adapter.up()
+            self.adapter.page_scan()
+        except (IOError, OSError) as e:
+            print("Could not make hci%i connectable: %s" % (self.adapter.dev_id, e))
+        state = self.read(0.)
+        if state is not None and state.connectable():
+            self.retry.reset()
+            return True
+        self.next_repair = now + self.retry.next()
+        return False
+
+    def wait_for_adapter(self, sleep = time.sleep, on_missing = None):
+        """Returns once the adapter exists, retrying with backoff. on_missing(delay) is called before each wait."""
+        while self.read(0.) is None:
+            delay = self.retry.next()
+            if on_missing is not None:
+                on_missing(delay)
+            sleep(delay)
+        self.retry.reset()
@@ -0,0 +1,97 @@
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+"""Conversion of the SIXAXIS/DUALSHOCK3 inertial words to SI units.
+
+The last four words of a report are the X, Y and Z accelerometers and
+a single gyro about the vertical axis, as unsigned 10 bit values.
+Each is converted with value = (word - zero) * scale. The default
+zeros and scales are nominal values; controllers differ, so measure
+the zeros of a controller lying flat and pass them in.
+"""
+
+STANDARD_GRAVITY = 9.80665
+
+# Nominal: about 113 counts per g around a zero of 512.
+ACCEL_ZERO = (512., 512., 512.)
+ACCEL_SCALE = (STANDARD_GRAVITY / 113.,) * 3
+# Nominal: about 1 count per degree/s around a zero of 498.
+GYRO_ZERO = 498.
+GYRO_SCALE = 0.0174533
+
+class imu_calibration:
+    """Zeros and scales of the inertial sensors.
+
+    accel_scale is in m/s^2 per count and gyro_scale in rad/s per
+    count. A negative scale flips the direction of an axis.
+    """
+
+    def __init__(self, accel_zero = ACCEL_ZERO, accel_scale = ACCEL_SCALE,
+                 gyro_zero = GYRO_ZERO, gyro_scale = GYRO_SCALE):
+        if len(accel_zero) != 3 or len(accel_scale) != 3:
+            raise ValueError("accel_zero and accel_scale need 3 entries each")
+        self.accel_zero = tuple(float(v) for v in accel_zero)
+        self.accel_scale = tuple(float(v) for v in accel_scale)
+        self.gyro_zero = float(gyro_zero)
+        self.gyro_scale = float(gyro_scale)
+
+    def convert(self, words):
+        """Returns ((ax, ay, az), wz) for the four inertial words of a report."""
+        (zx, zy, zz) = self.accel_zero
+        (sx, sy, sz) = self.accel_scale
+        return (((words[0] - zx) * sx, (words[1] - zy) * sy, (words[2] - zz) * sz),
+                (words[3] - self.gyro_zero) * self.gyro_scale)
+
+class sample_batch:
+    """Collects samples and hands them over size at a time.
+
+    With size 1 every sample is handed over as soon as it is added.
+    """
+
+    def __init__(self, size = 1):
+        self.size = max(1, int(size))
+        self.samples = []
+
+    def add(self, sample):
+        """Returns the list of samples to publish, or None while the batch is filling."""
+        samples = self.samples
+        samples.append(sample)
+        if len(samples) < self.size:
+            return None
+        self.samples = []
+        return samples
+
+    def flush(self):
+        samples = self.samples
+        self.samples = []
+        return samples
@@ -0,0 +1,154 @@
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+"""sensor_msgs/Joy values straight from decoded reports.
+
+Publishing through uinput takes the path ps3joy_node, uinput,
+/dev/input/js*, joy_node, /joy. joy_output computes, in ps3joy_node
+itself, the values joy_node would publish at the end of that path:
+
+   o the input core drops changes within an axis' fuzz of the last
+     reported value and smooths those up to twice the fuzz (see
+     uinput.defuzz),
+   o the kernel joystick driver maps each axis from [min, max] to
+     [-32767, 32767], with a dead band of 2*flat around the middle,
+   o joy_node applies its deadzone, scales to [-1, 1] and flips the
+     sign of every axis,
+   o button changes are published at once. A report already carries
+     all axes, so the combining joy_node does over coalesce_interval
+     comes for free; axis changes are published at most once per
+     coalesce_interval. With nothing to publish, the last message is
+     repeated at autorepeat_rate Hz (0 disables).
+
+The timers are evaluated as reports arrive, about 100 times a second
+while a joystick is connected.
+"""
+
+from ps3joy_core.uinput import defuzz
+
+JS_MAX = 32767
+
+class joy_output:
+    """Converts decoder output vectors into Joy axes and buttons.
+
+    After update() returns True, axes (floats) and buttons (ints) hold
+    the message to publish.
+    """
+
+    def __init__(self, num_buttons, axmin, axmax, axflat, axfuzz = None, deadzone = 0.05,
+                 coalesce_interval = 0.001, autorepeat_rate = 0.):
+        self.num_buttons = num_buttons
+        self.deadzone = min(max(deadzone, 0.), 0.9)
+        self.coalesce_interval = max(coalesce_interval, 0.)
+        self.autorepeat_interval = 1. / autorepeat_rate if autorepeat_rate > 0 else None
+        # Correction coefficients of the kernel joystick driver (joydev):
+        self.corrections = []
+        for (lo, hi, flat) in zip(axmin, axmax, axflat):
+            mid = int((hi + lo) / 2.)
+            span = int((hi - lo) / 2.) - 2 * int(flat)
+            coef = int((1 << 29) / span) if span else 0
+            self.corrections.append((mid - flat, mid + flat, coef))
+        self.scale = -1. / (1. - self.deadzone) / JS_MAX
+        self.unscaled_deadzone = JS_MAX * self.deadzone
+        self.fuzz = list(axfuzz) if axfuzz is not None else [0] * len(self.corrections)
+        # Like uinput_events, only a changed value reaches the kernel, so
+        # fuzz is applied against the last reported value only then:
+        self.raw = [None] * len(self.corrections)
+        self.reported = [None] * len(self.corrections)
+        self.js_axes = [None] * len(self.corrections)
+        self.axes = [0.] * len(self.corrections)
+        self.buttons = [0] * num_buttons
+        self.pending = False
+        self.last_publish = None
+
+    def js_value(self, index, value):
+        """Returns the value /dev/input/js* would report for an axis."""
+        (low, high, coef) = self.corrections[index]
+        value = int(value)
+        if value > low:
+            if value < high:
+                return 0
+            value = (coef * (value - high)) >> 14
+        else:
+            value = (coef * (value - low)) >> 14
+        return max(-JS_MAX, min(JS_MAX, value))
+
+    def update(self, values, now):
+        """Takes one output vector (buttons, then axes). Returns True if a message is due."""
+        num_buttons = self.num_buttons
+        buttons = self.buttons
+        publish_now = False
+        for i in range(num_buttons):
+            pressed = 1 if values[i] else 0
+            if pressed != buttons[i]:
+                buttons[i] = pressed
+                publish_now = True
+        js_axes = self.js_axes
+        axes = self.axes
+        fuzz = self.fuzz
+        raw = self.raw
+        reported = self.reported
+        unscaled_deadzone = self.unscaled_deadzone
+        for i in range(len(js_axes)):
+            value = values[num_buttons + i]
+            if fuzz[i]:
+                if value == raw[i]:
+                    value = reported[i]
+                else:
+                    raw[i] = value
+                    if reported[i] is not None:
+                        value = defuzz(value, reported[i], fuzz[i])
+                    reported[i] = value
+            value = self.js_value(i, value)
+            if value == js_axes[i]:
+                continue
+            js_axes[i] = value
+            if value > unscaled_deadzone:
+                value -= unscaled_deadzone
+            elif value < -unscaled_deadzone:
+                value += unscaled_deadzone
+            else:
+                value = 0
+            axes[i] = value * self.scale
+            self.pending = True
+        last_publish = self.last_publish
+        if self.pending:
+            if last_publish is None or now - last_publish >= self.coalesce_interval:
+                publish_now = True
+        elif self.autorepeat_interval is not None and last_publish is not None:
+            if now - last_publish >= self.autorepeat_interval:
+                publish_now = True
+        if publish_now:
+            self.pending = False
+            self.last_publish = now
+        return publish_now
@@ -0,0 +1,265 @@
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+"""Building blocks of the ps3joysim load generator.
+
+Simulated reports carry their controller index and a 32 bit sequence
+number in the first three inertial words, which the decoders pass to
+uinput axes 16 to 18 unchanged, and the send time in reserved bytes.
+An output_monitor parses the events a decoder writes and matches each
+frame back to the report that produced it, giving end-to-end latency
+and loss per controller. The simulated channels are Unix
+SOCK_SEQPACKET sockets (see channel_listener), which keep reports
+apart like L2CAP does.
+"""
+
+from __future__ import print_function
+import math
+import os
+import random
+import socket
+import struct
+import threading
+import time
+
+from ps3joy_core.decoding import REPORT_PREFIX
+from ps3joy_core.uinput import uinput, uinput_events
+
+# The report layout documented in decoding, with the send time in the reserved bytes:
+SIM_REPORT = struct.Struct("!1B2x3B1x4B4x12B3x3Bd1x4H")
+SHORT_PACKET = b"\x00" * 13
+
+# uinput axis codes of the inertial words carrying the tags:
+TAG_AXES = (16, 17, 18)
+REST_GYRO = 512
+
+PATTERN_IDLE = "idle"                # sticks centered, nothing pressed
+PATTERN_SWEEP = "sweep"              # sticks sweep their whole range
+PATTERN_STORM = "storm"              # random buttons and pressures on every report
+PATTERN_BURST = "burst"              # reports sent in bursts, 1 ms apart
+PATTERN_MALFORMED = "malformed"      # some reports have a bad prefix or length
+PATTERN_SHORT = "short"              # some packets are 13 bytes, which ends the connection
+PATTERN_DISCONNECT = "disconnect"    # the connection is dropped and reopened periodically
+PATTERNS = (PATTERN_IDLE, PATTERN_SWEEP, PATTERN_STORM, PATTERN_BURST,
+            PATTERN_MALFORMED, PATTERN_SHORT, PATTERN_DISCONNECT)
+
+class report_generator:
+    """Synthesizes the reports of one simulated controller.
+
+    Without tags, the inertial words rest at mid range instead of
+    carrying the controller index and sequence number.
+    """
+
+    burst_length = 10
+    burst_spacing = 0.001
+    malformed_period = 20
+    short_period = 500
+    disconnect_period = 300
+
+    def __init__(self, index, pattern, seed = None, tags = True):
+        if pattern not in PATTERNS:
+            raise ValueError("Unknown pattern %s, expected one of %s" % (pattern, ", ".join(PATTERNS)))
+        self.index = index
+        self.pattern = pattern
+        self.random = random.Random(index if seed is None else seed)
+        self.tags = tags
+
+    def report(self, seq, now):
+        """Returns the 50 byte report with sequence number seq, sent at now."""
+        buttons = [0, 0, 0]
+        sticks = [128] * 4
+        pressures = [0] * 12
+        if self.pattern == PATTERN_SWEEP:
+            phase = (seq % 100) / 100.
+            value = int(127.5 + 127.5 * math.sin(2 * math.pi * phase))
+            sticks = [value, 255 - value, value, 255 - value]
+        elif self.pattern == PATTERN_STORM:
+            rand = self.random.randint
+            buttons = [rand(0, 255), rand(0, 255), rand(0, 1)]
+            pressures = [rand(0, 255) for i in range(12)]
+        if self.tags:
+            inertial = [self.index, seq & 0xffff, (seq >> 16) & 0xffff, REST_GYRO]
+        else:
+            inertial = [REST_GYRO] * 4
+        return SIM_REPORT.pack(REPORT_PREFIX, buttons[0], buttons[1], buttons[2],
+                               sticks[0], sticks[1], sticks[2], sticks[3], *(pressures +
+                               [3, 5, 22, now] + inertial))
+
+    def packets(self, seq, now):
+        """Returns the packets to send for report seq: (rawdata, tagged) pairs.
+
+        tagged is False for packets the decoder must reject."""
+        pattern = self.pattern
+        report = self.report(seq, now)
+        if pattern == PATTERN_MALFORMED and seq % self.malformed_period == self.malformed_period - 1:
+            if seq % (2 * self.malformed_period) < self.malformed_period:
+                return [(b"\x00" + report[1:], False)]
+            return [(report[:-1], False)]
+        if pattern == PATTERN_SHORT and seq % self.short_period == self.short_period - 1:
+            return [(SHORT_PACKET, False)]
+        return [(report, True)]
+
+    def delay(self, seq, period):
+        """Returns how long to wait before sending report seq, keeping one report per period on average."""
+        if self.pattern != PATTERN_BURST:
+            return period
+        if seq % self.burst_length != 0:
+            return self.burst_spacing
+        return max(0., self.burst_length * period - (self.burst_length - 1) * self.burst_spacing)
+
+    def disconnect(self, seq):
+        """True if the connection should be reopened after report seq."""
+        if self.pattern == PATTERN_SHORT:
+            return seq % self.short_period == self.short_period - 1
+        return self.pattern == PATTERN_DISCONNECT and seq % self.disconnect_period == self.disconnect_period - 1
+
+class latency_stats:
+    """Send times and output latencies of one simulated controller."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.sent = 0
+        self.received = 0
+        self.late = 0
+        self.latencies = []
+
+    def record_send(self, seq, now):
+        with self.lock:
+            self.pending[seq] = now
+            self.sent += 1
+
+    def record_output(self, seq, now):
+        with self.lock:
+            sent = self.pending.pop(seq, None)
+            if sent is None:
+                self.late += 1 # Duplicate, or not a tagged report.
+                return
+            self.received += 1
+            self.latencies.append(now - sent)
+
+    def percentile(self, fraction):
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return 0.
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+    def summary(self):
+        """Returns a list of (key, value) string pairs."""
+        lost = self.sent - self.received
+        loss = 100. * lost / self.sent if self.sent else 0.
+        mean = sum(self.latencies) / len(self.latencies) if self.latencies else 0.
+        return [("Sent", str(self.sent)),
+                ("Output", str(self.received)),
+                ("Lost", "%i (%.2f%%)" % (lost, loss)),
+                ("Latency mean (ms)", "%.3f" % (mean * 1000.)),
+                ("Latency p50 (ms)", "%.3f" % (self.percentile(0.5) * 1000.)),
+                ("Latency p99 (ms)", "%.3f" % (self.percentile(0.99) * 1000.)),
+                ("Latency max (ms)", "%.3f" % (max(self.latencies) * 1000. if self.latencies else 0.))]
+
+class output_monitor(threading.Thread):
+    """Reads a decoder's uinput event stream from fd and reports tagged frames.
+
+    on_frame(index, seq, now) is called for every SYN_REPORT after which
+    the tag axes hold a new sequence number.
+    """
+
+    def __init__(self, fd, on_frame):
+        threading.Thread.__init__(self, name = "output_monitor")
+        self.daemon = True
+        self.fd = fd
+        self.on_frame = on_frame
+        self.frames = 0
+
+    def run(self):
+        event = uinput_events.input_event
+        size = event.size
+        tags = {}
+        last = None
+        pending = b""
+        while True:
+            try:
+                data = os.read(self.fd, 64 * size)
+            except OSError:
+                return
+            if not data:
+                return
+            now = time.time()
+            pending += data
+            usable = len(pending) - len(pending) % size
+            for offset in range(0, usable, size):
+                (sec, usec, type, code, value) = event.unpack_from(pending, offset)
+                if type == uinput.EV_ABS and code in TAG_AXES:
+                    tags[code] = value
+                elif type == uinput.EV_SYN and len(tags) == len(TAG_AXES):
+                    tag = (tags[TAG_AXES[0]], tags[TAG_AXES[1]] | (tags[TAG_AXES[2]] << 16))
+                    if tag != last:
+                        last = tag
+                        self.frames += 1
+                        self.on_frame(tag[0], tag[1], now)
+            pending = pending[usable:]
+
+class channel_listener:
+    """Listens for one simulated L2CAP channel of every controller.
+
+    A TCP stream would merge reports sent back to back, so the channels
+    are Unix SOCK_SEQPACKET sockets, which deliver every send as one
+    message. Unix sockets have no device address, so connect(address)
+    binds the client to an abstract name ending in the controller
+    address, and accept() returns that address in place of the device
+    address, letting the multiplexer pair the two channels.
+    """
+
+    def __init__(self, backlog):
+        self.name = "\0ps3joysim-%i-%x" % (os.getpid(), id(self))
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.sock.bind(self.name)
+        self.sock.listen(backlog)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def accept(self):
+        (sock, peer) = self.sock.accept()
+        if not isinstance(peer, str):
+            peer = peer.decode()
+        return (sock, (peer.rsplit("/", 1)[-1], 0))
+
+    def connect(self, address):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        sock.bind("%s/%s" % (self.name, address))
+        sock.connect(self.name)
+        return sock
+
+    def close(self):
+        self.sock.close()
@@ -0,0 +1,73 @@
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+"""Background health checks that must stay out of the receive loop."""
+
+import threading
+
+class health_monitor(threading.Thread):
+    """Calls check() every period seconds on a daemon thread.
+
+    check returns True while the monitored service is healthy; an
+    exception counts as unhealthy. online turns False on the first
+    failed check, on_lost() is then called once from the monitor
+    thread, and the monitor stops. Reading online costs no I/O, so the
+    receive loop can test it for every report.
+    """
+
+    def __init__(self, check, period = 1.0, on_lost = None):
+        threading.Thread.__init__(self, name = "health_monitor")
+        self.daemon = True
+        self.check = check
+        self.period = period
+        self.on_lost = on_lost
+        self.online = True
+        self.checks = 0
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not self.stopping.is_set():
+            try:
+                healthy = self.check()
+            except Exception:
+                healthy = False
+            self.checks += 1
+            if not healthy:
+                self.online = False
+                if self.on_lost is not None:
+                    self.on_lost()
+                return
+            self.stopping.wait(self.period)
+
+    def stop(self):
+        self.stopping.set()
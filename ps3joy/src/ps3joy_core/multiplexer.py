@@ -0,0 +1,360 @@
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+"""Services several PS3 joystick connections from one poll loop.
+
+A controller opens two L2CAP channels, control and interrupt, from
+the same device address. The multiplexer accepts both listening
+sockets without blocking, pairs the channels by address, and runs
+each pair as a receiver session. Every wake-up of the shared poller
+services the listening sockets and all open sessions, so one
+controller's timeouts or traffic never hold up another.
+"""
+
+from __future__ import print_function
+import socket
+import sys
+import time
+import traceback
+
+from ps3joy_core.receiver import poller, BadJoystickException
+
+L2CAP_PSM_HIDP_CTRL = 17
+L2CAP_PSM_HIDP_INTR = 19
+
+# Why a connection was closed, as passed to on_closed. Only CLOSED_ENDED
+# means the controller went away on its own; the others are a session
+# that failed, a joystick that sent reports we cannot decode, a
+# reconnect taking over the address, and the loop shutting down.
+CLOSED_ENDED = "ended"
+CLOSED_ERROR = "error"
+CLOSED_UNSUPPORTED = "unsupported"
+CLOSED_REPLACED = "replaced"
+CLOSED_STOPPED = "stopped"
+
+class decoder_slots:
+    """Assigns decoders, and with them uinput devices, to controllers.
+
+    A controller that reconnects gets the decoder it had before if that
+    one is free, so its device node stays the same. Otherwise any free
+    decoder is reused, and make() is called only when all are busy.
+    """
+
+    def __init__(self, first, make = None):
+        self.decoders = [first]
+        self.make = make
+        self.homes = {}
+        self.connected = {}
+
+    def acquire(self, address):
+        busy = list(self.connected.values())
+        free = [d for d in self.decoders if d not in busy]
+        decoder = self.homes.get(address)
+        if decoder is None or decoder not in free:
+            if free:
+                decoder = free[0]
+            else:
+                decoder = self.make()
+                self.decoders.append(decoder)
+        self.homes[address] = decoder
+        self.connected[address] = decoder
+        return decoder
+
+    def release(self, address):
+        return self.connected.pop(address, None)
+
+class pending_pair:
+    def __init__(self, now):
+        self.intr = None
+        self.ctrl = None
+        self.time = now
+
+    def close(self):
+        for sock in (self.intr, self.ctrl):
+            if sock is not None:
+                sock.close()
+
+class connection_multiplexer:
+    """Accepts and runs up to max_connections controllers at once.
+
+    open_receiver(address) returns the receiver for a newly paired
+    controller. The optional callbacks are on_closed(address, reason),
+    called after a controller's connection was closed for one of the
+    CLOSED_* reasons, on_idle(), called every
+    idle_period seconds, and running(), returning False to end the loop.
+    """
+
+    pairing_timeout = 1.0
+    idle_period = 5.0
+
+    def __init__(self, intr_sock, ctrl_sock, open_receiver, max_connections = 1,
+                 on_closed = None, on_idle = None, running = None):
+        self.intr_sock = intr_sock
+        self.ctrl_sock = ctrl_sock
+        self.open_receiver = open_receiver
+        self.max_connections = max_connections
+        self.on_closed = on_closed
+        self.on_idle = on_idle
+        self.running = running
+        self.sessions = {}
+        self.pending = {}
+        self.poller = None
+
+    def run(self):
+        self.poller = poller()
+        self.poller.register(self.intr_sock, self.intr_sock)
+        self.poller.register(self.ctrl_sock, self.ctrl_sock)
+        try:
+            self.announce()
+            next_idle = time.time() + self.idle_period
+            while self.running is None or self.running():
+                deadline = next_idle
+                for link in self.sessions.values():
+                    deadline = min(deadline, link.deadline())
+                for pair in self.pending.values():
+                    deadline = min(deadline, pair.time + self.pairing_timeout)
+                ready = self.poller.select(max(0., deadline - time.time()))
+                readable = []
+                for data in ready:
+                    if data is self.intr_sock or data is self.ctrl_sock:
+                        self.accept(data)
+                    else:
+                        readable.append(data)
+                for (address, link) in list(self.sessions.items()):
+                    self.service(address, link, link in readable)
+                now = time.time()
+                self.expire_pending(now)
+                if now >= next_idle:
+                    if self.on_idle is not None:
+                        self.on_idle()
+                    next_idle = now + self.idle_period
+        finally:
+            for address in list(self.sessions.keys()):
+                self.close(address, CLOSED_STOPPED, announce = False)
+            for pair in self.pending.values():
+                pair.close()
+            self.pending.clear()
+            self.poller.close()
+            self.poller = None
+
+    def announce(self):
+        if len(self.sessions) < self.max_connections:
+            print("Waiting for connection. Disconnect your PS3 joystick from USB and press the pairing button.")
+
+    def accept(self, listen_sock):
+        (sock, (address, port)) = listen_sock.accept()
+        pair = self.pending.get(address)
+        if pair is None:
+            pair = self.pending[address] = pending_pair(time.time())
+        if listen_sock is self.intr_sock:
+            if pair.intr is not None:
+                pair.intr.close()
+            pair.intr = sock
+        else:
+            if pair.ctrl is not None:
+                pair.ctrl.close()
+            pair.ctrl = sock
+        if pair.intr is None or pair.ctrl is None:
+            return
+        del self.pending[address]
+        if address in self.sessions:
+            print("Controller %s reconnected. Dropping its previous connection."%address)
+            self.close(address, CLOSED_REPLACED, announce = False)
+        if len(self.sessions) >= self.max_connections:
+            print("Already serving %i controllers. Ignoring connection from %s."%(len(self.sessions), address), file=sys.stderr)
+            pair.close()
+            return
+        try:
+            link = self.open_receiver(address).open(pair.intr, pair.ctrl, pair.time)
+        except Exception as e:
+            traceback.print_exc()
+            print("Caught exception: %s"%str(e), file=sys.stderr)
+            pair.close()
+            if self.on_closed is not None:
+                self.on_closed(address, CLOSED_ERROR)
+            return
+        self.sessions[address] = link
+        self.poller.register(link.intr, link)
+        print("Controller %s connected (%i of %i)."%(address, len(self.sessions), self.max_connections))
+
+    def expire_pending(self, now):
+        for (address, pair) in list(self.pending.items()):
+            if now - pair.time >= self.pairing_timeout:
+                if pair.ctrl is None:
+                    print("Got interrupt connection without control connection. Giving up on it.", file=sys.stderr)
+                else:
+                    print("Got control connection without interrupt connection. Giving up on it.", file=sys.stderr)
+                pair.close()
+                del self.pending[address]
+
+    def service(self, address, link, readable):
+        reason = CLOSED_ENDED
+        try:
+            alive = link.service(readable)
+        except BadJoystickException:
+            (alive, reason) = (False, CLOSED_UNSUPPORTED)
+        except Exception as e:
+            traceback.print_exc()
+            print("Caught exception: %s"%str(e), file=sys.stderr)
+            (alive, reason) = (False, CLOSED_ERROR)
+        if not alive:
+            self.close(address, reason)
+
+    def close(self, address, reason, announce = True):
+        link = self.sessions.pop(address)
+        try:
+            self.poller.unregister(link.intr)
+            link.close()
+        finally:
+            link.ctrl.close()
+            link.intr.close()
+            print("Connection terminated.")
+            if self.on_closed is not None:
+                self.on_closed(address, reason)
+        if announce:
+            self.announce()
+
+class connection_manager:
+    """Listens for controllers and runs each one with a decoder.
+
+    Decoders come from decoder_slots, so make_decoder is only needed to
+    serve more than one controller. on_idle() is called periodically
+    (adapter checks), and the loop ends when shutdown is set or
+    running() returns False. Scripts subclass it to report closed
+    connections and to handle CTRL+C.
+    """
+
+    def __init__(self, decoder, make_decoder = None, max_controllers = 1,
+                 on_idle = None, running = None):
+        self.decoder = decoder
+        self.slots = decoder_slots(decoder, make_decoder)
+        self.max_controllers = max_controllers if make_decoder is not None else 1
+        self.on_idle = on_idle
+        self.running = running
+        self.use_asyncio = False
+        self.shutdown = False
+        self.multiplexer = None
+
+    def active(self):
+        return not self.shutdown and (self.running is None or self.running())
+
+    def stop(self):
+        """Ends listen; may be called from any thread."""
+        self.shutdown = True
+        if self.use_asyncio and self.multiplexer is not None:
+            self.multiplexer.stop()
+
+    def prepare_bluetooth_socket(self, port):
+        if sys.version_info[0] >= 3 and hasattr(socket, "BTPROTO_L2CAP"):
+            # Standard library sockets have recv_into, so the receiver
+            # reads reports into its buffer; PyBluez sockets do not.
+            sock = socket.socket(socket.AF_BLUETOOTH, socket.SOCK_SEQPACKET, socket.BTPROTO_L2CAP)
+            return self.prepare_socket(sock, (socket.BDADDR_ANY, port))
+        from bluetooth import BluetoothSocket, L2CAP
+        sock = BluetoothSocket(L2CAP)
+        return self.prepare_socket(sock, ("", port))
+
+    def prepare_net_socket(self, port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        return self.prepare_socket(sock, ("", port))
+
+    def prepare_socket(self, sock, address):
+        first_loop = True
+        while True:
+            try:
+                sock.bind(address)
+            except Exception as e:
+                print(repr(e))
+                if first_loop:
+                    print("Error binding to socket, will retry every 5 seconds. Do you have another ps3joy.py running? This error occurs on some distributions (such as Ubuntu Karmic). Please read http://www.ros.org/wiki/ps3joy/Troubleshooting for solutions.", file=sys.stderr)
+                first_loop = False
+                time.sleep(0.5)
+                continue
+            sock.listen(self.max_controllers)
+            return sock
+
+    def listen_net(self, intr_port, ctrl_port):
+        intr_sock = self.prepare_net_socket(intr_port)
+        ctrl_sock = self.prepare_net_socket(ctrl_port)
+        self.listen(intr_sock, ctrl_sock)
+
+    def listen_bluetooth(self):
+        intr_sock = self.prepare_bluetooth_socket(L2CAP_PSM_HIDP_INTR)
+        ctrl_sock = self.prepare_bluetooth_socket(L2CAP_PSM_HIDP_CTRL)
+        self.listen(intr_sock, ctrl_sock)
+
+    def listen(self, intr_sock, ctrl_sock):
+        if self.use_asyncio:
+            self.listen_async(intr_sock, ctrl_sock)
+            return
+        self.multiplexer = connection_multiplexer(intr_sock, ctrl_sock, self.open_receiver,
+                                                  max_connections = self.max_controllers,
+                                                  on_closed = self.closed,
+                                                  on_idle = self.on_idle,
+                                                  running = self.active)
+        while self.active():
+            try:
+                self.multiplexer.run()
+            except KeyboardInterrupt:
+                self.interrupted()
+            except Exception as e:
+                traceback.print_exc()
+                print("Caught exception: %s"%str(e), file=sys.stderr)
+                time.sleep(1)
+
+    def listen_async(self, intr_sock, ctrl_sock):
+        from ps3joy_core.aio import async_connection_manager # Python 3 only
+        self.multiplexer = async_connection_manager(intr_sock, ctrl_sock, self.slots.acquire,
+                                                    max_connections = self.max_controllers,
+                                                    on_closed = self.closed,
+                                                    idle = self.on_idle)
+        if self.shutdown: # stop() was called before the loop existed.
+            return
+        try:
+            self.multiplexer.run()
+        except KeyboardInterrupt:
+            self.interrupted()
+
+    def open_receiver(self, address):
+        return self.slots.acquire(address).receiver
+
+    def closed(self, address, reason):
+        """Releases the decoder of a closed connection and returns it.
+
+        Returns None if the connection never got a decoder.
+        """
+        return self.slots.release(address)
+
+    def interrupted(self):
+        print("CTRL+C detected. Exiting.")
+        sys.exit(0)
@@ -0,0 +1,530 @@
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+"""Event-driven receive loop for one PS3 joystick connection.
+
+The loop blocks until the interrupt channel is readable or the next
+deadline expires, then drains every pending report with non-blocking
+receives before going back to sleep. The deadlines reproduce the historical behavior of the
+ps3joy decoders:
+
+   o every 0.1 seconds without any data, the activation command is
+     (re)sent on the control channel,
+   o 0.1 seconds after the last valid report, all outputs are zeroed,
+   o 5 seconds after the last valid report, the connection is dropped,
+   o after inactivity_timeout seconds without buttons pressed or sticks
+     moved, the connection is dropped to save battery.
+"""
+
+from __future__ import print_function
+from array import array
+import errno
+import os
+import select
+import socket
+import sys
+import time
+
+try:
+    import selectors
+except ImportError: # Python 2 has no selectors module; use epoll directly.
+    selectors = None
+
+STEP_ACTIVE = 1
+STEP_IDLE = 2
+STEP_ERROR = 3
+
+ACTIVATE_COMMAND = b"\x53\xf4\x42\x03\x00\x00"
+RECV_SIZE = 128
+
+_EAGAIN_MESSAGE = os.strerror(errno.EAGAIN)
+
+def would_block(error):
+    """True if error only says that a MSG_DONTWAIT receive found no packet."""
+    code = getattr(error, "errno", None)
+    if code is not None:
+        return code in (errno.EAGAIN, errno.EWOULDBLOCK)
+    # PyBluez before 0.23 raises BluetoothError(str(e)), dropping errno.
+    return _EAGAIN_MESSAGE in str(error)
+
+def recv_into_method(sock):
+    """Returns sock.recv_into, or None if reports must be received with recv."""
+    # PyBluez sockets, used on Python 2 and where the socket module lacks
+    # Bluetooth, have no recv_into. On Python 2 a memoryview neither
+    # compares equal to nor converts to the str reports steps expect.
+    if sys.version_info[0] < 3:
+        return None
+    return getattr(sock, "recv_into", None)
+
+class BadJoystickException(Exception):
+    def __init__(self):
+        Exception.__init__(self, "Unsupported joystick.")
+
+class poller:
+    """Waits for any of a set of sockets to become readable.
+
+    Each socket is registered with a data value, which select returns
+    for every socket that is readable.
+    """
+
+    def __init__(self):
+        if selectors is not None:
+            self.selector = selectors.DefaultSelector()
+            self.epoll = None
+        else:
+            self.selector = None
+            self.epoll = select.epoll()
+            self.data = {}
+
+    def register(self, sock, data):
+        if self.selector is not None:
+            self.selector.register(sock, selectors.EVENT_READ, data)
+        else:
+            self.epoll.register(sock.fileno(), select.EPOLLIN)
+            self.data[sock.fileno()] = data
+
+    def unregister(self, sock):
+        if self.selector is not None:
+            self.selector.unregister(sock)
+        else:
+            self.epoll.unregister(sock.fileno())
+            del self.data[sock.fileno()]
+
+    def select(self, timeout):
+        """Returns the data of the sockets that are readable within timeout seconds."""
+        if self.selector is not None:
+            return [key.data for (key, events) in self.selector.select(timeout)]
+        try:
+            return [self.data[fd] for (fd, events) in self.epoll.poll(timeout)]
+        except IOError: # EINTR
+            return []
+
+    def close(self):
+        if self.selector is not None:
+            self.selector.close()
+        else:
+            self.epoll.close()
+
+class readable_waiter:
+    """Waits for a single socket to become readable."""
+
+    def __init__(self, sock):
+        self.poller = poller()
+        self.poller.register(sock, sock)
+
+    def wait(self, timeout):
+        """Returns True if the socket is readable within timeout seconds."""
+        return len(self.poller.select(timeout)) > 0
+
+    def close(self):
+        self.poller.close()
+
+def _milliseconds(seconds):
+    return "%.1f" % (seconds * 1000.) if seconds is not None else "never"
+
+class receive_stats:
+    """Throughput, latency and link quality of a receive loop.
+
+    latency is measured per report, from the wake-up that found it
+    pending to the end of its decoding, and so includes the time it
+    waited behind other reports drained in the same wake-up.
+
+    The time and report count of the last history wake-ups, and the
+    outcome of the last history reports, are kept in preallocated
+    rings, so memory stays constant, and link_quality() derives the
+    recent rate, inter-arrival percentiles, reports per wake-up,
+    invalid count and activity ratio from them only when asked.
+    Reports drained in one wake-up share its time, so inter-arrival
+    times are taken between wake-ups, and the reports that queued up
+    show in the reports per wake-up instead.
+
+    The connection is timed from the acceptance of its first channel
+    to the pairing of both, the first report and the first valid
+    report (see connect_times). The number of connections and their
+    mean and maximum time to the first valid report are kept across
+    reset, to track reconnect latency.
+    """
+
+    _VALID = 1
+    _ACTIVE = 2
+
+    def __init__(self, window = 1.0, history = 256):
+        self.window = window
+        self.history = history
+        self.times = array('d', [0.] * history)
+        self.batches = array('H', [0] * history)
+        self.flags = bytearray(history)
+        self.connects = 0
+        self.connect_time_total = 0.
+        self.connect_time_max = 0.
+        self.reset()
+
+    def reset(self):
+        self.packets = 0
+        self.invalid = 0
+        self.wakeups = 0
+        self.max_batch = 0
+        self.latency_total = 0.
+        self.latency_max = 0.
+        self.rate = 0.
+        self.window_start = None
+        self.window_packets = 0
+        self.fullstops = 0
+        self.last_valid = None
+        self.accepted = None
+        self.opened = None
+        self.first_report = None
+        self.first_valid = None
+        self.activate_commands = 0
+
+    def record_open(self, accepted, opened):
+        """Starts timing a connection whose first channel was accepted at accepted."""
+        self.accepted = accepted
+        self.opened = opened
+
+    def record_activate_command(self):
+        self.activate_commands += 1
+
+    def record(self, wake_time, done_time, valid, active = False):
+        self.flags[self.packets % self.history] = (self._VALID if valid else 0) | (self._ACTIVE if active else 0)
+        if self.packets == 0:
+            self.first_report = wake_time
+        self.packets += 1
+        if not valid:
+            self.invalid += 1
+        else:
+            if self.last_valid is None:
+                self.record_first_valid(wake_time)
+            self.last_valid = wake_time
+        latency = done_time - wake_time
+        self.latency_total += latency
+        if latency > self.latency_max:
+            self.latency_max = latency
+
+    def record_wakeup(self, wake_time, count, now):
+        """Counts a wake-up at wake_time that drained count reports by now."""
+        slot = self.wakeups % self.history
+        self.times[slot] = wake_time
+        self.batches[slot] = count
+        self.wakeups += 1
+        if count > self.max_batch:
+            self.max_batch = count
+        if self.window_start is None:
+            self.window_start = now
+        self.window_packets += count
+        if now - self.window_start >= self.window:
+            self.rate = self.window_packets / (now - self.window_start)
+            self.window_start = now
+            self.window_packets = 0
+
+    def record_first_valid(self, now):
+        self.first_valid = now
+        if self.accepted is not None:
+            elapsed = now - self.accepted
+            self.connects += 1
+            self.connect_time_total += elapsed
+            if elapsed > self.connect_time_max:
+                self.connect_time_max = elapsed
+
+    def connect_times(self):
+        """Returns a dict of the timings of the current connection.
+
+        paired, first_report and first_valid are the seconds from the
+        acceptance of the first channel to the pairing of both, the
+        first report and the first valid report (None until it came).
+        activate_commands counts the activation commands sent.
+        """
+        since_accept = lambda t: t - self.accepted if t is not None and self.accepted is not None else None
+        return {"paired": since_accept(self.opened),
+                "first_report": since_accept(self.first_report),
+                "first_valid": since_accept(self.first_valid),
+                "activate_commands": self.activate_commands}
+
+    def connect_message(self):
+        times = self.connect_times()
+        ms = lambda t: _milliseconds(t) + " ms" if t is not None else "never"
+        return "Channels paired after %s, first report after %s (%i activation commands), first valid report after %s." % (
+            ms(times["paired"]), ms(times["first_report"]), times["activate_commands"], ms(times["first_valid"]))
+
+    def record_fullstop(self):
+        """Counts outputs zeroed because valid reports stopped arriving."""
+        self.fullstops += 1
+
+    def latency_mean(self):
+        if self.packets == 0:
+            return 0.
+        return self.latency_total / self.packets
+
+    def _ring_order(self, total):
+        count = min(total, self.history)
+        start = (total - count) % self.history
+        return [(start + i) % self.history for i in range(count)]
+
+    def recent(self):
+        """Returns the times and report counts of the recent wake-ups, and
+        the flags of the recent reports, oldest first."""
+        wakeups = self._ring_order(self.wakeups)
+        return ([self.times[i] for i in wakeups], [self.batches[i] for i in wakeups],
+                [self.flags[i] for i in self._ring_order(self.packets)])
+
+    def link_quality(self, now = None):
+        """Returns a dict of rolling statistics over the recent reports.
+
+        Keys are rate (packets/s), interarrival_p50 and interarrival_p99
+        (seconds between wake-ups that found reports), batch_mean
+        (reports per wake-up), invalid (count), activity (fraction of
+        valid reports with a button pressed or stick moved) and
+        since_valid (seconds since the last valid report, None if there
+        was none).
+        """
+        if now is None:
+            now = time.time()
+        (times, batches, flags) = self.recent()
+        intervals = sorted(times[i] - times[i - 1] for i in range(1, len(times)))
+        percentile = lambda fraction: intervals[min(len(intervals) - 1, int(fraction * len(intervals)))] if intervals else 0.
+        span = times[-1] - times[0] if times else 0.
+        valid = sum(1 for f in flags if f & self._VALID)
+        active = sum(1 for f in flags if f & self._ACTIVE)
+        return {"rate": (sum(batches) - batches[0]) / span if span > 0 else 0.,
+                "interarrival_p50": percentile(0.5),
+                "interarrival_p99": percentile(0.99),
+                "batch_mean": float(sum(batches)) / len(batches) if batches else 0.,
+                "invalid": len(flags) - valid,
+                "activity": float(active) / valid if valid else 0.,
+                "since_valid": now - self.last_valid if self.last_valid is not None else None}
+
+    def summary(self, now = None):
+        """Returns a list of (key, value) string pairs."""
+        link = self.link_quality(now)
+        since_valid = link["since_valid"]
+        return [("Packets", str(self.packets)),
+                ("Invalid packets", str(self.invalid)),
+                ("Rate (packets/s)", "%.1f" % self.rate),
+                ("Latency mean (ms)", "%.3f" % (self.latency_mean() * 1000.)),
+                ("Latency max (ms)", "%.3f" % (self.latency_max * 1000.)),
+                ("Max reports per wake-up", str(self.max_batch)),
+                ("Recent rate (packets/s)", "%.1f" % link["rate"]),
+                ("Recent inter-arrival p50 (ms)", "%.3f" % (link["interarrival_p50"] * 1000.)),
+                ("Recent inter-arrival p99 (ms)", "%.3f" % (link["interarrival_p99"] * 1000.)),
+                ("Recent reports per wake-up", "%.2f" % link["batch_mean"]),
+                ("Recent invalid packets", "%i of %i" % (link["invalid"], min(self.packets, self.history))),
+                ("Recent activity ratio", "%.2f" % link["activity"]),
+                ("Fullstops", str(self.fullstops)),
+                ("Since last valid report (s)", "%.3f" % since_valid if since_valid is not None else "never")] + \
+               self.connect_summary()
+
+    def connect_summary(self):
+        if self.accepted is None:
+            return []
+        times = self.connect_times()
+        return [("Channels paired after (ms)", _milliseconds(times["paired"])),
+                ("First report after (ms)", _milliseconds(times["first_report"])),
+                ("First valid report after (ms)", _milliseconds(times["first_valid"])),
+                ("Activation commands", str(times["activate_commands"])),
+                ("Connections", str(self.connects)),
+                ("Connect time mean (ms)", _milliseconds(self.connect_time_total / self.connects if self.connects else None)),
+                ("Connect time max (ms)", _milliseconds(self.connect_time_max if self.connects else None))]
+
+class session:
+    """State of one open connection.
+
+    Created by receiver.open. The owner of the session waits until the
+    interrupt channel is readable or deadline() has passed, then calls
+    service; when service returns False, the connection is over and the
+    owner calls close.
+
+    The activation command is due at once, so the first service call
+    sends it. Until the first report, it is resent after
+    receiver.activate_retry seconds, doubling up to activate_period;
+    afterwards, whenever reports stop for activate_period.
+    """
+
+    def __init__(self, receiver, intr, ctrl):
+        self.receiver = receiver
+        self.intr = intr
+        self.ctrl = ctrl
+        self.waiter = readable_waiter(intr)
+        self.recv_into = recv_into_method(intr)
+        self.activated = False
+        self.timed = False
+        receiver.fullstop()
+        self.lastactivitytime = self.lastvalidtime = self.lastframetime = time.time()
+        self.nextactivatetime = self.lastframetime
+        self.activate_retry = receiver.activate_retry
+        self.stopped = True
+
+    def deadline(self):
+        """Returns the time at which service must be called even without data."""
+        receiver = self.receiver
+        deadline = min(self.nextactivatetime,
+                       self.lastvalidtime + receiver.disconnect_timeout,
+                       self.lastactivitytime + receiver.inactivity_timeout)
+        if not self.stopped:
+            deadline = min(deadline, self.lastvalidtime + receiver.fullstop_timeout)
+        return deadline
+
+    def service(self, readable):
+        """Handles one wake-up. Returns False when the connection should be closed."""
+        receiver = self.receiver
+        intr = self.intr
+        ctrl = self.ctrl
+        curtime = time.time()
+        if not readable:
+            if curtime >= self.nextactivatetime:
+                ctrl.send(ACTIVATE_COMMAND) # Try activating the stream.
+                receiver.stats.record_activate_command()
+                if self.activated:
+                    self.nextactivatetime = curtime + receiver.activate_period
+                else:
+                    self.nextactivatetime = curtime + self.activate_retry
+                    self.activate_retry = min(2 * self.activate_retry, receiver.activate_period)
+        else: # Got one or more frames.
+            if not self.activated:
+                if receiver.on_activated is not None:
+                    receiver.on_activated(ctrl)
+                self.activated = True
+            count = 0
+            flags = 0 # The socket is readable, so the first receive finds a report.
+            while True:
+                if receiver.before_recv is not None and not receiver.before_recv(ctrl):
+                    return False
+                try:
+                    if self.recv_into is not None:
+                        rawdata = receiver.packets[self.recv_into(receiver.buffer, 0, flags)]
+                    else:
+                        rawdata = intr.recv(RECV_SIZE, flags)
+                except IOError as s: # BluetoothError is an IOError
+                    if count > 0 and would_block(s):
+                        break # Drained.
+                    print("Got Bluetooth error %s. Disconnecting."%s)
+                    return False
+                if len(rawdata) == 0: # Orderly shutdown of socket
+                    print("Joystick shut down the connection, battery may be discharged.")
+                    return False
+                if receiver.capture is not None:
+                    receiver.capture.write(curtime, rawdata)
+                stepout = receiver.step(rawdata)
+                receiver.stats.record(curtime, time.time(), stepout != STEP_ERROR, stepout == STEP_ACTIVE)
+                if stepout != STEP_ERROR:
+                    self.lastvalidtime = curtime
+                    self.stopped = False
+                    if not self.timed:
+                        print(receiver.stats.connect_message())
+                        self.timed = True
+                if stepout == STEP_ACTIVE:
+                    self.lastactivitytime = curtime
+                count += 1
+                if count >= receiver.max_batch:
+                    break
+                flags = socket.MSG_DONTWAIT
+            self.lastframetime = time.time()
+            self.nextactivatetime = self.lastframetime + receiver.activate_period
+            receiver.stats.record_wakeup(curtime, count, self.lastframetime)
+        if curtime - self.lastactivitytime > receiver.inactivity_timeout:
+            print("Joystick inactive for %.0f seconds. Disconnecting to save battery."%receiver.inactivity_timeout)
+            return False
+        if not self.stopped and curtime - self.lastvalidtime >= receiver.fullstop_timeout: # Zero all outputs if we don't hear a valid frame for 0.1 seconds
+            receiver.fullstop()
+            receiver.stats.record_fullstop()
+            self.stopped = True
+        if curtime - self.lastvalidtime >= receiver.disconnect_timeout: # Disconnect if we don't hear a valid frame for 5 seconds
+            print("No valid data for 5 seconds. Disconnecting. This should not happen, please report it.")
+            return False
+        return True
+
+    def close(self):
+        self.waiter.close()
+        self.receiver.fullstop()
+
+class receiver:
+    """Runs the receive loop of one connection.
+
+    step(rawdata) decodes one report and returns STEP_ACTIVE,
+    STEP_IDLE or STEP_ERROR. fullstop() zeroes all outputs. The
+    optional callbacks are on_activated(ctrl), called when the first
+    report arrives (it must not block, as reports wait for it),
+    before_recv(ctrl), called before each report is read and returning
+    False to end the connection, and running(), returning False to end
+    the loop. If capture is set to a
+    capture.report_writer, every report is logged with its receive time.
+
+    On Python 3, sockets that have recv_into receive into one preallocated
+    buffer, and step gets a memoryview of the report, valid until the next one
+    is received. Steps that keep reports must copy them. This covers
+    network links and Bluetooth links listened for with the standard
+    library's Bluetooth sockets, which the multiplexer uses where the
+    socket module has them; PyBluez sockets are read with recv.
+    """
+
+    activate_retry = 0.01
+    activate_period = 0.1
+    fullstop_timeout = 0.1
+    disconnect_timeout = 5
+    max_batch = 64
+
+    def __init__(self, step, fullstop, inactivity_timeout = float(1e3000),
+                 on_activated = None, before_recv = None, running = None):
+        self.step = step
+        self.fullstop = fullstop
+        self.inactivity_timeout = inactivity_timeout
+        self.on_activated = on_activated
+        self.before_recv = before_recv
+        self.running = running
+        self.stats = receive_stats()
+        self.capture = None
+        # packets[n] views the first n bytes of buffer, so that receiving
+        # a report creates no object at all.
+        self.buffer = bytearray(RECV_SIZE)
+        view = memoryview(self.buffer)
+        self.packets = [view[:n] for n in range(RECV_SIZE + 1)]
+
+    def open(self, intr, ctrl, accepted = None):
+        """Starts a connection and returns its session.
+
+        accepted is the time the first of the two channels was
+        accepted, from which the connection is timed; default now.
+        """
+        self.stats.reset()
+        now = time.time()
+        self.stats.record_open(accepted if accepted is not None else now, now)
+        return session(self, intr, ctrl)
+
+    def run(self, intr, ctrl):
+        link = self.open(intr, ctrl)
+        try:
+            while self.running is None or self.running():
+                readable = link.waiter.wait(max(0., link.deadline() - time.time()))
+                if not link.service(readable):
+                    return
+        finally:
+            link.close()
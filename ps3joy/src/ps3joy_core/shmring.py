@@ -0,0 +1,180 @@
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+"""Shared-memory ring of decoded frames for same-host consumers.
+
+A ring_writer appends fixed-size records to a memory-mapped file,
+usually under /dev/shm. Any number of ring_reader instances in other
+processes map the same file read-only and pick up the latest frame, or
+every frame since the last one they saw, straight from the mapping:
+no system calls, no copies beyond unpacking the values, and no ROS
+serialization.
+
+Layout (native byte order):
+
+  header, 64 bytes:
+    0   8s   magic, "JSRING1\\0"
+    8   I    number of slots
+    12  I    slot size in bytes
+    16  Q    head: sequence number of the last complete frame (0: none)
+    24  d    time the ring was created
+    32  32s  struct format of the records, NUL padded
+  slots, each slot size bytes:
+    0   Q    sequence number, written before the record
+    8        record
+    -8  Q    sequence number, written after the record
+
+Frame n (starting at 1) goes into slot (n - 1) % slots. A reader
+accepts a slot only if both sequence numbers match the frame it
+expects, so a frame that the writer overwrote while it was being read
+is dropped rather than returned torn. The writer replaces an existing
+file instead of truncating it, so readers of an earlier ring keep a
+valid mapping; reopen to follow a restarted writer.
+
+The wiimote driver writes its states in the same layout, so readers
+work with either ring. The two packages do not depend on each other,
+so wiimote keeps its own copy of this module; test_shmring in both
+packages pins the layout byte for byte, and a change to it has to be
+made in both.
+"""
+
+from __future__ import print_function
+import mmap
+import os
+import struct
+import time
+
+MAGIC = b"JSRING1\0"
+HEADER = struct.Struct("=8sIIQd32s")
+_SEQ = struct.Struct("=Q")
+HEAD_OFFSET = 16
+SLOTS = 256
+
+class ring_writer:
+    """Creates the ring at path and appends records of record_format."""
+
+    def __init__(self, path, record_format, slots = SLOTS):
+        self.record = struct.Struct(record_format)
+        self.slots = slots
+        self.slot_size = (2 * _SEQ.size + self.record.size + 7) // 8 * 8
+        self.path = path
+        self.seq = 0
+        size = HEADER.size + slots * self.slot_size
+        tmp = "%s.%i.tmp" % (path, os.getpid())
+        fd = os.open(tmp, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        HEADER.pack_into(self.map, 0, MAGIC, slots, self.slot_size, 0, time.time(),
+                         record_format.encode("ascii"))
+        os.rename(tmp, path)
+
+    def write(self, *values):
+        seq = self.seq + 1
+        offset = HEADER.size + (seq - 1) % self.slots * self.slot_size
+        _SEQ.pack_into(self.map, offset, seq)
+        self.record.pack_into(self.map, offset + _SEQ.size, *values)
+        _SEQ.pack_into(self.map, offset + self.slot_size - _SEQ.size, seq)
+        _SEQ.pack_into(self.map, HEAD_OFFSET, seq)
+        self.seq = seq
+
+    def close(self):
+        self.map.close()
+
+class ring_reader:
+    """Maps the ring at path read-only.
+
+    lost counts the frames that read() could not return because the
+    writer had already overwritten them.
+    """
+
+    def __init__(self, path):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            self.map = mmap.mmap(fd, os.fstat(fd).st_size, access = mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        if len(self.map) < HEADER.size:
+            self.map.close()
+            raise IOError("Not a joystick ring: %s" % path)
+        (magic, self.slots, self.slot_size, head, self.created, record_format) = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or len(self.map) < HEADER.size + self.slots * self.slot_size:
+            self.map.close()
+            raise IOError("Not a joystick ring: %s" % path)
+        self.format = record_format.rstrip(b"\0").decode("ascii")
+        self.record = struct.Struct(self.format)
+        self.lost = 0
+
+    def head(self):
+        """Sequence number of the last complete frame, 0 if none was written."""
+        return _SEQ.unpack_from(self.map, HEAD_OFFSET)[0]
+
+    def get(self, seq):
+        """The values of frame seq, or None if it is no longer (or not yet) in the ring."""
+        offset = HEADER.size + (seq - 1) % self.slots * self.slot_size
+        after = _SEQ.unpack_from(self.map, offset + self.slot_size - _SEQ.size)[0]
+        values = self.record.unpack_from(self.map, offset + _SEQ.size)
+        before = _SEQ.unpack_from(self.map, offset)[0]
+        if before != seq or after != seq:
+            return None
+        return values
+
+    def latest(self):
+        """(seq, values) of the newest frame, or None if the ring is empty."""
+        while True:
+            seq = self.head()
+            if seq == 0:
+                return None
+            values = self.get(seq)
+            if values is not None:
+                return (seq, values)
+            # The writer lapped the ring while we were reading; try again.
+
+    def read(self, since = 0):
+        """[(seq, values)] of the frames after frame since, oldest first."""
+        head = self.head()
+        first = max(since + 1, head - self.slots + 1)
+        self.lost += max(0, first - since - 1)
+        frames = []
+        for seq in range(first, head + 1):
+            values = self.get(seq)
+            if values is None:
+                self.lost += 1
+            else:
+                frames.append((seq, values))
+        return frames
+
+    def close(self):
+        self.map.close()
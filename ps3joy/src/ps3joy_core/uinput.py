@@ -0,0 +1,288 @@
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+"""Linux uinput joystick device shared by ps3joy.py and ps3joy_node.py."""
+
+from __future__ import print_function
+from array import array
+import fcntl
+import os
+import struct
+import sys
+import time
+
+class uinput:
+    EV_SYN = 0
+    EV_KEY = 1
+    EV_REL = 2
+    EV_ABS = 3
+    SYN_REPORT = 0
+    BUS_USB = 3
+    ABS_MAX = 0x3f
+
+def defuzz(value, old, fuzz, smoothing = True):
+    """The kernel's input_defuzz_abs_event: returns the value to report.
+
+    Changes within fuzz/2 of the last reported value are dropped. With
+    smoothing, changes within fuzz and 2*fuzz are averaged with it, as
+    the kernel does; without, they pass unchanged.
+    """
+    half = fuzz // 2
+    if old - half < value < old + half:
+        return old
+    if smoothing:
+        if old - fuzz < value < old + fuzz:
+            return int((old * 3 + value) / 4.) # C division truncates.
+        if old - fuzz * 2 < value < old + fuzz * 2:
+            return int((old + value) / 2.)
+    return value
+
+class axis_filter:
+    """Per-axis jitter filtering done before events are written.
+
+    fuzz is applied like the kernel's absfuzz (see defuzz). Values
+    within flat of center are reported as center, like joydev's dead
+    zone; flat and center default to no dead zone. Lists have one entry
+    per axis, and 0 disables that part of the filter for an axis.
+    """
+
+    def __init__(self, fuzz, flat = None, center = None, smoothing = True):
+        if flat is None:
+            flat = [0] * len(fuzz)
+        if center is None:
+            center = [0] * len(fuzz)
+        if len(flat) != len(fuzz) or len(center) != len(fuzz):
+            raise Exception("axis_filter.__init__: fuzz, flat and center should have same length")
+        self.fuzz = list(fuzz)
+        self.flat = list(flat)
+        self.center = list(center)
+        self.smoothing = smoothing
+
+class uinput_events:
+    """Turns output vectors into batches of input_event records.
+
+    Values are compared against the previous frame, kept in an
+    array. All changed values plus a trailing EV_SYN/SYN_REPORT are
+    packed into one preallocated buffer and written with a single
+    os.write, so each frame costs at most one system call. file is a
+    file descriptor, or any object with a write method (such as an
+    io.BytesIO) to keep the events in memory.
+
+    An axis_filter for the EV_ABS entries, which come last, drops jitter
+    before it is written; suppressed counts the changes it held back.
+    """
+
+    input_event = struct.Struct("LLHHi")
+
+    def __init__(self, file, types, codes, axfilter = None):
+        if len(types) != len(codes):
+            raise Exception("uinput_events.__init__: types and codes should have same length")
+        self.file = file
+        if isinstance(file, int):
+            self.write = lambda data: os.write(file, data)
+        else:
+            self.write = file.write
+        self.type = array('H', types)
+        self.code = array('H', codes)
+        self.value = array('i', [0] * len(codes))
+        self.initialized = False
+        self.buffer = bytearray((len(codes) + 1) * self.input_event.size)
+        self.view = memoryview(self.buffer)
+        self.writes = 0
+        self.events = 0
+        self.bytes = 0
+        self.suppressed = 0
+        # (index, fuzz, flat, center) of the filtered entries:
+        self.filters = []
+        self.smoothing = True
+        if axfilter is not None:
+            first = len(codes) - len(axfilter.fuzz)
+            self.filters = [(first + i, axfilter.fuzz[i], axfilter.flat[i], axfilter.center[i])
+                            for i in range(len(axfilter.fuzz)) if axfilter.fuzz[i] or axfilter.flat[i]]
+            self.smoothing = axfilter.smoothing
+        self.filtered = [0] * len(codes)
+        self.raw = [0] * len(codes) # Unfiltered values of the last frame.
+
+    def filter(self, value):
+        """Returns value with the axis filter applied against the last written frame."""
+        out = self.filtered
+        out[:] = value
+        previous = self.value
+        raw = self.raw
+        initialized = self.initialized
+        smoothing = self.smoothing
+        for (i, fuzz, flat, center) in self.filters:
+            v = value[i]
+            if initialized and v == raw[i]:
+                # Unfiltered, nothing would be written for this axis, so the
+                # kernel would not have filtered anything either.
+                out[i] = previous[i]
+                continue
+            raw[i] = v
+            if flat and center - flat <= v <= center + flat:
+                v = center
+            if fuzz and initialized:
+                v = defuzz(v, previous[i], fuzz, smoothing)
+            if initialized and v == previous[i]:
+                self.suppressed += 1
+            out[i] = v
+        return out
+
+    def update(self, value):
+        """Emit events for the entries of value that changed since the last call.
+
+        Returns the number of value events written.
+        """
+        if len(value) != len(self.value):
+            print("Unexpected length for value in update (%i instead of %i). This is a bug."%(len(value), len(self.value)), file=sys.stderr)
+        if self.filters:
+            value = self.filter(value)
+        t = time.time()
+        th = int(t)
+        tl = int((t - th) * 1000000)
+        pack_into = self.input_event.pack_into
+        event_size = self.input_event.size
+        buffer = self.buffer
+        previous = self.value
+        types = self.type
+        codes = self.code
+        force = not self.initialized
+        offset = 0
+        for i in range(min(len(value), len(previous))):
+            v = value[i]
+            if force or v != previous[i]:
+                pack_into(buffer, offset, th, tl, types[i], codes[i], v)
+                offset += event_size
+                previous[i] = v
+        if offset == 0:
+            return 0
+        self.initialized = True
+        pack_into(buffer, offset, th, tl, uinput.EV_SYN, uinput.SYN_REPORT, 0)
+        self.write(self.view[:offset + event_size])
+        self.writes += 1
+        self.bytes += offset + event_size
+        count = offset // event_size
+        self.events += count
+        return count
+
+class uinputjoy:
+    def open_uinput(self):
+        for name in ["/dev/input/uinput", "/dev/misc/uinput", "/dev/uinput"]:
+            try:
+                return os.open(name, os.O_WRONLY)
+                break
+            except Exception as e:
+                #print >> sys.stderr, "Error opening uinput: %s"%str(e)
+                pass
+        return None
+
+    def __init__(self, buttons, axes, axmin, axmax, axfuzz, axflat, axfilter = None):
+        # axfilter: axis_filter applied before writing. The kernel does not
+        # defuzz the axes it filters again.
+        self.file = self.open_uinput()
+        if self.file == None:
+            print("Trying to modprobe uinput.", file=sys.stderr)
+            os.system("modprobe uinput > /dev/null 2>&1")
+            time.sleep(1) # uinput isn't ready to go right away.
+            self.file = self.open_uinput()
+            if self.file == None:
+                print("Can't open uinput device. Is it accessible by this user? Did you mean to run as root?", file=sys.stderr)
+                raise IOError
+        #id = uinput.input_id()
+        #id.bustype = uinput.BUS_USB
+        #id.vendor = 0x054C
+        #id.product = 0x0268
+        #id.version = 0
+        #info = uinput.uinput_user_dev()
+        #info.name = "Sony Playstation SixAxis/DS3"
+        #info.id = id
+
+        UI_SET_EVBIT   = 0x40045564
+        UI_SET_KEYBIT  = 0x40045565
+        UI_SET_RELBIT  = 0x40045566
+        UI_DEV_CREATE  = 0x5501
+        UI_SET_RELBIT  = 0x40045566
+        UI_SET_ABSBIT  = 0x40045567
+        uinput_user_dev = "80sHHHHi" + (uinput.ABS_MAX+1)*4*'i'
+
+        if len(axes) != len(axmin) or len(axes) != len(axmax):
+            raise Exception("uinputjoy.__init__: axes, axmin and axmax should have same length")
+        absmin = [0] * (uinput.ABS_MAX+1)
+        absmax = [0] * (uinput.ABS_MAX+1)
+        absfuzz = [2] * (uinput.ABS_MAX+1)
+        absflat = [4] * (uinput.ABS_MAX+1)
+        for i in range(0, len(axes)):
+            absmin[axes[i]] = axmin[i]
+            absmax[axes[i]] = axmax[i]
+            absfuzz[axes[i]] = axfuzz[i] if axfilter is None or not axfilter.fuzz[i] else 0
+            absflat[axes[i]] = axflat[i]
+
+        os.write(self.file, struct.pack(uinput_user_dev, b"Sony Playstation SixAxis/DS3",
+            uinput.BUS_USB, 0x054C, 0x0268, 0, 0, *(absmax + absmin + absfuzz + absflat)))
+
+        fcntl.ioctl(self.file, UI_SET_EVBIT, uinput.EV_KEY)
+
+        for b in buttons:
+            fcntl.ioctl(self.file, UI_SET_KEYBIT, b)
+
+        for a in axes:
+            fcntl.ioctl(self.file, UI_SET_EVBIT, uinput.EV_ABS)
+            fcntl.ioctl(self.file, UI_SET_ABSBIT, a)
+
+        fcntl.ioctl(self.file, UI_DEV_CREATE)
+
+        self.events = uinput_events(self.file,
+                                    [uinput.EV_KEY] * len(buttons) + [uinput.EV_ABS] * len(axes),
+                                    list(buttons) + list(axes), axfilter)
+
+    def update(self, value):
+        self.events.update(value)
+
+class uinput_sink:
+    """Produces the same event stream as uinputjoy, written to any file descriptor.
+
+    Lets decoders run without a uinput device, e.g. to replay captured
+    reports into /dev/null while still counting writes and events. file
+    may also be a writable object, as for uinput_events.
+    """
+
+    def __init__(self, buttons, axes, file = None, axfilter = None):
+        if file is None:
+            file = os.open(os.devnull, os.O_WRONLY)
+        self.file = file
+        self.events = uinput_events(self.file,
+                                    [uinput.EV_KEY] * len(buttons) + [uinput.EV_ABS] * len(axes),
+                                    list(buttons) + list(axes), axfilter)
+
+    def update(self, value):
+        self.events.update(value)
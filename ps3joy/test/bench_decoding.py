@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+"""Packets/sec of the legacy and table-driven PS3 report decoders.
+
+Usage: bench_decoding.py [<number of packets>]
+
+Run with the ps3joy_core package on the PYTHONPATH (e.g. from a
+sourced catkin workspace).
+"""
+
+from __future__ import print_function
+import random
+import sys
+import timeit
+
+from ps3joy_core.decoding import report_decoder
+from test_decoding import decoder_axmid, legacy_step, random_report
+
+def packets_per_sec(step, reports):
+    elapsed = min(timeit.repeat(lambda: [step(r) for r in reports], number=1, repeat=5))
+    return len(reports) / elapsed
+
+if __name__ == "__main__":
+    num_packets = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rng = random.Random(0)
+    reports = [random_report(rng) for i in range(num_packets)]
+    axmid = decoder_axmid()
+    report = report_decoder(axmid)
+
+    def table_step(rawdata):
+        report.decode(rawdata)
+        return report.active()
+
+    before = packets_per_sec(lambda rawdata: legacy_step(rawdata, axmid), reports)
+    after = packets_per_sec(table_step, reports)
+    print("legacy decoder:       %10.0f packets/sec" % before)
+    print("table-driven decoder: %10.0f packets/sec" % after)
+    print("speedup:              %10.1fx" % (after / before))
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+import socket
+import sys
+import threading
+import time
+import unittest
+
+from ps3joy_core.receiver import receiver, ACTIVATE_COMMAND, STEP_ACTIVE, STEP_IDLE
+
+class recording_decoder:
+    def __init__(self):
+        self.reports = []
+        self.fullstops = 0
+        self.receiver = receiver(self.step, self.fullstop)
+
+    def step(self, rawdata):
+        self.reports.append(rawdata)
+        if rawdata == b'idle':
+            return STEP_IDLE
+        return STEP_ACTIVE
+
+    def fullstop(self):
+        self.fullstops += 1
+
+def listening_socket():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(4)
+    return sock
+
+def connect(address, listen_sock):
+    sock = socket.create_connection(listen_sock.getsockname(), source_address = (address, 0))
+    sock.settimeout(2)
+    return sock
+
+@unittest.skipIf(sys.version_info < (3, 5), "asyncio manager requires Python 3.5")
+class TestAsyncConnectionManager(unittest.TestCase):
+
+    def setUp(self):
+        from ps3joy_core.aio import async_connection_manager
+        from ps3joy_core.multiplexer import decoder_slots
+        self.intr_sock = listening_socket()
+        self.ctrl_sock = listening_socket()
+        self.slots = decoder_slots(recording_decoder(), recording_decoder)
+        self.closed = []
+        self.reasons = []
+        self.manager = async_connection_manager(self.intr_sock, self.ctrl_sock, self.slots.acquire,
+                                                max_connections = 2, on_closed = self.on_closed)
+        self.manager.pairing_timeout = 0.2
+        self.thread = threading.Thread(target = self.manager.run)
+        self.thread.start()
+        self.wait_for(lambda: self.manager.loop is not None)
+
+    def tearDown(self):
+        self.manager.stop()
+        self.thread.join(2)
+        self.assertFalse(self.thread.is_alive())
+        self.intr_sock.close()
+        self.ctrl_sock.close()
+
+    def on_closed(self, address, reason):
+        self.closed.append(address)
+        self.reasons.append(reason)
+        self.slots.release(address)
+
+    def wait_for(self, condition):
+        start = time.time()
+        while not condition() and time.time() - start < 2:
+            time.sleep(0.01)
+        self.assertTrue(condition())
+
+    def test_activation_and_reports(self):
+        ctrl = connect("127.0.0.1", self.ctrl_sock)
+        intr = connect("127.0.0.1", self.intr_sock)
+        self.assertEqual(ctrl.recv(128), ACTIVATE_COMMAND)
+        for i in range(5):
+            intr.send(b'report%i' % i)
+        decoder = self.slots.connected["127.0.0.1"]
+        self.wait_for(lambda: b''.join(decoder.reports) == b''.join(b'report%i' % i for i in range(5)))
+        intr.close()
+        ctrl.close()
+        self.wait_for(lambda: self.closed == ["127.0.0.1"])
+
+    def test_activation_retries_until_the_first_report(self):
+        ctrl = connect("127.0.0.1", self.ctrl_sock)
+        start = time.time()
+        intr = connect("127.0.0.1", self.intr_sock)
+        for i in range(4):
+            self.assertEqual(ctrl.recv(len(ACTIVATE_COMMAND)), ACTIVATE_COMMAND)
+        self.assertTrue(time.time() - start < 0.1)
+        intr.send(b'report')
+        decoder = self.slots.connected["127.0.0.1"]
+        self.wait_for(lambda: decoder.receiver.stats.first_valid is not None)
+        times = decoder.receiver.stats.connect_times()
+        self.assertTrue(0 <= times["paired"] <= times["first_report"] <= times["first_valid"] < 1)
+        intr.close()
+        ctrl.close()
+
+    def test_fullstop_and_concurrent_controllers(self):
+        joys = [(connect(address, self.ctrl_sock), connect(address, self.intr_sock))
+                for address in ("127.0.0.1", "127.0.0.2")]
+        self.wait_for(lambda: len(self.manager.sessions) == 2)
+        for (ctrl, intr) in joys:
+            intr.send(b'idle')
+        decoders = [self.slots.connected[address] for address in ("127.0.0.1", "127.0.0.2")]
+        self.assertFalse(decoders[0] is decoders[1])
+        fullstops = [d.fullstops for d in decoders]
+        self.wait_for(lambda: all(d.fullstops > n for (d, n) in zip(decoders, fullstops)))
+        for (ctrl, intr) in joys:
+            intr.close()
+            ctrl.close()
+        self.wait_for(lambda: sorted(self.closed) == ["127.0.0.1", "127.0.0.2"])
+
+    def test_unpaired_channel_expires(self):
+        intr = connect("127.0.0.1", self.intr_sock)
+        self.wait_for(lambda: len(self.manager.pending) == 1)
+        self.wait_for(lambda: len(self.manager.pending) == 0)
+        self.assertEqual(self.manager.sessions, {})
+        intr.close()
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('ps3joy', 'test_aio', TestAsyncConnectionManager)
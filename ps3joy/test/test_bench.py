@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+import io
+import os
+import unittest
+
+from ps3joy_core.bench import event_sink, synthetic_reports, measure_pipeline, measure_allocations, pipeline_stats
+from ps3joy_core.device import axis_config, decoder_core
+from ps3joy_core.decoding import report_decoder
+from ps3joy_core.uinput import uinput_sink, uinput_events
+
+AXMID = [128] * 4 + [0] * 12 + [512] * 4
+
+class fake_timer:
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        self.now += 0.0005
+        return self.now
+
+class TestBench(unittest.TestCase):
+
+    def run_pipeline(self, sink, reports):
+        joy = uinput_sink(range(17), range(20), sink.file)
+        report = report_decoder(AXMID)
+        def step(rawdata):
+            report.decode(rawdata)
+            joy.update(report.out)
+        joy.update([0] * 17 + AXMID) # Like the decoders' initial fullstop.
+        return measure_pipeline(step, joy.events, reports, timer = fake_timer())
+
+    def test_counts_only_the_run(self):
+        sink = event_sink("memory")
+        reports = synthetic_reports(10, "idle")
+        stats = self.run_pipeline(sink, reports)
+        size = uinput_events.input_event.size
+        # The first report sets the three tag axes, the others only the sequence number.
+        self.assertEqual((stats.writes, stats.events), (10, 12))
+        self.assertEqual(stats.bytes, (12 + 10) * size)
+        self.assertEqual(len(sink.file.getvalue()), (38 + 22) * size)
+        sink.close()
+
+    def test_sinks(self):
+        reports = synthetic_reports(50, "storm")
+        results = []
+        for kind in ("null", "pipe", "memory"):
+            sink = event_sink(kind)
+            stats = self.run_pipeline(sink, reports)
+            sink.close()
+            if kind == "pipe":
+                self.assertEqual(sink.drained - (38 * uinput_events.input_event.size), stats.bytes)
+            results.append((stats.writes, stats.events, stats.bytes))
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], results[2])
+
+    def test_decode_allocates_nothing(self):
+        core = decoder_core([], axis_config(False), float(1e3000), None)
+        for pattern in ("idle", "sweep", "storm"):
+            reports = synthetic_reports(300, pattern, tags = False)
+            allocated = measure_allocations(core.report.decode, reports)
+            if allocated is None:
+                self.skipTest("tracemalloc.reset_peak needs Python 3.9")
+            self.assertEqual(max(allocated), 0, pattern)
+            # step() only adds the iterators of its loops, which are freed
+            # before it returns:
+            self.assertTrue(max(measure_allocations(core.step, reports)) <= 128, pattern)
+
+    def test_unknown_sink(self):
+        self.assertRaises(ValueError, event_sink, "tape")
+
+    def test_summary(self):
+        stats = pipeline_stats([0.00001, 0.00003], 2, 6, 192)
+        summary = dict(stats.summary())
+        self.assertEqual(summary["Rate (packets/s)"], "50000")
+        self.assertEqual(summary["Step mean (us)"], "20.00")
+        self.assertEqual(summary["Step max (us)"], "30.00")
+        self.assertEqual(summary["Events per packet"], "3.000")
+        self.assertEqual(summary["Bytes per packet"], "96.000")
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('ps3joy', 'test_bench', TestBench)
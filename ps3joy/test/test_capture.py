@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+import io
+import unittest
+
+from ps3joy_core.capture import report_writer, read_reports, replay, MAGIC
+from ps3joy_core.receiver import STEP_ACTIVE, STEP_IDLE, STEP_ERROR
+
+class fake_clock:
+    def __init__(self):
+        self.now = 0.
+        self.slept = 0.
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.slept += delay
+        self.now += delay
+
+def log(reports):
+    buff = io.BytesIO()
+    writer = report_writer(buff)
+    for (timestamp, rawdata) in reports:
+        writer.write(timestamp, rawdata)
+    buff.seek(0)
+    return buff
+
+class TestCapture(unittest.TestCase):
+
+    def test_round_trip(self):
+        reports = [(100.5, b'\x01' * 50), (100.51, b'\x02' * 13), (100.52, b'')]
+        buff = log(reports)
+        self.assertTrue(buff.getvalue().startswith(MAGIC))
+        self.assertEqual(list(read_reports(buff)), reports)
+
+    def test_truncated_log(self):
+        data = log([(1., b'a' * 50), (2., b'b' * 50)]).getvalue()
+        self.assertEqual(len(list(read_reports(io.BytesIO(data[:-1])))), 1)
+
+    def test_not_a_log(self):
+        self.assertRaises(IOError, list, read_reports(io.BytesIO(b'garbage data')))
+
+    def test_replay_decisions(self):
+        # 1 s idle, 0.5 s active, 0.3 s gap, then idle until the timeout.
+        reports = [(10. + i * 0.01, b'idle') for i in range(100)]
+        reports += [(11. + i * 0.01, b'active') for i in range(50)]
+        reports += [(11.8 + i * 0.01, b'bad') for i in range(1)]
+        reports += [(11.81 + i * 0.01, b'idle') for i in range(200)]
+        steps = {b'idle': STEP_IDLE, b'active': STEP_ACTIVE, b'bad': STEP_ERROR}
+        stats = replay(reports, lambda rawdata: steps[rawdata], inactivity_timeout = 1.)
+        self.assertEqual(stats.errors, 1)
+        self.assertEqual(stats.active, 50)
+        self.assertEqual([active for (t, active) in stats.transitions], [False, True, False])
+        self.assertAlmostEqual(stats.transitions[1][0], 1.)
+        self.assertEqual(len(stats.fullstops), 1)
+        self.assertAlmostEqual(stats.fullstops[0], 1.59)
+        self.assertAlmostEqual(stats.disconnect, 2.49)
+
+    def test_replay_speed(self):
+        clock = fake_clock()
+        reports = [(5. + i * 0.1, b'x') for i in range(11)]
+        replay(reports, lambda rawdata: STEP_IDLE, speed = 2., clock = clock.clock, sleep = clock.sleep)
+        self.assertAlmostEqual(clock.slept, 0.5)
+        clock = fake_clock()
+        replay(reports, lambda rawdata: STEP_IDLE, clock = clock.clock, sleep = clock.sleep)
+        self.assertEqual(clock.slept, 0.)
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('ps3joy', 'test_capture', TestCapture)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+import random
+import struct
+import unittest
+
+from ps3joy_core.decoding import report_decoder, REPORT_LENGTH, REPORT_PREFIX
+
+def decoder_axmid():
+    """Rest values of the 20 axes, computed as the ps3joy decoders do."""
+    axmin = [0] * 20
+    axmax = [255] * 20
+    for i in range(-4,0):
+        axmax[i] = 1023
+    for i in range(4,len(axmin)-4):
+        axmin[i] = -axmax[i]
+    return [sum(pair)/2 for pair in zip(axmin, axmax)]
+
+def legacy_step(rawdata, axmid):
+    """The per-packet decode that ps3joy_node.py used to run.
+
+    ps3joy.py did the same, except that it skipped the state bytes.
+    """
+    all_data = list(struct.unpack("!1B2x3B1x4B4x12B3x1B1B1B9x4H", rawdata))
+    state_data = all_data[20:23]
+    data = all_data[0:20]+all_data[23:]
+    prefix = data.pop(0)
+    out = []
+    for j in range(0,2):
+        curbyte = data.pop(0)
+        for k in range(0,8):
+            out.append(int((curbyte & (1 << k)) != 0))
+    out = out + data
+    axis_motion = [abs(out[17:][i] - axmid[i]) > 20 for i in range(0,len(out)-17-4)]
+    active = any(out[0:17]) or any(axis_motion)
+    return prefix, out, state_data, active
+
+def random_report(rng, prefix=REPORT_PREFIX):
+    raw = bytearray(rng.randint(0, 255) for i in range(REPORT_LENGTH))
+    raw[0] = prefix
+    return bytes(raw)
+
+def rest_report():
+    """A report from an untouched controller, with the inertial sensors at mid range."""
+    return struct.pack("!1B2x3B1x4B4x12B3x1B1B1B9x4H", REPORT_PREFIX,
+                       0, 0, 0, 128, 128, 128, 128, *([0] * 12 + [3, 5, 22] + [512] * 4))
+
+class TestReportDecoder(unittest.TestCase):
+
+    def setUp(self):
+        self.axmid = decoder_axmid()
+        self.report = report_decoder(self.axmid)
+
+    def assertDecodesLikeLegacy(self, rawdata):
+        (prefix, out, state, active) = legacy_step(rawdata, self.axmid)
+        self.assertEqual(self.report.decode(rawdata), prefix)
+        self.assertEqual(self.report.out, out)
+        self.assertEqual(self.report.state, state)
+        self.assertEqual(self.report.active(), active)
+
+    def test_random_reports(self):
+        rng = random.Random(31)
+        for i in range(2000):
+            self.assertDecodesLikeLegacy(random_report(rng))
+
+    def test_extremes(self):
+        self.assertDecodesLikeLegacy(b'\xa1' + b'\x00' * (REPORT_LENGTH - 1))
+        self.assertDecodesLikeLegacy(b'\xa1' + b'\xff' * (REPORT_LENGTH - 1))
+
+    def test_rest_is_idle(self):
+        self.assertDecodesLikeLegacy(rest_report())
+        self.assertFalse(self.report.active())
+
+    def test_single_button(self):
+        for bit in range(16):
+            raw = bytearray(rest_report())
+            raw[3 + bit // 8] = 1 << (bit % 8)
+            self.assertDecodesLikeLegacy(bytes(raw))
+            self.assertEqual(self.report.out[:16], [int(i == bit) for i in range(16)])
+            self.assertTrue(self.report.active())
+
+    def test_bad_prefix(self):
+        self.assertDecodesLikeLegacy(random_report(random.Random(7), prefix=1))
+
+    def test_output_is_reused(self):
+        out = self.report.out
+        state = self.report.state
+        self.report.decode(random_report(random.Random(3)))
+        self.assertTrue(self.report.out is out)
+        self.assertTrue(self.report.state is state)
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('ps3joy', 'test_decoding', TestReportDecoder)
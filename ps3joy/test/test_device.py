@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+import io
+import random
+import unittest
+
+from ps3joy_core.decoding import REPORT_LENGTH, REPORT_PREFIX
+from ps3joy_core.device import BUTTONS, AXES, axis_config, decoder_core, uinput_output, output
+from ps3joy_core.receiver import BadJoystickException, STEP_ACTIVE, STEP_IDLE, STEP_ERROR
+from test_decoding import random_report, rest_report
+
+class recording_output(output):
+    def __init__(self):
+        self.frames = []
+        self.fullstops = []
+
+    def update(self, frame):
+        self.frames.append((list(frame.out), frame.time))
+
+    def fullstop(self, frame):
+        self.fullstops.append((list(frame.out), frame.time))
+
+class TestAxisConfig(unittest.TestCase):
+
+    def test_rest_values(self):
+        self.assertEqual(axis_config().axmid, [127] * 4 + [0] * 12 + [511] * 4)
+
+    def test_continuous_motion_output(self):
+        axes = axis_config(continuous_motion_output = True)
+        self.assertEqual(axes.axfuzz[-4:], [0] * 4)
+        self.assertEqual(axes.axflat[-4:], [0] * 4)
+        self.assertEqual(axis_config().axfuzz[-4:], [4] * 4)
+
+class TestDecoderCore(unittest.TestCase):
+
+    def setUp(self):
+        self.axes = axis_config()
+        self.now = [10.]
+        self.first = recording_output()
+        self.second = recording_output()
+        self.frames = []
+        self.core = decoder_core([self.first, self.second], self.axes,
+                                 clock = lambda: self.now[0],
+                                 on_frame = lambda frame: self.frames.append(frame.time))
+
+    def test_outputs_start_at_rest(self):
+        rest = [0] * len(BUTTONS) + self.axes.axmid
+        self.assertEqual(self.first.fullstops, [(rest, 10.)])
+        self.assertEqual(self.second.fullstops, [(rest, 10.)])
+        self.assertEqual(len(rest), len(BUTTONS) + len(AXES))
+
+    def test_one_parse_feeds_all_outputs(self):
+        decodes = []
+        decode = self.core.report.decode
+        def counting_decode(rawdata):
+            decodes.append(rawdata)
+            return decode(rawdata)
+        self.core.report.decode = counting_decode
+        sink = io.BytesIO()
+        self.core.add_output(uinput_output(self.axes, event_file = sink))
+        self.now[0] = 11.
+        self.assertEqual(self.core.step(rest_report()), STEP_IDLE)
+        self.assertEqual(len(decodes), 1)
+        self.assertEqual(self.first.frames, self.second.frames)
+        self.assertEqual(self.first.frames, [(self.core.report.out, 11.)])
+        self.assertTrue(len(sink.getvalue()) > 0)
+
+    def test_active_report(self):
+        rawdata = bytearray(rest_report())
+        rawdata[3] = 0x01 # Select pressed
+        self.assertEqual(self.core.step(bytes(rawdata)), STEP_ACTIVE)
+        self.assertEqual(self.first.frames[-1][0][0], 1)
+
+    def test_bad_prefix_reaches_no_output(self):
+        self.assertEqual(self.core.step(random_report(random.Random(1), prefix = REPORT_PREFIX + 1)), STEP_ERROR)
+        self.assertEqual(self.first.frames, [])
+        self.assertEqual(self.frames, [10.]) # Diagnostics still see the report.
+
+    def test_bad_length(self):
+        self.assertEqual(self.core.step(b"\0" * (REPORT_LENGTH - 1)), STEP_ERROR)
+        self.assertEqual(self.frames, [])
+        self.assertRaises(BadJoystickException, self.core.step, b"\0" * 13)
+
+    def test_fullstop(self):
+        self.core.step(random_report(random.Random(2)))
+        self.now[0] = 12.
+        self.core.fullstop()
+        self.assertEqual(self.second.fullstops[-1], ([0] * len(BUTTONS) + self.axes.axmid, 12.))
+
+    def test_default_fullstop_updates(self):
+        sink = io.BytesIO()
+        uinput = uinput_output(self.axes, event_file = sink)
+        self.core.add_output(uinput)
+        self.assertEqual(uinput.events.writes, 1)
+
+    def test_base_output_does_nothing(self):
+        self.core.add_output(output())
+        self.assertEqual(self.core.step(rest_report()), STEP_IDLE)
+        self.core.fullstop()
+        self.core.close()
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('ps3joy', 'test_device', TestAxisConfig)
+    rosunit.unitrun('ps3joy', 'test_device', TestDecoderCore)
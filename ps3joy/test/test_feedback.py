@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+import socket
+import time
+import unittest
+
+from ps3joy_core.feedback import feedback_command, feedback_worker
+
+class feedback_state:
+    def __init__(self):
+        self.rumble = [0, 255]
+        self.leds = 2
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        return feedback_command(self.rumble, self.leds)
+
+def wait_for(condition, timeout = 2.):
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(0.005)
+    return condition()
+
+class TestFeedback(unittest.TestCase):
+
+    def setUp(self):
+        (self.ctrl, self.joy_ctrl) = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.joy_ctrl.settimeout(2)
+        self.state = feedback_state()
+        self.worker = feedback_worker(self.state.build, interval = 0.1)
+        self.worker.start()
+
+    def tearDown(self):
+        self.worker.stop()
+        self.worker.join(2)
+        self.assertFalse(self.worker.is_alive())
+        self.ctrl.close()
+        self.joy_ctrl.close()
+
+    def test_command(self):
+        command = feedback_command((10, 200), 6)
+        self.assertEqual(len(command), 37)
+        self.assertEqual(bytearray(command[:12]), bytearray([0x52, 0x01, 0x00, 0xfe, 200, 0xfe, 10, 0, 0, 0, 0, 6]))
+
+    def test_attach_sends_state(self):
+        self.worker.attach(self.ctrl)
+        self.assertEqual(self.joy_ctrl.recv(128), feedback_command([0, 255], 2))
+
+    def test_burst_is_merged(self):
+        self.worker.attach(self.ctrl)
+        self.joy_ctrl.recv(128)
+        start = time.time()
+        for i in range(50):
+            self.state.leds = i
+            self.worker.request()
+        command = self.joy_ctrl.recv(128)
+        self.assertTrue(time.time() - start >= 0.05) # The first write used up the interval.
+        self.assertEqual(bytearray(command)[11], 49) # Latest state only.
+        self.assertTrue(wait_for(lambda: self.worker.requests == self.worker.sent + self.worker.merged))
+        self.assertEqual(self.worker.requests, 51)
+        self.assertEqual(self.worker.sent, 2)
+        self.assertEqual(self.worker.merged, 49)
+
+    def test_call_later(self):
+        self.worker.attach(self.ctrl)
+        self.joy_ctrl.recv(128)
+        def end_pulse():
+            self.state.rumble[1] = 0
+            self.worker.request()
+        start = time.time()
+        self.worker.call_later(0.2, end_pulse)
+        command = self.joy_ctrl.recv(128)
+        self.assertTrue(time.time() - start >= 0.19)
+        self.assertEqual(bytearray(command)[4], 0)
+
+    def test_detached(self):
+        self.worker.request()
+        time.sleep(0.05)
+        self.assertEqual((self.worker.sent, self.state.builds), (0, 0))
+        self.worker.attach(self.ctrl)
+        self.joy_ctrl.recv(128)
+        self.worker.detach()
+        self.worker.request()
+        time.sleep(0.15)
+        self.assertEqual(self.worker.sent, 1)
+
+    def test_send_error(self):
+        self.joy_ctrl.close()
+        self.worker.attach(self.ctrl)
+        self.assertTrue(wait_for(lambda: self.worker.errors == 1))
+        self.assertTrue(self.worker.ctrl is None)
+        self.worker.request()
+        time.sleep(0.05)
+        self.assertEqual(self.worker.errors, 1)
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('ps3joy', 'test_feedback', TestFeedback)
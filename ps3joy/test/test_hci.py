@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+import random
+import unittest
+
+from ps3joy_core.hci import adapter_monitor, backoff, static_adapter, _DEV_INFO, _DEV_REQ
+
+class fake_clock:
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+class TestHci(unittest.TestCase):
+
+    def test_struct_sizes(self):
+        self.assertEqual(_DEV_INFO.size, 92) # sizeof(struct hci_dev_info)
+        self.assertEqual(_DEV_REQ.size, 8)   # sizeof(struct hci_dev_req)
+
+    def test_backoff_is_bounded_and_jittered(self):
+        retry = backoff(initial = 0.5, maximum = 4., jitter = 0.2, rng = random.Random(1))
+        delays = [retry.next() for i in range(10)]
+        for (delay, nominal) in zip(delays, [0.5, 1., 2.] + [4.] * 7):
+            self.assertTrue(0.8 * nominal <= delay <= 1.2 * nominal)
+        self.assertNotEqual(delays[-1], delays[-2])
+        retry.reset()
+        self.assertTrue(retry.next() <= 0.6)
+
+    def test_state_is_cached(self):
+        clock = fake_clock()
+        adapter = static_adapter()
+        monitor = adapter_monitor(adapter, cache_period = 1., clock = clock)
+        self.assertTrue(monitor.check())
+        clock.now = 0.5
+        self.assertTrue(monitor.check())
+        self.assertEqual(adapter.calls, ["read"])
+        clock.now = 1.
+        self.assertTrue(monitor.check())
+        self.assertEqual(adapter.calls, ["read", "read"])
+
+    def test_repair(self):
+        adapter = static_adapter(up = False, page_scan = False)
+        monitor = adapter_monitor(adapter, clock = fake_clock())
+        self.assertTrue(monitor.check())
+        self.assertEqual(adapter.calls, ["read", "up", "page_scan", "read"])
+        adapter = static_adapter(page_scan = False)
+        monitor = adapter_monitor(adapter, clock = fake_clock())
+        self.assertTrue(monitor.check())
+        self.assertEqual(adapter.calls, ["read", "page_scan", "read"])
+
+    def test_failed_repair_backs_off(self):
+        clock = fake_clock()
+        adapter = static_adapter(up = False, page_scan = False)
+        adapter.fail = True
+        monitor = adapter_monitor(adapter, cache_period = 0., clock = clock,
+                                  retry = backoff(initial = 1., jitter = 0.))
+        self.assertFalse(monitor.check())
+        self.assertEqual(monitor.repairs, 1)
+        clock.now = 0.9
+        self.assertFalse(monitor.check())
+        self.assertEqual(monitor.repairs, 1)
+        clock.now = 1.
+        self.assertFalse(monitor.check())
+        self.assertEqual(monitor.repairs, 2)
+        clock.now = 2.5 # Second delay is 2 s.
+        self.assertFalse(monitor.check())
+        self.assertEqual(monitor.repairs, 2)
+        adapter.fail = False
+        clock.now = 3.
+        self.assertTrue(monitor.check())
+        self.assertEqual(monitor.retry.failures, 0)
+
+    def test_missing_adapter(self):
+        adapter = static_adapter(present = False)
+        monitor = adapter_monitor(adapter, retry = backoff(initial = 1., maximum = 2., jitter = 0.))
+        self.assertFalse(monitor.check())
+        self.assertEqual(adapter.calls, ["read"])
+        slept = []
+        def sleep(delay):
+            slept.append(delay)
+            if len(slept) == 3:
+                adapter.present = True
+        monitor.wait_for_adapter(sleep = sleep)
+        self.assertEqual(slept, [1., 2., 2.])
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('ps3joy', 'test_hci', TestHci)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+
+from ps3joy_core.imu import imu_calibration, sample_batch, STANDARD_GRAVITY
+
+class TestImuCalibration(unittest.TestCase):
+
+    def test_nominal_rest(self):
+        ((ax, ay, az), wz) = imu_calibration().convert([512, 512, 512 + 113, 498])
+        self.assertEqual((ax, ay), (0., 0.))
+        self.assertAlmostEqual(az, STANDARD_GRAVITY)
+        self.assertEqual(wz, 0.)
+
+    def test_custom_calibration(self):
+        calibration = imu_calibration(accel_zero = (500, 510, 520), accel_scale = (-0.1, 0.1, 0.2),
+                                      gyro_zero = 400, gyro_scale = 0.5)
+        ((ax, ay, az), wz) = calibration.convert([510, 500, 530, 402])
+        self.assertAlmostEqual(ax, -1.)
+        self.assertAlmostEqual(ay, -1.)
+        self.assertAlmostEqual(az, 2.)
+        self.assertAlmostEqual(wz, 1.)
+
+    def test_bad_calibration(self):
+        self.assertRaises(ValueError, imu_calibration, accel_zero = (512, 512))
+
+class TestSampleBatch(unittest.TestCase):
+
+    def test_full_rate(self):
+        batch = sample_batch()
+        self.assertEqual(batch.add(1), [1])
+        self.assertEqual(batch.add(2), [2])
+
+    def test_batched(self):
+        batch = sample_batch(3)
+        self.assertEqual(batch.add(1), None)
+        self.assertEqual(batch.add(2), None)
+        self.assertEqual(batch.add(3), [1, 2, 3])
+        self.assertEqual(batch.add(4), None)
+        self.assertEqual(batch.flush(), [4])
+        self.assertEqual(batch.flush(), [])
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('ps3joy', 'test_imu', TestImuCalibration)
+    rosunit.unitrun('ps3joy', 'test_imu', TestSampleBatch)
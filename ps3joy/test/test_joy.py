@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+import io
+import random
+import unittest
+
+from ps3joy_core.joy import joy_output, JS_MAX
+from ps3joy_core.uinput import uinput, uinput_events, axis_filter
+
+NUM_BUTTONS = 17
+
+def ps3_ranges():
+    # Same ranges as the ps3joy decoders give the uinput device.
+    axmin = [0] * 20
+    axmax = [255] * 20
+    axflat = [4] * 20
+    for i in range(-4, 0):
+        axmax[i] = 1023
+    for i in range(4, 16):
+        axmin[i] = -axmax[i]
+    return (axmin, axmax, axflat)
+
+def ps3_fuzz():
+    axfuzz = [2] * 20
+    for i in range(-4, 0):
+        axfuzz[i] = 4
+    return axfuzz
+
+def rest_values(axmin, axmax):
+    return [0] * NUM_BUTTONS + [(lo + hi) // 2 for (lo, hi) in zip(axmin, axmax)]
+
+class TestJoyOutput(unittest.TestCase):
+
+    def setUp(self):
+        (self.axmin, self.axmax, self.axflat) = ps3_ranges()
+        self.output = joy_output(NUM_BUTTONS, self.axmin, self.axmax, self.axflat,
+                                 deadzone = 0.1, coalesce_interval = 0.05)
+        self.rest = rest_values(self.axmin, self.axmax)
+
+    def test_rest_is_zero(self):
+        self.assertTrue(self.output.update(self.rest, 0.))
+        self.assertEqual(self.output.axes, [0.] * 20)
+        self.assertEqual(self.output.buttons, [0] * NUM_BUTTONS)
+
+    def test_normalization(self):
+        values = list(self.rest)
+        values[NUM_BUTTONS + 0] = 255 # Left stick fully right
+        values[NUM_BUTTONS + 1] = 0   # Left stick fully up
+        values[NUM_BUTTONS + 4] = 255 # Full pressure
+        self.output.update(values, 0.)
+        axes = self.output.axes
+        # joy_node flips the sign of every axis.
+        self.assertAlmostEqual(axes[0], -1., places = 2)
+        self.assertAlmostEqual(axes[1], 1., places = 2)
+        self.assertAlmostEqual(axes[4], -1., places = 2)
+        for axis in axes:
+            self.assertTrue(-1. <= axis <= 1.)
+
+    def test_kernel_flat_and_deadzone(self):
+        output = self.output
+        self.assertEqual(output.js_value(0, 127 + 4), 0) # Inside the kernel's flat band
+        self.assertEqual(output.js_value(0, 255), JS_MAX)
+        self.assertEqual(output.js_value(0, 0), -JS_MAX)
+        values = list(self.rest)
+        values[NUM_BUTTONS] = 140 # Past flat, but within the 10% deadzone
+        output.update(values, 0.)
+        self.assertTrue(0 < output.js_axes[0] < 0.1 * JS_MAX)
+        self.assertEqual(output.axes[0], 0.)
+
+    def test_buttons_publish_immediately(self):
+        self.output.update(self.rest, 0.)
+        values = list(self.rest)
+        values[3] = 1
+        self.assertTrue(self.output.update(values, 0.001))
+        self.assertEqual(self.output.buttons[3], 1)
+        self.assertFalse(self.output.update(values, 0.002))
+
+    def test_axes_are_coalesced(self):
+        self.output.update(self.rest, 0.)
+        values = list(self.rest)
+        values[NUM_BUTTONS] = 200
+        self.assertFalse(self.output.update(values, 0.01))
+        values[NUM_BUTTONS] = 220
+        self.assertFalse(self.output.update(values, 0.02))
+        self.assertTrue(self.output.update(values, 0.05))
+        self.assertFalse(self.output.update(values, 0.06)) # Nothing new
+
+    def test_fuzz_matches_uinput_filter(self):
+        # The userspace axis filter applies fuzz as the kernel would
+        # (see test_uinput), so the values it writes are those joydev
+        # sees; joy_output must see the same ones.
+        axfuzz = ps3_fuzz()
+        output = joy_output(NUM_BUTTONS, self.axmin, self.axmax, self.axflat, axfuzz)
+        events = uinput_events(io.BytesIO(), [uinput.EV_KEY] * NUM_BUTTONS + [uinput.EV_ABS] * 20,
+                               list(range(NUM_BUTTONS)) + list(range(20)), axis_filter(axfuzz))
+        rand = random.Random(1)
+        values = list(self.rest)
+        for n in range(500):
+            for i in range(20):
+                if rand.random() < 0.5:
+                    jitter = rand.choice([1, 2, 3, 5, 9, 40])
+                    value = values[NUM_BUTTONS + i] + rand.randint(-jitter, jitter)
+                    values[NUM_BUTTONS + i] = max(self.axmin[i], min(self.axmax[i], value))
+            events.update(values)
+            output.update(values, n * 0.01)
+            self.assertEqual(output.js_axes, [output.js_value(i, events.value[NUM_BUTTONS + i]) for i in range(20)])
+
+    def test_fuzz_holds_jitter(self):
+        output = joy_output(NUM_BUTTONS, self.axmin, self.axmax, [0] * 20, ps3_fuzz())
+        values = list(self.rest)
+        gyro = NUM_BUTTONS + 16 # fuzz 4
+        for (value, reported) in [(600, 600), (601, 600), (603, 600), (605, 602), (700, 700)]:
+            values[gyro] = value
+            output.update(values, 0.)
+            self.assertEqual(output.js_axes[16], output.js_value(16, reported))
+
+    def test_autorepeat(self):
+        output = joy_output(NUM_BUTTONS, self.axmin, self.axmax, self.axflat, autorepeat_rate = 10.)
+        self.assertTrue(output.update(self.rest, 0.))
+        self.assertFalse(output.update(self.rest, 0.05))
+        self.assertTrue(output.update(self.rest, 0.1))
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('ps3joy', 'test_joy', TestJoyOutput)
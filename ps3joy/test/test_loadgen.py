@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import socket
+import threading
+import time
+import unittest
+
+from ps3joy_core.decoding import report_decoder, REPORT_LENGTH, OUTPUT_LENGTH, NUM_INERTIAL
+from ps3joy_core.device import axis_config, decoder_core
+from ps3joy_core.loadgen import report_generator, latency_stats, output_monitor, channel_listener, PATTERNS, SHORT_PACKET
+from ps3joy_core.multiplexer import connection_multiplexer, decoder_slots
+from ps3joy_core.receiver import ACTIVATE_COMMAND
+from ps3joy_core.uinput import uinput_sink
+
+AXMID = [128] * 4 + [0] * 12 + [512] * 4
+
+class TestLoadgen(unittest.TestCase):
+
+    def test_tags_survive_decoding(self):
+        report = report_decoder(AXMID)
+        for pattern in PATTERNS:
+            generator = report_generator(7, pattern)
+            rawdata = generator.report(0x12345, 1.5)
+            self.assertEqual(len(rawdata), REPORT_LENGTH)
+            self.assertEqual(report.decode(rawdata), 161)
+            self.assertEqual(report.out[OUTPUT_LENGTH - NUM_INERTIAL:], [7, 0x2345, 0x1, 512])
+
+    def test_idle_is_inactive(self):
+        report = report_decoder(AXMID)
+        report.decode(report_generator(0, "idle").report(3, 0.))
+        self.assertFalse(report.active())
+        report.decode(report_generator(0, "storm", seed = 1).report(3, 0.))
+        self.assertTrue(report.active())
+
+    def test_unknown_pattern(self):
+        self.assertRaises(ValueError, report_generator, 0, "tornado")
+
+    def test_malformed_and_short(self):
+        generator = report_generator(0, "malformed")
+        packets = [generator.packets(seq, 0.) for seq in range(2 * generator.malformed_period)]
+        bad = [rawdata for p in packets for (rawdata, tagged) in p if not tagged]
+        self.assertEqual(len(bad), 2)
+        self.assertEqual(sorted(len(p) for p in bad), [REPORT_LENGTH - 1, REPORT_LENGTH])
+        generator = report_generator(0, "short")
+        seq = generator.short_period - 1
+        self.assertEqual(generator.packets(seq, 0.), [(SHORT_PACKET, False)])
+        self.assertTrue(generator.disconnect(seq))
+        self.assertFalse(generator.disconnect(seq + 1))
+
+    def test_burst_keeps_rate(self):
+        generator = report_generator(0, "burst")
+        total = sum(generator.delay(seq, 0.01) for seq in range(generator.burst_length))
+        self.assertAlmostEqual(total, generator.burst_length * 0.01)
+
+    def test_latency_stats(self):
+        stats = latency_stats()
+        for seq in range(4):
+            stats.record_send(seq, 10. + seq)
+        stats.record_output(0, 10.001)
+        stats.record_output(2, 12.003)
+        stats.record_output(2, 12.004)
+        self.assertEqual((stats.sent, stats.received, stats.late), (4, 2, 1))
+        summary = dict(stats.summary())
+        self.assertEqual(summary["Lost"], "2 (50.00%)")
+        self.assertEqual(summary["Latency max (ms)"], "3.000")
+
+    def test_output_monitor(self):
+        (pipe_r, pipe_w) = os.pipe()
+        frames = []
+        monitor = output_monitor(pipe_r, lambda index, seq, now: frames.append((index, seq)))
+        monitor.start()
+        sink = uinput_sink(range(17), range(20), pipe_w)
+        report = report_decoder(AXMID)
+        generator = report_generator(2, "sweep")
+        for seq in [0, 1, 1, 0x10000]:
+            report.decode(generator.report(seq, 0.))
+            sink.update(report.out)
+        sink.update([0] * 17 + AXMID) # A fullstop carries no tag.
+        os.close(pipe_w)
+        monitor.join(5)
+        self.assertEqual(frames, [(2, 0), (2, 1), (2, 0x10000), (512, 512 | (512 << 16))])
+
+def make_decoder():
+    return decoder_core([], axis_config(False))
+
+@unittest.skipIf(not hasattr(socket, "AF_UNIX"), "needs Unix sockets")
+class TestChannels(unittest.TestCase):
+
+    reports = 2000
+
+    def setUp(self):
+        self.intr_in = channel_listener(2)
+        self.ctrl_in = channel_listener(2)
+        self.slots = decoder_slots(make_decoder(), make_decoder)
+        self.stop = False
+        self.multiplexer = connection_multiplexer(self.intr_in, self.ctrl_in,
+                                                  lambda address: self.slots.acquire(address).receiver,
+                                                  max_connections = 2,
+                                                  running = lambda: not self.stop)
+        self.multiplexer.idle_period = 0.1 # Bounds how long tearDown waits for the loop.
+        self.thread = threading.Thread(target = self.multiplexer.run)
+        self.thread.start()
+
+    def tearDown(self):
+        self.stop = True
+        self.thread.join(2)
+        self.intr_in.close()
+        self.ctrl_in.close()
+
+    def connect(self, address):
+        ctrl = self.ctrl_in.connect(address)
+        intr = self.intr_in.connect(address)
+        ctrl.settimeout(2)
+        self.assertEqual(ctrl.recv(128), ACTIVATE_COMMAND)
+        return (intr, ctrl)
+
+    def test_back_to_back_reports_stay_apart(self):
+        joys = [self.connect("127.0.0.1"), self.connect("127.0.0.2")]
+        generators = [report_generator(0, "idle"), report_generator(1, "sweep")]
+        for seq in range(self.reports):
+            for ((intr, ctrl), generator) in zip(joys, generators):
+                intr.send(generator.report(seq, time.time()))
+        stats = [self.slots.connected[address].receiver.stats for address in ("127.0.0.1", "127.0.0.2")]
+        start = time.time()
+        while any(s.packets < self.reports for s in stats) and time.time() - start < 5:
+            time.sleep(0.01)
+        for s in stats:
+            self.assertEqual((s.packets, s.invalid), (self.reports, 0))
+        for (intr, ctrl) in joys:
+            intr.close()
+            ctrl.close()
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('ps3joy', 'test_loadgen', TestLoadgen)
+    rosunit.unitrun('ps3joy', 'test_loadgen', TestChannels)
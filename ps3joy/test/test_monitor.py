@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+import threading
+import time
+import unittest
+
+from ps3joy_core.monitor import health_monitor
+
+class TestHealthMonitor(unittest.TestCase):
+
+    def test_detects_loss(self):
+        results = [True, True, False]
+        lost = threading.Event()
+        monitor = health_monitor(lambda: results.pop(0), 0.01, on_lost = lost.set)
+        monitor.start()
+        self.assertTrue(lost.wait(2))
+        monitor.join(2)
+        self.assertFalse(monitor.online)
+        self.assertEqual(monitor.checks, 3)
+
+    def test_exception_counts_as_loss(self):
+        def check():
+            raise IOError("connection refused")
+        monitor = health_monitor(check, 0.01)
+        monitor.start()
+        monitor.join(2)
+        self.assertFalse(monitor.online)
+
+    def test_stop(self):
+        monitor = health_monitor(lambda: True, 0.01)
+        monitor.start()
+        time.sleep(0.05)
+        monitor.stop()
+        monitor.join(2)
+        self.assertFalse(monitor.is_alive())
+        self.assertTrue(monitor.online)
+        self.assertTrue(monitor.checks >= 1)
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('ps3joy', 'test_monitor', TestHealthMonitor)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+import socket
+import sys
+import threading
+import time
+import unittest
+
+from ps3joy_core.receiver import receiver, BadJoystickException, STEP_ACTIVE
+from ps3joy_core import multiplexer
+from ps3joy_core.multiplexer import connection_manager, connection_multiplexer, decoder_slots
+from ps3joy_core.multiplexer import CLOSED_ENDED, CLOSED_REPLACED, CLOSED_UNSUPPORTED
+
+class recording_decoder:
+    def __init__(self):
+        self.reports = []
+        self.receiver = receiver(self.step, self.fullstop)
+
+    def step(self, rawdata):
+        if rawdata == b"bad":
+            raise BadJoystickException()
+        self.reports.append(bytes(rawdata))
+        return STEP_ACTIVE
+
+    def fullstop(self):
+        pass
+
+def listening_socket():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(4)
+    return sock
+
+class fake_controller:
+    """Connects both channels from its own loopback address."""
+
+    def __init__(self, address, intr_sock, ctrl_sock):
+        self.ctrl = socket.create_connection(ctrl_sock.getsockname(), source_address = (address, 0))
+        self.intr = socket.create_connection(intr_sock.getsockname(), source_address = (address, 0))
+
+    def close(self):
+        self.intr.close()
+        self.ctrl.close()
+
+class recording_socket:
+    def __init__(self, *args):
+        self.args = args
+
+    def bind(self, address):
+        self.address = address
+
+    def listen(self, backlog):
+        self.backlog = backlog
+
+class bluetooth_socket_module:
+    """The parts of a socket module built with Bluetooth support."""
+    AF_BLUETOOTH = 31
+    SOCK_SEQPACKET = 5
+    BTPROTO_L2CAP = 0
+    BDADDR_ANY = "00:00:00:00:00:00"
+    socket = recording_socket
+
+class TestBluetoothSocket(unittest.TestCase):
+
+    @unittest.skipIf(sys.version_info[0] < 3, "Python 2 uses PyBluez sockets")
+    def test_standard_library_socket(self):
+        saved = multiplexer.socket
+        multiplexer.socket = bluetooth_socket_module
+        try:
+            sock = connection_manager(None, max_controllers = 1).prepare_bluetooth_socket(multiplexer.L2CAP_PSM_HIDP_INTR)
+        finally:
+            multiplexer.socket = saved
+        self.assertEqual(sock.args, (31, 5, 0))
+        self.assertEqual(sock.address, ("00:00:00:00:00:00", 19))
+        self.assertEqual(sock.backlog, 1)
+
+class TestDecoderSlots(unittest.TestCase):
+
+    def test_reconnect_keeps_decoder(self):
+        made = []
+        def make():
+            made.append(object())
+            return made[-1]
+        first = object()
+        slots = decoder_slots(first, make)
+        self.assertTrue(slots.acquire("a") is first)
+        second = slots.acquire("b")
+        self.assertTrue(second is made[0])
+        slots.release("a")
+        slots.release("b")
+        self.assertTrue(slots.acquire("b") is second)
+        self.assertTrue(slots.acquire("c") is first)
+        self.assertEqual(len(made), 1)
+
+class TestMultiplexer(unittest.TestCase):
+
+    def setUp(self):
+        self.intr_sock = listening_socket()
+        self.ctrl_sock = listening_socket()
+        self.slots = decoder_slots(recording_decoder(), recording_decoder)
+        self.closed = []
+        self.reasons = []
+        self.stop = False
+        self.multiplexer = connection_multiplexer(self.intr_sock, self.ctrl_sock,
+                                                  lambda address: self.slots.acquire(address).receiver,
+                                                  max_connections = 2,
+                                                  on_closed = self.on_closed,
+                                                  running = lambda: not self.stop)
+        self.multiplexer.pairing_timeout = 0.2
+        self.multiplexer.idle_period = 0.1 # Bounds how long tearDown waits for the loop.
+        self.thread = threading.Thread(target = self.multiplexer.run)
+        self.thread.start()
+
+    def tearDown(self):
+        self.stop = True
+        self.thread.join(2)
+        self.intr_sock.close()
+        self.ctrl_sock.close()
+
+    def on_closed(self, address, reason):
+        self.closed.append(address)
+        self.reasons.append(reason)
+        self.slots.release(address)
+
+    def wait_for(self, condition):
+        start = time.time()
+        while not condition() and time.time() - start < 2:
+            time.sleep(0.01)
+        self.assertTrue(condition())
+
+    def test_concurrent_controllers(self):
+        joy1 = fake_controller("127.0.0.1", self.intr_sock, self.ctrl_sock)
+        joy2 = fake_controller("127.0.0.2", self.intr_sock, self.ctrl_sock)
+        self.wait_for(lambda: len(self.multiplexer.sessions) == 2)
+        joy1.intr.send(b"one")
+        joy2.intr.send(b"two")
+        self.wait_for(lambda: len(self.slots.connected) == 2 and
+                      all(d.reports for d in self.slots.connected.values()))
+        self.assertEqual(self.slots.connected["127.0.0.1"].reports, [b"one"])
+        self.assertEqual(self.slots.connected["127.0.0.2"].reports, [b"two"])
+        joy1.close()
+        self.wait_for(lambda: self.closed == ["127.0.0.1"])
+        joy2.intr.send(b"still here")
+        self.wait_for(lambda: len(self.slots.connected["127.0.0.2"].reports) == 2)
+        joy2.close()
+
+    def test_reconnect_replaces_session(self):
+        joy = fake_controller("127.0.0.1", self.intr_sock, self.ctrl_sock)
+        self.wait_for(lambda: "127.0.0.1" in self.multiplexer.sessions)
+        decoder = self.slots.connected["127.0.0.1"]
+        joy.intr.send(b"one")
+        self.wait_for(lambda: decoder.reports == [b"one"])
+        again = fake_controller("127.0.0.1", self.intr_sock, self.ctrl_sock)
+        self.wait_for(lambda: self.closed == ["127.0.0.1"])
+        self.assertEqual(self.reasons, [CLOSED_REPLACED])
+        self.wait_for(lambda: "127.0.0.1" in self.multiplexer.sessions)
+        self.assertEqual(joy.intr.recv(16), b"") # The old channels are closed.
+        again.intr.send(b"two")
+        self.wait_for(lambda: decoder.reports == [b"one", b"two"])
+        self.assertTrue(self.slots.connected["127.0.0.1"] is decoder)
+        again.close()
+        self.wait_for(lambda: self.reasons == [CLOSED_REPLACED, CLOSED_ENDED])
+        self.assertEqual(self.multiplexer.sessions, {})
+        joy.close()
+
+    def test_bad_joystick_keeps_listening(self):
+        joy = fake_controller("127.0.0.1", self.intr_sock, self.ctrl_sock)
+        self.wait_for(lambda: "127.0.0.1" in self.multiplexer.sessions)
+        joy.intr.send(b"bad")
+        self.wait_for(lambda: self.reasons == [CLOSED_UNSUPPORTED])
+        joy.close()
+        joy = fake_controller("127.0.0.1", self.intr_sock, self.ctrl_sock)
+        self.wait_for(lambda: "127.0.0.1" in self.multiplexer.sessions)
+        joy.close()
+
+    def test_too_many_controllers(self):
+        joys = [fake_controller("127.0.0.%i"%i, self.intr_sock, self.ctrl_sock) for i in (1, 2, 3)]
+        self.wait_for(lambda: len(self.multiplexer.sessions) == 2)
+        time.sleep(0.1)
+        self.assertEqual(sorted(self.multiplexer.sessions.keys()), ["127.0.0.1", "127.0.0.2"])
+        self.assertEqual(joys[2].intr.recv(16), b"") # Refused connections are closed.
+        for joy in joys:
+            joy.close()
+
+    def test_unpaired_channel_expires(self):
+        ctrl = socket.create_connection(self.ctrl_sock.getsockname())
+        self.wait_for(lambda: len(self.multiplexer.pending) == 1)
+        self.wait_for(lambda: len(self.multiplexer.pending) == 0)
+        self.assertEqual(self.multiplexer.sessions, {})
+        ctrl.close()
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('ps3joy', 'test_multiplexer', TestBluetoothSocket)
+    rosunit.unitrun('ps3joy', 'test_multiplexer', TestDecoderSlots)
+    rosunit.unitrun('ps3joy', 'test_multiplexer', TestMultiplexer)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+"""Checks the scripts and ps3joy_core modules for names used but never bound.
+
+The scripts need rospy, bluetooth or root to run, so a typo or a lost
+import in them would otherwise only show up on a robot. The check is
+coarse: a name counts as bound if any scope of the module binds it.
+"""
+
+import ast
+import glob
+import os
+import unittest
+
+try:
+    import builtins
+except ImportError: # Python 2
+    import __builtin__ as builtins
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOURCES = sorted(glob.glob(os.path.join(HERE, "..", "scripts", "*.py")) +
+                 glob.glob(os.path.join(HERE, "..", "src", "ps3joy_core", "*.py")))
+
+def bound_names(tree):
+    names = set(dir(builtins)) | set(["__file__", "__name__", "__doc__"])
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.ClassDef)) or type(node).__name__ == "AsyncFunctionDef":
+            names.add(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                names.add((alias.asname or alias.name).split(".")[0])
+        elif type(node).__name__ == "arg": # Python 3 arguments
+            names.add(node.arg)
+        elif isinstance(node, ast.ExceptHandler) and isinstance(node.name, str):
+            names.add(node.name)
+        elif isinstance(node, ast.arguments):
+            for extra in (node.vararg, node.kwarg):
+                if isinstance(extra, str): # Python 2
+                    names.add(extra)
+    return names
+
+def undefined_names(path):
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    bound = bound_names(tree)
+    return sorted(set("%s (line %i)" % (node.id, node.lineno) for node in ast.walk(tree)
+                      if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)
+                      and node.id not in bound))
+
+class TestNames(unittest.TestCase):
+
+    def test_no_undefined_names(self):
+        self.assertTrue(SOURCES)
+        for path in SOURCES:
+            if path.endswith("aio.py") and not hasattr(ast, "AsyncFunctionDef"):
+                continue # Python 3 syntax.
+            self.assertEqual(undefined_names(path), [], os.path.basename(path))
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('ps3joy', 'test_names', TestNames)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+import errno
+import socket
+import sys
+import threading
+import time
+import unittest
+
+import ps3joy_core.receiver
+from ps3joy_core.receiver import receiver, receive_stats, would_block, ACTIVATE_COMMAND, STEP_ACTIVE, STEP_IDLE, STEP_ERROR
+
+class recording_decoder:
+    def __init__(self):
+        self.reports = []
+        self.types = set()
+        self.fullstops = 0
+        self.activations = 0
+
+    def step(self, rawdata):
+        # rawdata is only valid until the next report.
+        self.types.add(type(rawdata))
+        rawdata = bytes(rawdata)
+        self.reports.append(rawdata)
+        if rawdata == b'bad':
+            return STEP_ERROR
+        if rawdata == b'idle':
+            return STEP_IDLE
+        return STEP_ACTIVE
+
+    def fullstop(self):
+        self.fullstops += 1
+
+    def activated(self, ctrl):
+        self.activations += 1
+
+class TestReceiver(unittest.TestCase):
+
+    def setUp(self):
+        (self.intr, self.joy_intr) = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        (self.ctrl, self.joy_ctrl) = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.decoder = recording_decoder()
+        self.receiver = receiver(self.decoder.step, self.decoder.fullstop,
+                                 on_activated = self.decoder.activated)
+        self.thread = threading.Thread(target = self.receiver.run, args = (self.intr, self.ctrl))
+
+    def tearDown(self):
+        for sock in (self.intr, self.joy_intr, self.ctrl, self.joy_ctrl):
+            sock.close()
+
+    def test_activation_and_drain(self):
+        self.thread.start()
+        self.joy_ctrl.settimeout(1)
+        self.assertEqual(self.joy_ctrl.recv(128), ACTIVATE_COMMAND)
+        for i in range(10):
+            self.joy_intr.send(b'report%i' % i)
+        time.sleep(0.05)
+        self.joy_intr.close()
+        self.thread.join(2)
+        self.assertFalse(self.thread.is_alive())
+        self.assertEqual(self.decoder.reports, [b'report%i' % i for i in range(10)])
+        self.assertEqual(self.decoder.activations, 1)
+        self.assertEqual(self.receiver.stats.packets, 10)
+        self.assertTrue(self.receiver.stats.wakeups <= 10)
+
+    def test_drain_polls_once_per_wakeup(self):
+        readable = []
+        saved = ps3joy_core.receiver.readable_waiter
+        class counting_waiter(saved):
+            def wait(self, timeout):
+                result = saved.wait(self, timeout)
+                if result:
+                    readable.append(timeout)
+                return result
+        ps3joy_core.receiver.readable_waiter = counting_waiter
+        try:
+            for i in range(10):
+                self.joy_intr.send(b'report%i' % i)
+            self.thread.start()
+            time.sleep(0.05)
+            self.joy_intr.close()
+            self.thread.join(2)
+        finally:
+            ps3joy_core.receiver.readable_waiter = saved
+        self.assertEqual(self.decoder.reports, [b'report%i' % i for i in range(10)])
+        self.assertEqual(self.receiver.stats.max_batch, 10)
+        # One poll for the batch, and one that finds the socket closed:
+        self.assertEqual(self.receiver.stats.wakeups, 1)
+        self.assertEqual(len(readable), 2)
+
+    def test_would_block(self):
+        self.assertTrue(would_block(socket.error(errno.EAGAIN, "Resource temporarily unavailable")))
+        self.assertTrue(would_block(IOError("(11, 'Resource temporarily unavailable')"))) # Old PyBluez
+        self.assertFalse(would_block(socket.error(errno.ECONNRESET, "Connection reset by peer")))
+        self.assertFalse(would_block(IOError("(104, 'Connection reset by peer')")))
+
+    def test_reports_are_received_into_one_buffer(self):
+        self.thread.start()
+        self.joy_intr.send(b'one')
+        self.joy_intr.send(b'longer')
+        time.sleep(0.05)
+        self.joy_intr.close()
+        self.thread.join(2)
+        self.assertEqual(self.decoder.reports, [b'one', b'longer'])
+        # Python 2 keeps receiving str reports.
+        self.assertEqual(self.decoder.types, set([memoryview if sys.version_info[0] >= 3 else bytes]))
+
+    def test_recv_fallback(self):
+        class recv_only:
+            # Like a PyBluez socket, which has no recv_into.
+            def __init__(self, sock):
+                self.sock = sock
+            def __getattr__(self, name):
+                if name == "recv_into":
+                    raise AttributeError(name)
+                return getattr(self.sock, name)
+        self.thread = threading.Thread(target = self.receiver.run, args = (recv_only(self.intr), self.ctrl))
+        self.thread.start()
+        self.joy_intr.send(b'one')
+        time.sleep(0.05)
+        self.joy_intr.close()
+        self.thread.join(2)
+        self.assertEqual(self.decoder.reports, [b'one'])
+        self.assertEqual(self.decoder.types, set([bytes]))
+
+    def test_activation_retries(self):
+        self.thread.start()
+        self.joy_ctrl.settimeout(1)
+        start = time.time()
+        self.assertEqual(self.joy_ctrl.recv(128), ACTIVATE_COMMAND)
+        self.assertTrue(time.time() - start < 0.05)
+        # Retries after 10, 20 and 40 ms, then every 100 ms at most.
+        for i in range(3):
+            self.assertEqual(self.joy_ctrl.recv(128), ACTIVATE_COMMAND)
+        self.assertTrue(time.time() - start < 0.1)
+        self.joy_intr.send(b'one')
+        time.sleep(0.05)
+        self.joy_intr.close()
+        self.thread.join(2)
+        times = self.receiver.stats.connect_times()
+        self.assertTrue(0 <= times["paired"] <= times["first_report"] <= times["first_valid"] < 1)
+        self.assertTrue(times["activate_commands"] >= 4)
+        self.assertEqual(self.receiver.stats.connects, 1)
+
+    def test_capture(self):
+        captured = []
+        class list_writer:
+            def write(self, timestamp, rawdata):
+                captured.append((timestamp, bytes(rawdata)))
+        self.receiver.capture = list_writer()
+        start = time.time()
+        self.thread.start()
+        self.joy_intr.send(b'one')
+        self.joy_intr.send(b'two')
+        time.sleep(0.05)
+        self.joy_intr.close()
+        self.thread.join(2)
+        self.assertEqual([rawdata for (timestamp, rawdata) in captured], [b'one', b'two'])
+        for (timestamp, rawdata) in captured:
+            self.assertTrue(start <= timestamp <= time.time())
+
+    def test_fullstop_after_silence(self):
+        self.thread.start()
+        self.joy_intr.send(b'idle')
+        time.sleep(0.05)
+        fullstops = self.decoder.fullstops
+        time.sleep(0.2)
+        self.assertEqual(self.decoder.fullstops, fullstops + 1)
+        self.assertEqual(self.receiver.stats.fullstops, 1)
+        self.joy_intr.close()
+        self.thread.join(2)
+        self.assertFalse(self.thread.is_alive())
+
+    def test_inactivity_timeout(self):
+        self.receiver.inactivity_timeout = 0.2
+        self.thread.start()
+        start = time.time()
+        while self.thread.is_alive() and time.time() - start < 2:
+            self.joy_intr.send(b'idle')
+            time.sleep(0.01)
+        self.thread.join(2)
+        self.assertFalse(self.thread.is_alive())
+        self.assertTrue(time.time() - start < 1)
+
+class TestReceiveStats(unittest.TestCase):
+
+    def test_link_quality(self):
+        stats = receive_stats(history = 8)
+        self.assertEqual(stats.link_quality(0.)["since_valid"], None)
+        # 20 reports 10 ms apart, then one 100 ms late; only the last 8 are kept.
+        times = [i * 0.01 for i in range(20)] + [0.29]
+        for (i, t) in enumerate(times):
+            stats.record(t, t, valid = i != 17, active = i % 2 == 0)
+            stats.record_wakeup(t, 1, t)
+        link = stats.link_quality(0.5)
+        self.assertAlmostEqual(link["rate"], 7 / (0.29 - 0.13))
+        self.assertAlmostEqual(link["interarrival_p50"], 0.01)
+        self.assertAlmostEqual(link["interarrival_p99"], 0.1)
+        self.assertEqual(link["invalid"], 1)
+        self.assertAlmostEqual(link["activity"], 4 / 7.)
+        self.assertAlmostEqual(link["since_valid"], 0.21)
+        self.assertEqual(stats.invalid, 1)
+        self.assertEqual(dict(stats.summary(0.5))["Recent invalid packets"], "1 of 8")
+        self.assertAlmostEqual(link["batch_mean"], 1.)
+
+    def test_batched_wakeups(self):
+        stats = receive_stats(history = 8)
+        # Three reports every 30 ms, drained in one wake-up each time.
+        for i in range(10):
+            t = i * 0.03
+            for j in range(3):
+                stats.record(t, t + 0.0001 * j, True)
+            stats.record_wakeup(t, 3, t + 0.0003)
+        link = stats.link_quality(0.3)
+        self.assertAlmostEqual(link["interarrival_p50"], 0.03)
+        self.assertAlmostEqual(link["interarrival_p99"], 0.03)
+        self.assertAlmostEqual(link["rate"], 100.)
+        self.assertAlmostEqual(link["batch_mean"], 3.)
+        self.assertEqual(stats.max_batch, 3)
+
+    def test_reset(self):
+        stats = receive_stats(history = 4)
+        stats.record(1., 1., True)
+        stats.record_wakeup(1., 1, 1.)
+        stats.record_fullstop()
+        stats.reset()
+        link = stats.link_quality(2.)
+        self.assertEqual((stats.packets, stats.fullstops, link["invalid"], link["rate"]), (0, 0, 0, 0.))
+        self.assertEqual(dict(stats.summary(2.))["Since last valid report (s)"], "never")
+
+    def test_connect_times(self):
+        stats = receive_stats()
+        self.assertEqual(stats.connect_summary(), [])
+        for (accepted, delay) in ((10., 0.2), (20., 0.4)):
+            stats.reset()
+            stats.record_open(accepted, accepted + 0.01)
+            stats.record_activate_command()
+            stats.record(accepted + 0.05, accepted + 0.05, False)
+            stats.record(accepted + delay, accepted + delay, True)
+            stats.record(accepted + delay + 0.01, accepted + delay + 0.01, True)
+        times = stats.connect_times()
+        self.assertAlmostEqual(times["paired"], 0.01)
+        self.assertAlmostEqual(times["first_report"], 0.05)
+        self.assertAlmostEqual(times["first_valid"], 0.4)
+        self.assertEqual(times["activate_commands"], 1)
+        summary = dict(stats.summary(21.))
+        self.assertEqual(summary["First valid report after (ms)"], "400.0")
+        self.assertEqual(summary["Connections"], "2")
+        self.assertEqual(summary["Connect time mean (ms)"], "300.0")
+        self.assertEqual(summary["Connect time max (ms)"], "400.0")
+        self.assertEqual(stats.connect_message(), "Channels paired after 10.0 ms, first report after 50.0 ms "
+                         "(1 activation commands), first valid report after 400.0 ms.")
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('ps3joy', 'test_receiver', TestReceiver)
+    rosunit.unitrun('ps3joy', 'test_receiver', TestReceiveStats)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import shutil
+import struct
+import tempfile
+import time
+import unittest
+
+from ps3joy_core.device import RING_FORMAT, BUTTONS, AXES, axis_config, decoder_core, ring_output
+from ps3joy_core.shmring import ring_writer, ring_reader
+from test_decoding import rest_report
+
+class TestRing(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "ring")
+        self.writer = ring_writer(self.path, "=dhh", slots = 4)
+        self.reader = ring_reader(self.path)
+
+    def tearDown(self):
+        self.reader.close()
+        self.writer.close()
+        shutil.rmtree(self.dir)
+
+    def test_empty(self):
+        self.assertEqual(self.reader.head(), 0)
+        self.assertEqual(self.reader.latest(), None)
+        self.assertEqual(self.reader.read(), [])
+        self.assertEqual(self.reader.format, "=dhh")
+
+    def test_latest(self):
+        self.writer.write(1.5, 3, -4)
+        self.writer.write(2.5, 5, -6)
+        self.assertEqual(self.reader.latest(), (2, (2.5, 5, -6)))
+
+    def test_read_since(self):
+        for i in range(3):
+            self.writer.write(float(i), i, -i)
+        frames = self.reader.read()
+        self.assertEqual([seq for (seq, values) in frames], [1, 2, 3])
+        self.writer.write(3., 3, -3)
+        self.assertEqual(self.reader.read(since = 3), [(4, (3., 3, -3))])
+        self.assertEqual(self.reader.lost, 0)
+
+    def test_overwritten_frames_are_lost(self):
+        for i in range(10):
+            self.writer.write(float(i), i, -i)
+        frames = self.reader.read(since = 2)
+        self.assertEqual([seq for (seq, values) in frames], [7, 8, 9, 10])
+        self.assertEqual(self.reader.lost, 4)
+        self.assertEqual(self.reader.get(2), None)
+
+    def test_torn_slot_is_rejected(self):
+        self.writer.write(1., 1, 1)
+        # A write in progress: the leading sequence number is already updated.
+        self.writer.map[64:72] = b"\x05" + b"\0" * 7
+        self.assertEqual(self.reader.get(1), None)
+
+    def test_restart_keeps_old_mapping(self):
+        self.writer.write(1., 1, 1)
+        restarted = ring_writer(self.path, "=dhh", slots = 4)
+        self.assertEqual(self.reader.latest(), (1, (1., 1, 1)))
+        reopened = ring_reader(self.path)
+        self.assertEqual(reopened.latest(), None)
+        reopened.close()
+        restarted.close()
+
+    def test_not_a_ring(self):
+        other = os.path.join(self.dir, "other")
+        with open(other, "wb") as f:
+            f.write(b"\0" * 128)
+        self.assertRaises(IOError, ring_reader, other)
+
+# The ring layout shared with wiimote.shmring: a ring of two slots
+# holding one "=dh" record (1.5, -2). Bytes 24 to 32 hold the creation time.
+SHARED_LAYOUT = (b"JSRING1\0" + struct.pack("=IIQ", 2, 32, 1) + b"\0" * 8 + b"=dh".ljust(32, b"\0") +
+                 struct.pack("=Qdh", 1, 1.5, -2) + b"\0" * 6 + struct.pack("=Q", 1) +
+                 b"\0" * 32)
+
+class TestRingFormat(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "ring")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_layout(self):
+        start = time.time()
+        writer = ring_writer(self.path, "=dh", slots = 2)
+        writer.write(1.5, -2)
+        writer.close()
+        with open(self.path, "rb") as f:
+            data = f.read()
+        self.assertEqual(data[:24] + data[32:], SHARED_LAYOUT[:24] + SHARED_LAYOUT[32:])
+        self.assertTrue(start <= struct.unpack_from("=d", data, 24)[0] <= time.time())
+        with open(self.path, "wb") as f:
+            f.write(SHARED_LAYOUT)
+        reader = ring_reader(self.path)
+        self.assertEqual(reader.latest(), (1, (1.5, -2)))
+        reader.close()
+
+    def test_wiimote_reads_ps3joy_ring(self):
+        try:
+            from wiimote.shmring import RingReader
+        except ImportError:
+            self.skipTest("wiimote is not on the path")
+        writer = ring_writer(self.path, "=dh", slots = 2)
+        writer.write(1.5, -2)
+        reader = RingReader(self.path)
+        self.assertEqual(reader.latest(), (1, (1.5, -2)))
+        reader.close()
+        writer.close()
+
+class TestRingOutput(unittest.TestCase):
+
+    def test_frames_reach_the_ring(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "ps3joy")
+            axes = axis_config()
+            core = decoder_core([ring_output(path)], axes, clock = lambda: 7.25)
+            reader = ring_reader(path)
+            self.assertEqual(reader.format, RING_FORMAT)
+            (seq, values) = reader.latest()
+            self.assertEqual(values, tuple([7.25] + [0] * len(BUTTONS) + axes.axmid)) # Fullstop at startup.
+            core.step(rest_report())
+            (seq, values) = reader.latest()
+            self.assertEqual(seq, 2)
+            self.assertEqual(list(values[1:]), core.report.out)
+            self.assertEqual(len(values), 1 + len(BUTTONS) + len(AXES))
+            reader.close()
+            core.close()
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('ps3joy', 'test_shmring', TestRing)
+    rosunit.unitrun('ps3joy', 'test_shmring', TestRingFormat)
+    rosunit.unitrun('ps3joy', 'test_shmring', TestRingOutput)
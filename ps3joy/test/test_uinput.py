@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+#***********************************************************
+#* Software License Agreement (BSD License)
+#*
+#*  Copyright (c) 2009, Willow Garage, Inc.
+#*  All rights reserved.
+#*
+#*  Redistribution and use in source and binary forms, with or without
+#*  modification, are permitted provided that the following conditions
+#*  are met:
+#*
+#*   * Redistributions of source code must retain the above copyright
+#*     notice, this list of conditions and the following disclaimer.
+#*   * Redistributions in binary form must reproduce the above
+#*     copyright notice, this list of conditions and the following
+#*     disclaimer in the documentation and/or other materials provided
+#*     with the distribution.
+#*   * Neither the name of the Willow Garage nor the names of its
+#*     contributors may be used to endorse or promote products derived
+#*     from this software without specific prior written permission.
+#*
+#*  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#*  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#*  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+#*  FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+#*  COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+#*  INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+#*  BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+#*  LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+#*  CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+#*  LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+#*  ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+#*  POSSIBILITY OF SUCH DAMAGE.
+
+import io
+import os
+import unittest
+
+from ps3joy_core.uinput import uinput, uinput_events, axis_filter, defuzz
+
+class TestUinputEvents(unittest.TestCase):
+
+    def setUp(self):
+        (self.read_fd, self.write_fd) = os.pipe()
+        self.events = uinput_events(self.write_fd,
+                                    [uinput.EV_KEY] * 2 + [uinput.EV_ABS] * 3,
+                                    [0x100, 0x101, 0, 1, 2])
+
+    def tearDown(self):
+        os.close(self.read_fd)
+        os.close(self.write_fd)
+
+    def read_events(self):
+        """Return the (type, code, value) triplets of one write."""
+        size = uinput_events.input_event.size
+        data = os.read(self.read_fd, 4096)
+        self.assertEqual(len(data) % size, 0)
+        return [uinput_events.input_event.unpack(data[i:i + size])[2:]
+                for i in range(0, len(data), size)]
+
+    def test_first_frame_writes_everything(self):
+        self.assertEqual(self.events.update([0, 1, 128, 128, 512]), 5)
+        self.assertEqual(self.read_events(),
+                         [(uinput.EV_KEY, 0x100, 0), (uinput.EV_KEY, 0x101, 1),
+                          (uinput.EV_ABS, 0, 128), (uinput.EV_ABS, 1, 128), (uinput.EV_ABS, 2, 512),
+                          (uinput.EV_SYN, uinput.SYN_REPORT, 0)])
+
+    def test_only_changes_are_written(self):
+        self.events.update([0, 0, 128, 128, 512])
+        self.read_events()
+        self.assertEqual(self.events.update([1, 0, 128, 90, 512]), 2)
+        self.assertEqual(self.read_events(),
+                         [(uinput.EV_KEY, 0x100, 1), (uinput.EV_ABS, 1, 90),
+                          (uinput.EV_SYN, uinput.SYN_REPORT, 0)])
+        self.assertEqual(self.events.writes, 2)
+
+    def test_unchanged_frame_writes_nothing(self):
+        self.events.update([0, 0, 128, 128, 512])
+        self.read_events()
+        self.assertEqual(self.events.update([0, 0, 128, 128, 512]), 0)
+        self.assertEqual(self.events.writes, 1)
+
+    def test_memory_file(self):
+        buff = io.BytesIO()
+        events = uinput_events(buff, [uinput.EV_KEY, uinput.EV_ABS], [0x100, 0])
+        events.update([1, 128])
+        events.update([1, 64])
+        size = uinput_events.input_event.size
+        self.assertEqual(len(buff.getvalue()), 5 * size)
+        self.assertEqual((events.writes, events.events, events.bytes), (2, 3, 5 * size))
+
+def kernel_defuzz(value, old_val, fuzz):
+    # input_defuzz_abs_event from drivers/input/input.c, with C division.
+    div = lambda a, b: int(float(a) / b)
+    if fuzz:
+        if value > old_val - div(fuzz, 2) and value < old_val + div(fuzz, 2):
+            return old_val
+        if value > old_val - fuzz and value < old_val + fuzz:
+            return div(old_val * 3 + value, 4)
+        if value > old_val - fuzz * 2 and value < old_val + fuzz * 2:
+            return div(old_val + value, 2)
+    return value
+
+class TestAxisFilter(unittest.TestCase):
+
+    def make_events(self, axfilter):
+        self.buff = io.BytesIO()
+        return uinput_events(self.buff, [uinput.EV_KEY] + [uinput.EV_ABS] * 2, [0x100, 0, 1], axfilter)
+
+    def test_defuzz_matches_kernel(self):
+        for fuzz in (1, 2, 3, 4, 7):
+            for old in (-300, -5, 0, 128, 511):
+                for value in range(old - 20, old + 20):
+                    self.assertEqual(defuzz(value, old, fuzz), kernel_defuzz(value, old, fuzz))
+        self.assertEqual(defuzz(103, 100, 4, smoothing = False), 103)
+        self.assertEqual(defuzz(101, 100, 4, smoothing = False), 100)
+
+    def test_jitter_is_not_written(self):
+        events = self.make_events(axis_filter([4, 0]))
+        events.update([0, 500, 10])
+        self.assertEqual(events.update([0, 501, 10]), 0)
+        self.assertEqual(events.update([0, 499, 11]), 1)
+        self.assertEqual(events.update([0, 499, 11]), 0) # Unchanged input is not counted.
+        self.assertEqual(events.update([0, 520, 11]), 1)
+        self.assertEqual(list(events.value), [0, 520, 11])
+        self.assertEqual((events.events, events.suppressed), (3 + 2, 2))
+
+    def test_smoothing(self):
+        events = self.make_events(axis_filter([4, 4]))
+        events.update([0, 500, 500])
+        events.update([0, 503, 506])
+        self.assertEqual(list(events.value), [0, 500, 503])
+        events = self.make_events(axis_filter([4, 4], smoothing = False))
+        events.update([0, 500, 500])
+        events.update([0, 501, 503])
+        self.assertEqual(list(events.value), [0, 500, 503])
+
+    def test_dead_zone(self):
+        events = self.make_events(axis_filter([0, 0], flat = [4, 0], center = [128, 0]))
+        events.update([0, 128, 0])
+        self.assertEqual(events.update([0, 131, 0]), 0)
+        self.assertEqual(events.update([0, 125, 0]), 0)
+        self.assertEqual(events.update([0, 133, 0]), 1)
+        self.assertEqual(events.update([0, 130, 0]), 1)
+        self.assertEqual(list(events.value), [0, 128, 0])
+        self.assertEqual(events.suppressed, 2)
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('ps3joy', 'test_uinput', TestUinputEvents)
+    rosunit.unitrun('ps3joy', 'test_uinput', TestAxisFilter)
@@ -43,6 +43,9 @@ the Wiimote stick's rumble (vibration) and LEDs. Transmitted topics (@100Hz):
    o imu/is_calibrated Latched message
    o nunchuk           Joy messages using the nunchuk as a joystick
    o classic           Joy messages using the nunchuck as a joystic
+
+Topics without subscribers are not computed: their senders sleep
+until a subscriber connects.
                  
 The node listens to the following messages:
 
@@ -51,7 +54,29 @@ The node listens to the following messages:
    o imu/calibrate
                  Request to calibrate the device.
                  
-No command line parameters.
+No command line parameters. Private ROS parameters:
+
+   o ~instrumentation  (bool, default False)
+                 Collect lock wait, callback, snapshot age, publish and
+                 loop timing histograms. Results are published on /diagnostics
+                 once per second and written to stderr on SIGUSR1.
+   o ~orientation_filter  (bool, default False)
+                 Estimate orientation from the accelerometer and, when present,
+                 the MotionPlus gyro, and publish it in imu/data.
+   o ~orientation_filter_gain  (float, default 0.1)
+                 Accelerometer correction gain (Madgwick beta) of that filter.
+   o ~catchup_policy  ('skip' or 'burst', default 'skip')
+                 What a sender does after missing publication deadlines:
+                 drop them ('skip'), or publish immediately once per missed
+                 deadline to restore the average rate ('burst').
+   o ~shm_ring  (string, default '')
+                 When set, the path of a shared-memory ring (such as
+                 /dev/shm/wiimote) into which every Wiimote state is
+                 written, for processes on the same host that read it
+                 with wiimote.shmring.RingReader instead of subscribing.
+
+Achieved versus target publication rate of each topic is published
+on /diagnostics once per second, and written to stderr on SIGUSR1.
 """
 
 # Code structure: The main thread spawns one thread each for the 
@@ -68,6 +93,7 @@ No command line parameters.
 # TODO: Command line option: --no-zeroing
 
 # -------- Python Standard Modules:
+import signal
 import sys
 import threading
 import traceback
@@ -81,10 +107,12 @@ from sensor_msgs.msg import Imu
 from std_srvs.srv import Empty
 from std_srvs.srv import EmptyResponse
 from std_msgs.msg import Bool
+from diagnostic_msgs.msg import DiagnosticArray
+from diagnostic_msgs.msg import DiagnosticStatus
+from diagnostic_msgs.msg import KeyValue
 from sensor_msgs.msg import Joy
 from sensor_msgs.msg import JoyFeedback
 from sensor_msgs.msg import JoyFeedbackArray
-from wiimote.msg import IrSourceInfo
 from wiimote.msg import State
 
 # -------- WIIMote Modules:
@@ -92,9 +120,30 @@ from wiimote.wiimoteExceptions import *
 from wiimote.wiimoteConstants import *
 import wiimote.WIIMote
 import wiimote.wiiutils
+from wiimote.instrumentation import Instrumentation
+from wiimote.orientation import OrientationFilter
+from wiimote.scheduler import FixedRateScheduler
+from wiimote.scheduler import CATCHUP_SKIP
+from wiimote.stateserializer import StateSerializer
+from wiimote.shmring import StateRing
 
 GATHER_CALIBRATION_STATS = True
 
+# Senders whose topic has no subscribers sleep until one
+# subscribes, waking this often (seconds) to check for shutdown:
+SUBSCRIBER_WAIT_PERIOD = 1.0
+
+def sleepRosTime(duration):
+    """rospy.sleep, except that a jump back of simulated time just ends the sleep.
+
+    The scheduler then picks a new deadline; shutdown still raises
+    rospy.ROSInterruptException, which ends the senders.
+    """
+    try:
+        rospy.sleep(duration)
+    except rospy.ROSTimeMovedBackwardsException:
+        pass
+
 class WiimoteNode():
     
 
@@ -105,15 +154,40 @@ class WiimoteNode():
         # and are handled there:
         
         rospy.init_node('wiimote', anonymous=True, log_level=rospy.ERROR) # log_level=rospy.DEBUG
-        wiimoteDevice = wiimote.WIIMote.WIIMote()
+
+        instrumentation = None
+        if rospy.get_param('~instrumentation', False):
+            instrumentation = Instrumentation()
+
+        orientationFilter = None
+        if rospy.get_param('~orientation_filter', False):
+            orientationFilter = OrientationFilter(beta=rospy.get_param('~orientation_filter_gain', MADGWICK_BETA))
+
+        stateRing = None
+        if rospy.get_param('~shm_ring', ''):
+            stateRing = StateRing(rospy.get_param('~shm_ring'))
+
+        # All senders are paced by one scheduler, which staggers
+        # their deadlines across the period. It runs on ROS time, so
+        # that the senders follow /use_sim_time:
+        scheduler = FixedRateScheduler(catchup=rospy.get_param('~catchup_policy', CATCHUP_SKIP),
+                                       clock=rospy.get_time, sleep=sleepRosTime)
+
+        wiimoteDevice = wiimote.WIIMote.WIIMote(instrumentation=instrumentation,
+                                                orientationFilter=orientationFilter,
+                                                stateRing=stateRing)
         wiimoteDevice.zeroDevice()
+
+        reporter = InstrumentationReporter(scheduler, instrumentation)
+        # Signal handlers can only be installed from the main thread:
+        signal.signal(signal.SIGUSR1, reporter.dumpOnSignal)
         
         try:
-            IMUSender(wiimoteDevice, freq=100).start()
-            JoySender(wiimoteDevice, freq=100).start()
-            WiiSender(wiimoteDevice, freq=100).start()
-            NunSender(wiimoteDevice, freq=100).start()
-	    ClasSender(wiimoteDevice, freq=100).start()
+            IMUSender(wiimoteDevice, freq=100, scheduler=scheduler).start()
+            JoySender(wiimoteDevice, freq=100, scheduler=scheduler).start()
+            WiiSender(wiimoteDevice, freq=100, scheduler=scheduler).start()
+            NunSender(wiimoteDevice, freq=100, scheduler=scheduler).start()
+	    ClasSender(wiimoteDevice, freq=100, scheduler=scheduler).start()
             WiimoteListeners(wiimoteDevice).start()
             
             rospy.spin()
@@ -138,15 +212,87 @@ class WiimoteNode():
             WiimoteListener.stop
         except:
             pass
-        
+
+class InstrumentationReporter():
+    """Publishes sender rates and driver instrumentation on /diagnostics, and dumps them on request.
+
+    The instrumentation is optional (None when disabled); the
+    scheduler's achieved versus target rates are always reported.
+    """
+
+    def __init__(self, scheduler, instrumentation=None, period=1.0):
+        self.scheduler = scheduler
+        self.instrumentation = instrumentation
+        self.diagPub = rospy.Publisher('/diagnostics', DiagnosticArray, queue_size=1)
+        self.timer = rospy.Timer(rospy.Duration(period), self.publishDiagnostics)
+
+    def report(self):
+        res = self.scheduler.report()
+        if self.instrumentation is not None:
+            res.extend(self.instrumentation.report())
+        return res
+
+    def publishDiagnostics(self, event):
+        diag = DiagnosticArray()
+        diag.header.stamp = rospy.Time.now()
+        for (name, values) in self.report():
+            stat = DiagnosticStatus(name="wiimote: " + name, level=DiagnosticStatus.OK, message="OK")
+            stat.values = [KeyValue(key, value) for (key, value) in values]
+            diag.status.append(stat)
+        self.diagPub.publish(diag)
+
+    def dumpOnSignal(self, signum, frame):
+        sys.stderr.write('Wiimote sender rates:\n')
+        for (name, values) in self.scheduler.report():
+            sys.stderr.write('  %-32s %s\n' % (name, ' '.join(['%s=%s' % kv for kv in values])))
+        sys.stderr.flush()
+        if self.instrumentation is not None:
+            self.instrumentation.dump()
+        
+class SubscriberGate(rospy.SubscribeListener):
+    """Tracks whether a publisher has any subscribers.
+
+    Passed as the subscriber_listener of a sender's publisher, so
+    that connects and disconnects flip a threading.Event. Senders
+    block on that event instead of polling get_num_connections().
+    """
+
+    def __init__(self):
+        rospy.SubscribeListener.__init__(self)
+        self.subscribed = threading.Event()
+
+    def peer_subscribe(self, topic_name, topic_publish, peer_publish):
+        self.subscribed.set()
+
+    def peer_unsubscribe(self, topic_name, num_peers):
+        if num_peers == 0:
+            self.subscribed.clear()
+
 class WiimoteDataSender(threading.Thread):
     
-    def __init__(self, wiiMote, freq=100):
+    def __init__(self, wiiMote, freq=100, topic=None, scheduler=None):
         
         threading.Thread.__init__(self)
         self.wiiMote = wiiMote
         self.freq = freq
         self.sleepDuration = 1.0 / freq
+        self.gate = SubscriberGate()
+
+        # Loops wait for absolute deadlines of a (normally shared)
+        # scheduler rather than sleeping a fixed time per iteration:
+        if scheduler is None:
+            scheduler = FixedRateScheduler()
+        self.ticker = scheduler.ticker(topic, freq)
+
+        # Timing instrumentation is shared with the Wiimote driver. When
+        # it is disabled, the only cost in the loops below is a None test:
+        self.instrumentation = wiiMote.instrumentation
+        if self.instrumentation is not None:
+            self._lockWaitHist = self.instrumentation.histogram(topic + '/lock_wait')
+            self._snapshotAgeHist = self.instrumentation.histogram(topic + '/snapshot_age')
+            self._publishHist = self.instrumentation.histogram(topic + '/publish')
+            self._loopIntervalHist = self.instrumentation.histogram(topic + '/loop_interval')
+            self._lastLoopTime = None
         
         varianceAccelerator = self.wiiMote.getVarianceAccelerator();
         self.linear_acceleration_covariance = [varianceAccelerator[X], 0., 0.,
@@ -175,14 +321,61 @@ class WiimoteDataSender(threading.Thread):
         Return: list of canonicalized accelerator and gyro readings. 
         """
         
+        if self.instrumentation is not None:
+            self._recordLoopInterval()
+
         while not rospy.is_shutdown():
-            self.wiistate = self.wiiMote.getWiimoteState()
+            if self.instrumentation is not None:
+                lockStart = time.time()
+                self.wiistate = self.wiiMote.getWiimoteState()
+                self._lockWaitHist.record(time.time() - lockStart)
+            else:
+                self.wiistate = self.wiiMote.getWiimoteState()
             if self.wiistate is not None and self.wiistate.acc is not None:
                 break
             else:
                 rospy.sleep(0.1)
 
         return self.canonicalizeWiistate()
+
+    def waitForSubscribers(self):
+        """Block while nobody subscribes to this sender's topic.
+
+        Building and publishing messages nobody receives is wasted
+        work, so senders call this at the top of their loops. Returns
+        immediately when there are subscribers. Returns False if ROS
+        shut down while waiting.
+        """
+
+        if self.gate.subscribed.is_set():
+            return True
+        while not self.gate.subscribed.wait(SUBSCRIBER_WAIT_PERIOD):
+            if rospy.is_shutdown():
+                return False
+        # Don't count the idle time as a loop overrun:
+        self.ticker.resync()
+        if self.instrumentation is not None:
+            self._lastLoopTime = None
+        return True
+
+    def _recordLoopInterval(self):
+        """Note the time between consecutive loop iterations."""
+
+        now = time.time()
+        if self._lastLoopTime is not None:
+            self._loopIntervalHist.record(now - self._lastLoopTime)
+        self._lastLoopTime = now
+
+    def publish(self, msg):
+        """Publish msg on this sender's topic, timing the publication if instrumentation is enabled."""
+
+        if self.instrumentation is None:
+            self.pub.publish(msg)
+            return
+        publishStart = time.time()
+        self._snapshotAgeHist.record(publishStart - self.wiistate.time)
+        self.pub.publish(msg)
+        self._publishHist.record(time.time() - publishStart)
         
     def canonicalizeWiistate(self):
         """Scale accelerator, nunchuk accelerator, and gyro readings to be m/sec^2, m/sec^2 and radians/sec, respectively."""
@@ -217,18 +410,19 @@ class WiimoteDataSender(threading.Thread):
 class IMUSender(WiimoteDataSender):
     """Broadcasting Wiimote accelerator and gyro readings as IMU messages to Topic sensor_data/Imu"""
     
-    def __init__(self, wiiMote, freq=100):
+    def __init__(self, wiiMote, freq=100, scheduler=None):
         """Initializes the Wiimote IMU publisher.
     
         Parameters:
             wiiMote: a bluetooth-connected, calibrated WIIMote instance
             freq:    the message sending frequency in messages/sec. Max is 100, because
                      the Wiimote only samples the sensors at 100Hz.
+            scheduler: FixedRateScheduler shared by the node's senders (optional)
         """
         
-        WiimoteDataSender.__init__(self, wiiMote, freq)
+        WiimoteDataSender.__init__(self, wiiMote, freq, topic='imu/data', scheduler=scheduler)
         
-        self.pub = rospy.Publisher('imu/data', Imu, queue_size=1)
+        self.pub = rospy.Publisher('imu/data', Imu, subscriber_listener=self.gate, queue_size=1)
         
     def run(self):
         """Loop that obtains the latest wiimote state, publishes the IMU data, and sleeps.
@@ -238,7 +432,8 @@ class IMUSender(WiimoteDataSender):
         these quantities, the IMU message format also wants the corresponding
         covariance matrix.
         
-        Wiimote only gives us acceleration and angular rate. So we ensure that the orientation
+        Wiimote only gives us acceleration and angular rate. Unless the Wiimote
+        instance runs an orientation filter, we ensure that the orientation
         data entry is marked invalid. We do this by setting the first
         entry of its associated covariance matrix to -1. The covariance
         matrices are the 3x3 matrix with the axes' variance in the 
@@ -249,6 +444,8 @@ class IMUSender(WiimoteDataSender):
         self.threadName = "IMU topic Publisher"
         try:
             while not rospy.is_shutdown():
+                if not self.waitForSubscribers():
+                    break
                 (canonicalAccel, canonicalNunchukAccel, canonicalAngleRate) = self.obtainWiimoteData()
                 
                 msg = Imu(header=None,
@@ -274,6 +471,13 @@ class IMUSender(WiimoteDataSender):
                 msg.linear_acceleration.x = canonicalAccel[X]
                 msg.linear_acceleration.y = canonicalAccel[Y]
                 msg.linear_acceleration.z = canonicalAccel[Z]
+
+                # The Wiimote's orientation filter, if enabled, estimated
+                # the orientation of this very sample in the callback thread:
+                if self.wiistate.orientation is not None:
+                    (msg.orientation.x, msg.orientation.y,
+                     msg.orientation.z, msg.orientation.w) = self.wiistate.orientation
+                    msg.orientation_covariance = self.wiistate.orientationCovariance
                 
                 measureTime = self.wiistate.time
                 timeSecs = int(measureTime)
@@ -282,14 +486,14 @@ class IMUSender(WiimoteDataSender):
                 msg.header.stamp.nsecs = timeNSecs
                 
 		try:
-		  self.pub.publish(msg)
+		  self.publish(msg)
 		except rospy.ROSException:
 		  rospy.loginfo("Topic imu/data closed. Shutting down Imu sender.")
 		  exit(0)
                 
                 #rospy.logdebug("IMU state:")
                 #rospy.logdebug("    IMU accel: " + str(canonicalAccel) + "\n    IMU angular rate: " + str(canonicalAngleRate))
-                rospy.sleep(self.sleepDuration)
+                self.ticker.wait()
         except rospy.ROSInterruptException:
             rospy.loginfo("Shutdown request. Shutting down Imu sender.")
             exit(0)
@@ -299,19 +503,20 @@ class JoySender(WiimoteDataSender):
     
     """Broadcasting Wiimote accelerator and gyro readings as Joy(stick) messages to Topic joy"""
     
-    def __init__(self, wiiMote, freq=100):
+    def __init__(self, wiiMote, freq=100, scheduler=None):
         """Initializes the Wiimote Joy(stick) publisher.
     
         Parameters:
             wiiMote: a bluetooth-connected, calibrated WIIMote instance
             freq:    the message sending frequency in messages/sec. Max is 100, because
                      the Wiimote only samples the sensors at 100Hz.
+            scheduler: FixedRateScheduler shared by the node's senders (optional)
         """
         
-        WiimoteDataSender.__init__(self, wiiMote, freq)
+        WiimoteDataSender.__init__(self, wiiMote, freq, topic='joy', scheduler=scheduler)
 
         
-        self.pub = rospy.Publisher('joy', Joy, queue_size=1)
+        self.pub = rospy.Publisher('joy', Joy, subscriber_listener=self.gate, queue_size=1)
         
     def run(self):
         """Loop that obtains the latest wiimote state, publishes the joystick data, and sleeps.
@@ -323,6 +528,8 @@ class JoySender(WiimoteDataSender):
         self.threadName = "Joy topic Publisher"
         try:
             while not rospy.is_shutdown():
+                if not self.waitForSubscribers():
+                    break
                 (canonicalAccel, canonicalNunchukAccel, canonicalAngleRate) = self.obtainWiimoteData()
                 
                 msg = Joy(header=None,
@@ -360,14 +567,14 @@ class JoySender(WiimoteDataSender):
                 msg.header.stamp.nsecs = timeNSecs
                 
 		try:
-		  self.pub.publish(msg)
+		  self.publish(msg)
 		except rospy.ROSException:
 		  rospy.loginfo("Topic wiijoy closed. Shutting down Joy sender.")
 		  exit(0)
 
                 #rospy.logdebug("Joystick state:")
                 #rospy.logdebug("    Joy buttons: " + str(theButtons) + "\n    Joy accel: " + str(canonicalAccel) + "\n    Joy angular rate: " + str(canonicalAngleRate))
-                rospy.sleep(self.sleepDuration)
+                self.ticker.wait()
         except rospy.ROSInterruptException:
             rospy.loginfo("Shutdown request. Shutting down Joy sender.")
             exit(0)
@@ -376,16 +583,17 @@ class NunSender(WiimoteDataSender):
     
     """Broadcasting nunchuk accelerator and joystick readings as Joy(stick) messages to Topic joy"""
     
-    def __init__(self, wiiMote, freq=100):
+    def __init__(self, wiiMote, freq=100, scheduler=None):
         """Initializes the nunchuk Joy(stick) publisher.
     
         Parameters:
             wiiMote: a bluetooth-connected, calibrated WIIMote instance
             freq:    the message sending frequency in messages/sec. Max is 100, because
                      the Wiimote only samples the sensors at 100Hz.
+            scheduler: FixedRateScheduler shared by the node's senders (optional)
         """
         
-        WiimoteDataSender.__init__(self, wiiMote, freq)
+        WiimoteDataSender.__init__(self, wiiMote, freq, topic='/wiimote/nunchuk', scheduler=scheduler)
 
         
         
@@ -402,12 +610,16 @@ class NunSender(WiimoteDataSender):
         self.threadName = "nunchuk Joy topic Publisher"
         try:
             while not rospy.is_shutdown():
-                rospy.sleep(self.sleepDuration)
+                self.ticker.wait()
+                # Until the nunchuk shows up there is no publisher,
+                # and we keep polling for the nunchuk's presence:
+                if self.pub is not None and not self.waitForSubscribers():
+                    break
                 (canonicalAccel, scaledAcc, canonicalAngleRate) = self.obtainWiimoteData()
                 if not self.wiistate.nunchukPresent:
                     continue
                 if self.pub is None:
-                    self.pub = rospy.Publisher('/wiimote/nunchuk', Joy, queue_size=1)
+                    self.pub = rospy.Publisher('/wiimote/nunchuk', Joy, subscriber_listener=self.gate, queue_size=1)
                     rospy.loginfo("Wiimote Nunchuk joystick publisher starting (topic nunchuk).")
                 
                 (joyx, joyy) = self.wiistate.nunchukStick
@@ -430,7 +642,7 @@ class NunSender(WiimoteDataSender):
                 msg.header.stamp.nsecs = timeNSecs
                 
 		try:
-		  self.pub.publish(msg)
+		  self.publish(msg)
 		except rospy.ROSException:
 		  rospy.loginfo("Topic /wiimote/nunchuk closed. Shutting down Nun sender.")
 		  exit(0)
@@ -446,16 +658,17 @@ class ClasSender(WiimoteDataSender):
     
     """Broadcasting Classic Controller joystick readings as Joy(stick) messages to Topic joy"""
     
-    def __init__(self, wiiMote, freq=100):
+    def __init__(self, wiiMote, freq=100, scheduler=None):
         """Initializes the Classic Controller Joy(stick) publisher.
     
         Parameters:
             wiiMote: a bluetooth-connected, calibrated WIIMote instance
             freq:    the message sending frequency in messages/sec. Max is 100, because
                      the Wiimote only samples the sensors at 100Hz.
+            scheduler: FixedRateScheduler shared by the node's senders (optional)
         """
         
-        WiimoteDataSender.__init__(self, wiiMote, freq)
+        WiimoteDataSender.__init__(self, wiiMote, freq, topic='/wiimote/classic', scheduler=scheduler)
 
         # Set 'pub' to none here, and check for none-ness in the
 	# loop below so as not to start this publisher unnecessarily.
@@ -470,13 +683,17 @@ class ClasSender(WiimoteDataSender):
 	self.threadName = "Classic Controller Joy topic Publisher"
         try:
             while not rospy.is_shutdown():
-                rospy.sleep(self.sleepDuration)
+                self.ticker.wait()
+                # Until the classic controller shows up there is no
+                # publisher, and we keep polling for its presence:
+                if self.pub is not None and not self.waitForSubscribers():
+                    break
                 self.obtainWiimoteData()
 		
                 if not self.wiistate.classicPresent:
                     continue
 		if self.pub is None:
-		    self.pub = rospy.Publisher('/wiimote/classic', Joy)
+		    self.pub = rospy.Publisher('/wiimote/classic', Joy, subscriber_listener=self.gate)
 		    rospy.loginfo("Wiimote Classic Controller joystick publisher starting (topic /wiimote/classic).")
 	  
                 (l_joyx, l_joyy) = self.wiistate.classicStickLeft
@@ -526,7 +743,7 @@ class ClasSender(WiimoteDataSender):
                 msg.header.stamp.nsecs = timeNSecs
                 
 		try:
-		  self.pub.publish(msg)
+		  self.publish(msg)
 		except rospy.ROSException:
 		  rospy.loginfo("Topic /wiimote/classic closed. Shutting down Clas sender.")
 		  exit(0)
@@ -542,18 +759,26 @@ class ClasSender(WiimoteDataSender):
 class WiiSender(WiimoteDataSender):
     """Broadcasting complete Wiimote messages to Topic wiimote"""
     
-    def __init__(self, wiiMote, freq=100):
+    def __init__(self, wiiMote, freq=100, scheduler=None):
         """Initializes the full-Wiimote publisher.
     
         Parameters:
             wiiMote: a bluetooth-connected, calibrated WIIMote instance
             freq:    the message sending frequency in messages/sec. Max is 100, because
                      the Wiimote only samples the sensors at 100Hz.
+            scheduler: FixedRateScheduler shared by the node's senders (optional)
         """
         
-        WiimoteDataSender.__init__(self, wiiMote, freq)
+        WiimoteDataSender.__init__(self, wiiMote, freq, topic='/wiimote/state', scheduler=scheduler)
         
-        self.pub = rospy.Publisher('/wiimote/state', State, queue_size=1)
+        self.pub = rospy.Publisher('/wiimote/state', State, subscriber_listener=self.gate, queue_size=1)
+
+        # State messages are packed straight from the WIIState, rather
+        # than filled in field by field and serialized by genpy:
+        self.serializer = StateSerializer(self.linear_acceleration_covariance,
+                                          self.angular_velocity_covariance,
+                                          self.gyroAbsence_covariance,
+                                          self.wiiMote.BATTERY_MAX)
         
     def run(self):
         """Loop that obtains the latest wiimote state, publishes the data, and sleeps.
@@ -571,129 +796,21 @@ class WiiSender(WiimoteDataSender):
         self.threadName = "Wiimote topic Publisher"
         try:
             while not rospy.is_shutdown():
-                rospy.sleep(self.sleepDuration)
+                self.ticker.wait()
+                if not self.waitForSubscribers():
+                    break
                 (canonicalAccel, canonicalNunchukAccel, canonicalAngleRate) = self.obtainWiimoteData()
                 
-                zeroingTimeSecs = int(self.wiiMote.lastZeroingTime)
-                zeroingTimeNSecs = int((self.wiiMote.lastZeroingTime - zeroingTimeSecs) * 10**9)
-                msg = State(header=None,
-                            angular_velocity_zeroed=None,
-                            angular_velocity_raw=None,
-                            angular_velocity_covariance=self.angular_velocity_covariance,
-                            linear_acceleration_zeroed=None,
-                            linear_acceleration_raw=None,
-                            linear_acceleration_covariance=self.linear_acceleration_covariance,
-                            nunchuk_acceleration_zeroed=None,
-                            nunchuk_acceleration_raw=None,
-                            nunchuk_joystick_zeroed=None,
-                            nunchuk_joystick_raw=None,
-                            buttons=[False,False,False,False,False,False,False,False,False,False],
-                            nunchuk_buttons=[False,False],
-                            rumble=False,
-                            LEDs=None,
-                            ir_tracking = None,
-                            raw_battery=None,
-                            percent_battery=None,
-                            zeroing_time=rospy.Time(zeroingTimeSecs, zeroingTimeNSecs),
-                            errors=0)
-                    
-                # If a gyro is plugged into the Wiimote, then note the 
-                # angular velocity in the message, else indicate with
-                # the special gyroAbsence_covariance matrix that angular
-                # velocity is unavailable:      
-                if self.wiistate.motionPlusPresent:
-                    msg.angular_velocity_zeroed.x = canonicalAngleRate[PHI]
-                    msg.angular_velocity_zeroed.y = canonicalAngleRate[THETA]
-                    msg.angular_velocity_zeroed.z = canonicalAngleRate[PSI]
-                    
-                    msg.angular_velocity_raw.x = self.wiistate.angleRateRaw[PHI]
-                    msg.angular_velocity_raw.y = self.wiistate.angleRateRaw[THETA]
-                    msg.angular_velocity_raw.z = self.wiistate.angleRateRaw[PSI]
-                    
-                else:
-                    msg.angular_velocity_covariance = self.gyroAbsence_covariance
-                
-                msg.linear_acceleration_zeroed.x = canonicalAccel[X]
-                msg.linear_acceleration_zeroed.y = canonicalAccel[Y]
-                msg.linear_acceleration_zeroed.z = canonicalAccel[Z]
-                
-                msg.linear_acceleration_raw.x = self.wiistate.accRaw[X]
-                msg.linear_acceleration_raw.y = self.wiistate.accRaw[Y]
-                msg.linear_acceleration_raw.z = self.wiistate.accRaw[Z]
-
-                if self.wiistate.nunchukPresent:
-                    msg.nunchuk_acceleration_zeroed.x = canonicalNunchukAccel[X]
-                    msg.nunchuk_acceleration_zeroed.y = canonicalNunchukAccel[Y]
-                    msg.nunchuk_acceleration_zeroed.z = canonicalNunchukAccel[Z]
-                    
-                    msg.nunchuk_acceleration_raw.x = self.wiistate.nunchukAccRaw[X]
-                    msg.nunchuk_acceleration_raw.y = self.wiistate.nunchukAccRaw[Y]
-                    msg.nunchuk_acceleration_raw.z = self.wiistate.nunchukAccRaw[Z]
-
-                    msg.nunchuk_joystick_zeroed = self.wiistate.nunchukStick
-                    msg.nunchuk_joystick_raw    = self.wiistate.nunchukStickRaw
-                    moreButtons = []
-                    moreButtons.append(self.wiistate.nunchukButtons[BTN_Z])
-                    moreButtons.append(self.wiistate.nunchukButtons[BTN_C])
-                    msg.nunchuk_buttons = moreButtons
-
-                theButtons = []
-                theButtons.append(self.wiistate.buttons[BTN_1])
-                theButtons.append(self.wiistate.buttons[BTN_2])
-                theButtons.append(self.wiistate.buttons[BTN_PLUS])
-                theButtons.append(self.wiistate.buttons[BTN_MINUS])
-                theButtons.append(self.wiistate.buttons[BTN_A])
-                theButtons.append(self.wiistate.buttons[BTN_B])
-                theButtons.append(self.wiistate.buttons[BTN_UP])
-                theButtons.append(self.wiistate.buttons[BTN_DOWN])
-                theButtons.append(self.wiistate.buttons[BTN_LEFT])
-                theButtons.append(self.wiistate.buttons[BTN_RIGHT])
-                theButtons.append(self.wiistate.buttons[BTN_HOME])
-                
-                ledStates = self.wiiMote.getLEDs()
-                for indx in range(len(msg.LEDs)):
-                    if ledStates[indx]: 
-                        msg.LEDs[indx] = True
-                    else:
-                        msg.LEDs[indx] = False
-
-                msg.buttons = theButtons
-
-                msg.raw_battery = self.wiiMote.getBattery()
-                msg.percent_battery = msg.raw_battery * 100./self.wiiMote.BATTERY_MAX
-    
-                irSources = self.wiistate.IRSources
-                
-                for irSensorIndx in range(NUM_IR_SENSORS):
-                    if irSources[irSensorIndx] is not None:
-                        # Did hardware deliver IR source position for this IR sensor?
-                        try:
-                          pos  = irSources[irSensorIndx]['pos']
-                        except KeyError:
-                            # If no position information from this IR sensor, use INVALID for the dimensions:
-                            msg.ir_tracking.append(IrSourceInfo(State.INVALID_FLOAT, State.INVALID_FLOAT, State.INVALID))
-                        # The following else is unusual: its statements are bypassed is except clause had control:
-                        else:
-                            # Have IR position info from this IR sensor. We use the IR_source_info
-                            # message type. Get size (intensity?):
-                            try: 
-                                size = irSources[irSensorIndx]['size']
-                            except KeyError:
-                                # If the driver did not deliver size information, indicate by using INVALID:
-                                size = State.INVALID
-                            lightInfo = IrSourceInfo(pos[0], pos[1], size)
-                            msg.ir_tracking.append(lightInfo)
-                    else:
-                        msg.ir_tracking.append(IrSourceInfo(State.INVALID_FLOAT, State.INVALID_FLOAT, State.INVALID))
-
-                measureTime = self.wiistate.time
-                timeSecs = int(measureTime)
-                timeNSecs = int(abs(timeSecs - measureTime) * 10**9)
-                msg.header.stamp.secs = timeSecs
-                msg.header.stamp.nsecs = timeNSecs
+                msg = self.serializer.fill(self.wiistate,
+                                           canonicalAccel,
+                                           canonicalNunchukAccel,
+                                           canonicalAngleRate,
+                                           self.wiiMote.getLEDs(),
+                                           self.wiiMote.getBattery(),
+                                           self.wiiMote.lastZeroingTime)
                 
 		try:
-		  self.pub.publish(msg)
+		  self.publish(msg)
 		except rospy.ROSException:
 		  rospy.loginfo("Topic /wiimote/state closed. Shutting down Wiimote sender.")
 		  exit(0)
@@ -132,7 +132,8 @@ class WIIMote(object):
   # __init__
   #------------------
 
-  def __init__(self, theSampleRate=0, wiiStateLock=None, gatherCalibrationStats=False):
+  def __init__(self, theSampleRate=0, wiiStateLock=None, gatherCalibrationStats=False, instrumentation=None,
+               orientationFilter=None, stateRing=None):
     """Instantiate a Wiimote driver instance, which controls one physical Wiimote device.
     
     Parameters:
@@ -140,9 +141,24 @@ class WIIMote(object):
             theSampleRate= -1: never
             theSampleRate=  0: as often as possible
             theSampleRate=  x: every x seconds   
+        instrumentation: an instrumentation.Instrumentation instance that
+            collects lock wait and callback timing, or None to disable timing.
+        orientationFilter: an orientation.OrientationFilter instance that is
+            updated with every sample, filling in WIIState.orientation, or
+            None to leave orientation unestimated.
+        stateRing: a shmring.StateRing instance into which every new
+            WIIState is written for same-host readers, or None.
     """
 
     self.lastZeroingTime = 0.
+
+    self.instrumentation = instrumentation
+    if self.instrumentation is not None:
+        self._lockWaitHist = self.instrumentation.histogram('callback_lock_wait')
+        self._callbackHist = self.instrumentation.histogram('callback_duration')
+
+    self.orientationFilter = orientationFilter
+    self.stateRing = stateRing
     
     self.gatherCalibrationStats = gatherCalibrationStats
     if (self.gatherCalibrationStats):
@@ -239,22 +255,59 @@ class WIIMote(object):
     #print state
     now = getTimeStamp()
     if now - self._startTime >= self.sampleRate:
-        # If this Wiimote driver is to synchronize write
-        # access to the wii state variable (which is read from
-        # outside), then acquire the lock that was provided
-        # by the instantiator of this instance:
-        if self.wiiStateLock is not None:
-            self.wiiStateLock.acquire()
         try:
-            self.wiiMoteState = wiistate.WIIState(state, theTime, self.getRumble(), self._wm.state['buttons']);
+            newState = wiistate.WIIState(state, theTime, self.getRumble(), self._wm.state['buttons']);
         except ValueError:
             # A 'Wiimote is closed' error can occur as a race condition
             # as threads close down after a Cnt-C. Catch those and
             # ignore:
-            pass
-        if self.wiiStateLock is not None:
-            self.wiiStateLock.release()
+            newState = None
+        if newState is not None:
+            # Only this callback touches the orientation filter and the
+            # ring, so they run on the new state before it is published,
+            # and readers never wait for them:
+            if self.orientationFilter is not None:
+                self._updateOrientation(newState)
+            # If this Wiimote driver is to synchronize write
+            # access to the wii state variable (which is read from
+            # outside), then acquire the lock that was provided
+            # by the instantiator of this instance:
+            lockStart = getTimeStamp()
+            if self.wiiStateLock is not None:
+                self.wiiStateLock.acquire()
+            if self.instrumentation is not None:
+                self._lockWaitHist.record(getTimeStamp() - lockStart)
+            self.wiiMoteState = newState
+            if self.wiiStateLock is not None:
+                self.wiiStateLock.release()
+            if self.stateRing is not None:
+                self.stateRing.write(newState)
         self._startTime = now
+        if self.instrumentation is not None:
+            self._callbackHist.record(getTimeStamp() - now)
+
+  #----------------------------------------
+  # _updateOrientation
+  #------------------
+
+  def _updateOrientation(self, theState):
+    """Advance the orientation filter by one sample, and attach its estimate to theState."""
+
+    acc = theState.acc
+    if acc is None:
+        return
+    if theState.motionPlusPresent:
+        angleRate = theState.angleRate
+        valid = self.orientationFilter.update(acc[X], acc[Y], acc[Z],
+                                              angleRate[PHI] * GYRO_SCALE_FACTOR,
+                                              angleRate[THETA] * GYRO_SCALE_FACTOR,
+                                              angleRate[PSI] * GYRO_SCALE_FACTOR,
+                                              theState.time)
+    else:
+        valid = self.orientationFilter.update(acc[X], acc[Y], acc[Z], None, None, None, theState.time)
+    if valid:
+        theState.orientation = self.orientationFilter.quaternion()
+        theState.orientationCovariance = self.orientationFilter.covariance
 
   #----------------------------------------
   # _calibrationCallback
@@ -345,6 +398,10 @@ class WIIMote(object):
         self._wiiCallbackStack.pop()
         self.wiiStateLock.release()
 
+    # The gyro bias is about to change; restart orientation estimation:
+    if self.orientationFilter is not None:
+        self.orientationFilter.reset()
+
     # Compute and store basic statistics about the readings:
     self.computeAccStatistics()
     self.computeGyroStatistics()
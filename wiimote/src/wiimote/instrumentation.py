@@ -0,0 +1,174 @@
+from __future__ import absolute_import
+################################################################################
+#
+# File:         instrumentation.py
+# RCS:          $Header: $
+# Description:  Optional latency and jitter instrumentation for the
+#               Wiimote driver and the wiimote_node senders.
+# Language:     Python
+# Package:      N/A
+# Status:       Experimental (Do Not Distribute)
+#
+################################################################################
+
+"""Lightweight timing instrumentation for the Wiimote driver.
+
+All measurements are kept in fixed-size histograms, so recording a
+sample never allocates. Callers hold a reference to an Instrumentation
+instance, or None when instrumentation is disabled. Guarding each
+measurement with 'if instrumentation is not None' keeps the cost of the
+disabled case at a single attribute test.
+
+Samples are recorded on the cwiid callback thread and the sender
+threads, while the diagnostics timer and the SIGUSR1 handler report
+and reset. Each histogram, and the counters, are therefore guarded by
+a lock. The signal handler runs on the main thread, which only spins
+and never records, so it cannot wait on a lock its own thread holds.
+
+Measurement names used by the driver:
+
+   o callback_lock_wait     Time _steadyStateCallback waits for the state lock
+   o callback_duration      Time spent in one _steadyStateCallback invocation
+   o <topic>/lock_wait      Time a sender waits to obtain the latest state
+   o <topic>/snapshot_age   Age of the published Wiimote state at publish time
+   o <topic>/publish        Duration of the publish() call
+   o <topic>/loop_interval  Time between two iterations of a sender loop
+"""
+
+import bisect
+import sys
+import threading
+import time
+
+#----------------------------------------
+# Class LatencyHistogram
+#-----------------------
+
+class LatencyHistogram(object):
+    """Fixed-size histogram of durations in seconds.
+
+    Buckets are spaced logarithmically (factor of two) starting at
+    minValue. The final bucket collects everything beyond the last
+    edge. Percentiles are reported as the upper edge of the bucket
+    in which they fall.
+
+    record, reset and summary may be called from different threads;
+    percentile and mean read without locking.
+    """
+
+    def __init__(self, name, minValue=1e-6, numBuckets=22):
+        self.name = name
+        self.edges = [minValue * (2 ** i) for i in range(numBuckets)]
+        self.counts = [0] * (numBuckets + 1)
+        self.count = 0
+        self.total = 0.
+        self.maxValue = 0.
+        self._lock = threading.Lock()
+
+    def record(self, value):
+        """Add one duration (in seconds) to the histogram."""
+        indx = bisect.bisect_left(self.edges, value)
+        with self._lock:
+            self.counts[indx] += 1
+            self.count += 1
+            self.total += value
+            if value > self.maxValue:
+                self.maxValue = value
+
+    def percentile(self, fraction):
+        """Return the bucket edge below which the given fraction of samples lie."""
+        if self.count == 0:
+            return 0.
+        threshold = fraction * self.count
+        cumulative = 0
+        for indx, bucketCount in enumerate(self.counts):
+            cumulative += bucketCount
+            if cumulative >= threshold:
+                if indx < len(self.edges):
+                    return min(self.edges[indx], self.maxValue)
+                return self.maxValue
+        return self.maxValue
+
+    def mean(self):
+        if self.count == 0:
+            return 0.
+        return self.total / self.count
+
+    def reset(self):
+        with self._lock:
+            for indx in range(len(self.counts)):
+                self.counts[indx] = 0
+            self.count = 0
+            self.total = 0.
+            self.maxValue = 0.
+
+    def summary(self):
+        """Return a list of (key, value) string pairs; durations in milliseconds."""
+        with self._lock:
+            return [('count', str(self.count)),
+                    ('mean_ms', '%.3f' % (self.mean() * 1000.)),
+                    ('p50_ms', '%.3f' % (self.percentile(0.5) * 1000.)),
+                    ('p99_ms', '%.3f' % (self.percentile(0.99) * 1000.)),
+                    ('max_ms', '%.3f' % (self.maxValue * 1000.))]
+
+#----------------------------------------
+# Class Instrumentation
+#----------------------
+
+class Instrumentation(object):
+    """Collection of named latency histograms and event counters.
+
+    Histograms and counters are created when a component registers
+    them (at construction time), so the hot paths only index into
+    existing structures.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.startTime = time.time()
+        self._lock = threading.Lock()
+
+    def histogram(self, name):
+        """Return the histogram with the given name, creating it if needed."""
+        try:
+            return self.histograms[name]
+        except KeyError:
+            hist = LatencyHistogram(name)
+            self.histograms[name] = hist
+            return hist
+
+    def registerCounter(self, name):
+        with self._lock:
+            self.counters.setdefault(name, 0)
+
+    def count(self, name, increment=1):
+        with self._lock:
+            self.counters[name] += increment
+
+    def reset(self):
+        for hist in self.histograms.values():
+            hist.reset()
+        with self._lock:
+            for name in self.counters:
+                self.counters[name] = 0
+        self.startTime = time.time()
+
+    def report(self):
+        """Return a list of (name, [(key, value), ...]) entries, one per histogram/counter."""
+        res = []
+        for name in sorted(self.histograms):
+            res.append((name, self.histograms[name].summary()))
+        with self._lock:
+            if self.counters:
+                res.append(('counters', [(name, str(self.counters[name])) for name in sorted(self.counters)]))
+        return res
+
+    def dump(self, stream=None):
+        """Write a human-readable report of all measurements to stream (default stderr)."""
+        if stream is None:
+            stream = sys.stderr
+        stream.write('Wiimote instrumentation (%.1f seconds):\n' % (time.time() - self.startTime))
+        for (name, values) in self.report():
+            stream.write('  %-32s %s\n' % (name, ' '.join(['%s=%s' % kv for kv in values])))
+        stream.flush()
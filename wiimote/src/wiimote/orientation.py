@@ -0,0 +1,172 @@
+from __future__ import absolute_import
+################################################################################
+#
+# File:         orientation.py
+# RCS:          $Header: $
+# Description:  Incremental orientation estimation from Wiimote
+#               accelerometer and (optional) MotionPlus gyro readings.
+# Language:     Python
+# Package:      N/A
+# Status:       Experimental (Do Not Distribute)
+#
+################################################################################
+
+from math import atan2, cos, sin, sqrt
+
+from .wiimoteConstants import *
+
+#----------------------------------------
+# Class OrientationFilter
+#------------------------
+
+class OrientationFilter(object):
+  """Madgwick-style orientation filter, updated once per Wiimote sample.
+
+  When angular rate is available, the gyro is integrated and the
+  accelerometer gravity direction pulls roll and pitch back with gain
+  beta (the gradient descent step of Madgwick's IMU algorithm). Without
+  a MotionPlus the orientation falls back to the tilt computed from the
+  accelerometer alone, with yaw fixed at zero.
+
+  All filter state is held in plain float attributes, so update() does
+  not allocate. The quaternion is available as (x, y, z, w) through
+  quaternion(); covariance holds the 3x3 row-major roll/pitch/yaw
+  covariance that applies to the most recent update. The covariance
+  lists are constant and shared between updates.
+
+  Public instance variables:
+    o beta         Accelerometer correction gain
+    o covariance   Covariance list for the latest estimate
+  """
+
+  def __init__(self, beta=MADGWICK_BETA):
+    self.beta = beta
+    self.q0 = 1.
+    self.q1 = 0.
+    self.q2 = 0.
+    self.q3 = 0.
+    self._lastTime = None
+    self._initialized = False
+    self.gyroCovariance = [ORIENTATION_TILT_VARIANCE_GYRO, 0., 0.,
+                           0., ORIENTATION_TILT_VARIANCE_GYRO, 0.,
+                           0., 0., ORIENTATION_YAW_VARIANCE]
+    self.tiltCovariance = [ORIENTATION_TILT_VARIANCE_ACC, 0., 0.,
+                           0., ORIENTATION_TILT_VARIANCE_ACC, 0.,
+                           0., 0., ORIENTATION_YAW_VARIANCE]
+    self.covariance = self.tiltCovariance
+
+  #----------------------------------------
+  # reset
+  #----------
+
+  def reset(self):
+    """Forget the current estimate; the next sample re-initializes from the accelerometer."""
+    self._lastTime = None
+    self._initialized = False
+
+  #----------------------------------------
+  # quaternion
+  #----------
+
+  def quaternion(self):
+    """Return the current estimate as an (x, y, z, w) tuple."""
+    return (self.q1, self.q2, self.q3, self.q0)
+
+  #----------------------------------------
+  # update
+  #----------
+
+  def update(self, ax, ay, az, gx, gy, gz, theTime):
+    """Fold one sample into the estimate.
+
+    Parameters:
+        ax, ay, az: accelerometer reading (any unit; only the direction is used)
+        gx, gy, gz: angular rate in radians/sec, or None if no gyro is present
+        theTime:    sample time in seconds
+
+    Return: True if the estimate is valid after this sample.
+    """
+
+    accNorm = sqrt(ax * ax + ay * ay + az * az)
+    if gx is None:
+      self._lastTime = None
+      self._initialized = False
+      if accNorm == 0.:
+        return False
+      self._setFromTilt(ax, ay, az)
+      self.covariance = self.tiltCovariance
+      return True
+
+    lastTime = self._lastTime
+    self._lastTime = theTime
+    if not self._initialized or lastTime is None:
+      if accNorm == 0.:
+        return False
+      self._setFromTilt(ax, ay, az)
+      self._initialized = True
+      self.covariance = self.gyroCovariance
+      return True
+
+    dt = theTime - lastTime
+    if dt <= 0. or dt > MAX_ORIENTATION_FILTER_DT:
+      # Out of order or stale sample: keep the estimate, restart the clock.
+      return True
+
+    q0 = self.q0
+    q1 = self.q1
+    q2 = self.q2
+    q3 = self.q3
+
+    # Rate of change of quaternion from gyroscope:
+    qDot0 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz)
+    qDot1 = 0.5 * (q0 * gx + q2 * gz - q3 * gy)
+    qDot2 = 0.5 * (q0 * gy - q1 * gz + q3 * gx)
+    qDot3 = 0.5 * (q0 * gz + q1 * gy - q2 * gx)
+
+    # Gradient descent step towards the measured gravity direction:
+    if accNorm > 0.:
+      ax /= accNorm
+      ay /= accNorm
+      az /= accNorm
+      s0 = 4. * q0 * q2 * q2 + 2. * q2 * ax + 4. * q0 * q1 * q1 - 2. * q1 * ay
+      s1 = (4. * q1 * q3 * q3 - 2. * q3 * ax + 4. * q0 * q0 * q1 - 2. * q0 * ay - 4. * q1 +
+            8. * q1 * q1 * q1 + 8. * q1 * q2 * q2 + 4. * q1 * az)
+      s2 = (4. * q0 * q0 * q2 + 2. * q0 * ax + 4. * q2 * q3 * q3 - 2. * q3 * ay - 4. * q2 +
+            8. * q2 * q1 * q1 + 8. * q2 * q2 * q2 + 4. * q2 * az)
+      s3 = 4. * q1 * q1 * q3 - 2. * q1 * ax + 4. * q2 * q2 * q3 - 2. * q2 * ay
+      sNorm = sqrt(s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3)
+      if sNorm > 0.:
+        step = self.beta / sNorm
+        qDot0 -= step * s0
+        qDot1 -= step * s1
+        qDot2 -= step * s2
+        qDot3 -= step * s3
+
+    q0 += qDot0 * dt
+    q1 += qDot1 * dt
+    q2 += qDot2 * dt
+    q3 += qDot3 * dt
+    qNorm = sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3)
+    self.q0 = q0 / qNorm
+    self.q1 = q1 / qNorm
+    self.q2 = q2 / qNorm
+    self.q3 = q3 / qNorm
+    self.covariance = self.gyroCovariance
+    return True
+
+  #----------------------------------------
+  # _setFromTilt
+  #----------
+
+  def _setFromTilt(self, ax, ay, az):
+    """Set the quaternion to the roll/pitch implied by gravity, with zero yaw."""
+    roll = atan2(ay, az)
+    pitch = atan2(-ax, sqrt(ay * ay + az * az))
+    cr = cos(roll * 0.5)
+    sr = sin(roll * 0.5)
+    cp = cos(pitch * 0.5)
+    sp = sin(pitch * 0.5)
+    self.q0 = cr * cp
+    self.q1 = sr * cp
+    self.q2 = cr * sp
+    self.q3 = -sr * sp
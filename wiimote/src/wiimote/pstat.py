@@ -106,9 +106,16 @@ from __future__ import print_function
 ##
 ## 11/08/98 ... fixed aput to output large arrays correctly
 
-import stats  # required 3rd party module
+try:
+    import stats  # required 3rd party module
+except ImportError:  # Python 3 has no implicit relative imports
+    from . import stats
 import string, copy
 from types import *
+try:
+    ListType
+except NameError:  # Python 3's types module lacks the builtin aliases
+    ListType, TupleType, IntType, FloatType, StringType = list, tuple, int, float, str
 
 __version__ = 0.4
 
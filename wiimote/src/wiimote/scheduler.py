@@ -0,0 +1,188 @@
+from __future__ import absolute_import
+################################################################################
+#
+# File:         scheduler.py
+# RCS:          $Header: $
+# Description:  Fixed-rate, deadline-based pacing for the wiimote_node
+#               sender loops.
+# Language:     Python
+# Package:      N/A
+# Status:       Experimental (Do Not Distribute)
+#
+################################################################################
+
+"""Deadline-based pacing of periodic loops.
+
+Sleeping a fixed duration after each iteration makes the real period
+the sleep time plus the work time, so the rate drifts with load. A
+Ticker instead sleeps until an absolute deadline that advances by
+exactly one period per iteration.
+
+One FixedRateScheduler is shared by all loops of a node. It hands out
+Tickers whose phases are staggered evenly across the period, so that
+loops running at the same rate do not all wake up at the same moment.
+
+When an iteration finishes after its next deadline has passed (an
+overrun), the catch-up policy decides what happens:
+
+   o CATCHUP_SKIP   Missed deadlines are dropped; the loop waits for
+                    the next deadline in the future.
+   o CATCHUP_BURST  The loop runs immediately, once per missed deadline
+                    (at most maxBurst times), to restore the average rate.
+
+The clock and sleep functions default to wall time; wiimote_node.py
+passes rospy.get_time and rospy.sleep so that /use_sim_time is
+honored. If the clock jumps back by more than a period, as simulated
+time does when a bag restarts, tickers pick their next deadline anew.
+"""
+
+import math
+import threading
+import time
+
+CATCHUP_SKIP = 'skip'
+CATCHUP_BURST = 'burst'
+CATCHUP_POLICIES = (CATCHUP_SKIP, CATCHUP_BURST)
+
+#----------------------------------------
+# Class Ticker
+#-------------
+
+class Ticker(object):
+    """Paces one loop on absolute deadlines. Obtain instances from FixedRateScheduler.ticker().
+
+    Public instance variables:
+       o name       Name of the paced loop (the topic, for senders)
+       o period     Target period in seconds
+       o phase      Offset of this ticker's deadlines within a period
+       o ticks      Number of completed wait() calls
+       o overruns   Number of wait() calls that found their deadline already passed
+       o skipped    Number of deadlines dropped by the skip policy
+    """
+
+    def __init__(self, scheduler, name, period):
+        self.scheduler = scheduler
+        self.name = name
+        self.period = period
+        self.phase = 0.
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0
+        self._nextDeadline = None
+        self._windowStart = None
+        self._windowTicks = 0
+        self._activeTime = 0.
+        self._activeTicks = 0
+
+    def wait(self):
+        """Sleep until the next deadline of this ticker.
+
+        Return: number of deadlines that had already passed when
+        wait() was called (0 when the loop is keeping up).
+        """
+
+        scheduler = self.scheduler
+        now = scheduler.clock()
+        if self._nextDeadline is not None and self._nextDeadline - now > self.period:
+            self.resync() # The clock jumped back.
+        if self._nextDeadline is None:
+            # First deadline after start or resync: the next slot
+            # on this ticker's phase grid that is still ahead.
+            slots = math.floor((now - scheduler.epoch - self.phase) / self.period) + 1
+            self._nextDeadline = scheduler.epoch + self.phase + slots * self.period
+            self._windowStart = None
+
+        delay = self._nextDeadline - now
+        missed = 0
+        if delay > 0.:
+            scheduler.sleep(delay)
+            self._nextDeadline += self.period
+        else:
+            missed = int(-delay // self.period) + 1
+            self.overruns += 1
+            if scheduler.catchup == CATCHUP_BURST and missed <= scheduler.maxBurst:
+                self._nextDeadline += self.period
+            else:
+                self.skipped += missed - 1
+                self._nextDeadline += missed * self.period
+
+        self.ticks += 1
+        if self._windowStart is None:
+            self._windowStart = scheduler.clock()
+            self._windowTicks = 0
+        else:
+            self._windowTicks += 1
+        return missed
+
+    def resync(self):
+        """Forget the current deadline, e.g. after a loop was idle on purpose.
+
+        The idle time then neither counts as an overrun nor lowers the
+        achieved rate.
+        """
+
+        if self._windowStart is not None:
+            self._activeTime += self.scheduler.clock() - self._windowStart
+            self._activeTicks += self._windowTicks
+        self._nextDeadline = None
+        self._windowStart = None
+
+    def achievedRate(self):
+        """Return the average iteration rate (Hz) over the time this ticker was active."""
+
+        activeTime = self._activeTime
+        activeTicks = self._activeTicks
+        if self._windowStart is not None:
+            activeTime += self.scheduler.clock() - self._windowStart
+            activeTicks += self._windowTicks
+        if activeTime <= 0.:
+            return 0.
+        return activeTicks / activeTime
+
+    def summary(self):
+        """Return a list of (key, value) string pairs comparing achieved and target rate."""
+        return [('target_hz', '%.1f' % (1.0 / self.period)),
+                ('achieved_hz', '%.1f' % self.achievedRate()),
+                ('overruns', str(self.overruns)),
+                ('skipped', str(self.skipped))]
+
+#----------------------------------------
+# Class FixedRateScheduler
+#-------------------------
+
+class FixedRateScheduler(object):
+    """Shared time base and catch-up policy for a set of Tickers."""
+
+    def __init__(self, catchup=CATCHUP_SKIP, maxBurst=10, clock=time.time, sleep=time.sleep):
+        if catchup not in CATCHUP_POLICIES:
+            raise ValueError("Catch-up policy must be one of " + str(CATCHUP_POLICIES) + ", not " + repr(catchup))
+        self.catchup = catchup
+        self.maxBurst = maxBurst
+        self.clock = clock
+        self.sleep = sleep
+        self.epoch = clock()
+        self.tickers = []
+        self._lock = threading.Lock()
+
+    def ticker(self, name, freq):
+        """Create a Ticker running at freq Hz.
+
+        Phases of all tickers that have not started waiting yet are
+        spread evenly across their period.
+        """
+
+        self._lock.acquire()
+        try:
+            ticker = Ticker(self, name, 1.0 / freq)
+            self.tickers.append(ticker)
+            numTickers = len(self.tickers)
+            for (indx, other) in enumerate(self.tickers):
+                if other._nextDeadline is None:
+                    other.phase = other.period * indx / numTickers
+            return ticker
+        finally:
+            self._lock.release()
+
+    def report(self):
+        """Return a list of (name, [(key, value), ...]) entries, one per ticker."""
+        return [(ticker.name + '/rate', ticker.summary()) for ticker in self.tickers]
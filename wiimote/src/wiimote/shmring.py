@@ -0,0 +1,241 @@
+from __future__ import absolute_import
+################################################################################
+#
+# File:         shmring.py
+# RCS:          $Header: $
+# Description:  Shared-memory ring of Wiimote states for same-host
+#               consumers.
+# Language:     Python
+# Package:      N/A
+# Status:       Experimental (Do Not Distribute)
+#
+################################################################################
+
+"""Shared-memory ring of Wiimote states.
+
+StateRing writes every WIIState the driver produces into a fixed-layout
+ring of records in a memory-mapped file (usually under /dev/shm).
+Processes on the same host open it with RingReader and read the latest
+state, or all states since the last one they saw, straight from the
+mapping: no system calls, no ROS serialization.
+
+The layout is the same as that of the ps3joy driver's rings, so a
+reader written for one reads the other. The wiimote and ps3joy
+packages do not depend on each other, so each keeps its own copy of
+the ring code; test_shmring in both packages pins the layout byte for
+byte, and a change to it has to be made in both.
+
+  header, 64 bytes, native byte order:
+    0   8s   magic, "JSRING1\\0"
+    8   I    number of slots
+    12  I    slot size in bytes
+    16  Q    head: sequence number of the last complete record (0: none)
+    24  d    time the ring was created
+    32  32s  struct format of the records, NUL padded
+  slots, each slot size bytes:
+    0   Q    sequence number, written before the record
+    8        record
+    -8  Q    sequence number, written after the record
+
+Record n (starting at 1) goes into slot (n - 1) % slots. A reader only
+accepts a slot whose two sequence numbers both match the record it
+expects, so a record overwritten while being read is dropped instead
+of returned torn.
+
+StateRing records are STATE_FORMAT, with the fields of STATE_FIELDS.
+Accelerations are in m/sec^2 and angular rates in radians/sec, as in
+the imu/data messages. Fields of absent extensions are zero, and
+'present' tells which ones are there (PRESENT_* bits).
+"""
+
+import mmap
+import os
+import struct
+import time
+
+from .wiimoteConstants import *
+
+MAGIC = b"JSRING1\0"
+HEADER = struct.Struct("=8sIIQd32s")
+HEAD_OFFSET = 16
+DEFAULT_SLOTS = 256
+_SEQ = struct.Struct("=Q")
+
+STATE_FORMAT = "=dHBB3d3d3d2d4d"
+STATE_FIELDS = ('time', 'buttons', 'present', 'nunchuk_buttons',
+                'acc_x', 'acc_y', 'acc_z',
+                'angular_velocity_x', 'angular_velocity_y', 'angular_velocity_z',
+                'nunchuk_acc_x', 'nunchuk_acc_y', 'nunchuk_acc_z',
+                'nunchuk_stick_x', 'nunchuk_stick_y',
+                'orientation_x', 'orientation_y', 'orientation_z', 'orientation_w')
+
+PRESENT_MOTIONPLUS = 1
+PRESENT_NUNCHUK = 2
+PRESENT_CLASSIC = 4
+PRESENT_ORIENTATION = 8
+
+# Written over the reading fields of every record before the present ones are filled in:
+_NO_READINGS = (0.,) * 15
+
+#----------------------------------------
+# Class RingWriter
+#-----------------
+
+class RingWriter(object):
+    """Creates a ring at path and appends records of recordFormat to it.
+
+    An existing file at path is replaced rather than truncated, so that
+    readers still mapping the previous ring are not disturbed.
+    """
+
+    def __init__(self, path, recordFormat, slots=DEFAULT_SLOTS):
+        self.record = struct.Struct(recordFormat)
+        self.slots = slots
+        self.slotSize = (2 * _SEQ.size + self.record.size + 7) // 8 * 8
+        self.seq = 0
+        size = HEADER.size + slots * self.slotSize
+        tmpPath = "%s.%i.tmp" % (path, os.getpid())
+        fd = os.open(tmpPath, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        HEADER.pack_into(self.map, 0, MAGIC, slots, self.slotSize, 0, time.time(),
+                         recordFormat.encode('ascii'))
+        os.rename(tmpPath, path)
+
+    def write(self, *values):
+        seq = self.seq + 1
+        offset = HEADER.size + (seq - 1) % self.slots * self.slotSize
+        _SEQ.pack_into(self.map, offset, seq)
+        self.record.pack_into(self.map, offset + _SEQ.size, *values)
+        _SEQ.pack_into(self.map, offset + self.slotSize - _SEQ.size, seq)
+        _SEQ.pack_into(self.map, HEAD_OFFSET, seq)
+        self.seq = seq
+
+    def close(self):
+        self.map.close()
+
+#----------------------------------------
+# Class StateRing
+#-----------------
+
+class StateRing(object):
+    """Writes WIIState instances into a RingWriter as STATE_FORMAT records."""
+
+    def __init__(self, path, slots=DEFAULT_SLOTS):
+        self.writer = RingWriter(path, STATE_FORMAT, slots)
+        self._values = [0.] * len(STATE_FIELDS)
+
+    def write(self, wiistate):
+        self.writer.write(*self.fill(wiistate))
+
+    def fill(self, wiistate):
+        """Set the reused record values from wiistate, in place, and return them."""
+        values = self._values
+        values[0] = wiistate.time
+        values[1] = wiistate.buttonStatus
+        present = 0
+        values[3] = 0
+        values[4:19] = _NO_READINGS
+        acc = wiistate.acc
+        if acc is not None:
+            values[4] = acc[X] * EARTH_GRAVITY
+            values[5] = acc[Y] * EARTH_GRAVITY
+            values[6] = acc[Z] * EARTH_GRAVITY
+        if wiistate.motionPlusPresent:
+            present |= PRESENT_MOTIONPLUS
+            angleRate = wiistate.angleRate
+            values[7] = angleRate[PHI] * GYRO_SCALE_FACTOR
+            values[8] = angleRate[THETA] * GYRO_SCALE_FACTOR
+            values[9] = angleRate[PSI] * GYRO_SCALE_FACTOR
+        if wiistate.nunchukPresent:
+            present |= PRESENT_NUNCHUK
+            values[3] = wiistate.nunchukButtonStatus
+            nunchukAcc = wiistate.nunchukAcc
+            values[10] = nunchukAcc[X] * EARTH_GRAVITY
+            values[11] = nunchukAcc[Y] * EARTH_GRAVITY
+            values[12] = nunchukAcc[Z] * EARTH_GRAVITY
+            values[13] = wiistate.nunchukStick[0]
+            values[14] = wiistate.nunchukStick[1]
+        if wiistate.classicPresent:
+            present |= PRESENT_CLASSIC
+        if wiistate.orientation is not None:
+            present |= PRESENT_ORIENTATION
+            values[15:19] = wiistate.orientation
+        values[2] = present
+        return values
+
+    def close(self):
+        self.writer.close()
+
+#----------------------------------------
+# Class RingReader
+#-----------------
+
+class RingReader(object):
+    """Maps a ring read-only and reads its records in place.
+
+    'lost' counts the records that read() could not return because the
+    writer had already overwritten them.
+    """
+
+    def __init__(self, path):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            self.map = mmap.mmap(fd, os.fstat(fd).st_size, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        if len(self.map) < HEADER.size:
+            self.map.close()
+            raise IOError("Not a joystick ring: %s" % path)
+        (magic, self.slots, self.slotSize, head, self.created, recordFormat) = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or len(self.map) < HEADER.size + self.slots * self.slotSize:
+            self.map.close()
+            raise IOError("Not a joystick ring: %s" % path)
+        self.format = recordFormat.rstrip(b"\0").decode('ascii')
+        self.record = struct.Struct(self.format)
+        self.lost = 0
+
+    def head(self):
+        """Sequence number of the last complete record, 0 if none was written."""
+        return _SEQ.unpack_from(self.map, HEAD_OFFSET)[0]
+
+    def get(self, seq):
+        """The values of record seq, or None if it is no longer (or not yet) in the ring."""
+        offset = HEADER.size + (seq - 1) % self.slots * self.slotSize
+        after = _SEQ.unpack_from(self.map, offset + self.slotSize - _SEQ.size)[0]
+        values = self.record.unpack_from(self.map, offset + _SEQ.size)
+        before = _SEQ.unpack_from(self.map, offset)[0]
+        if before != seq or after != seq:
+            return None
+        return values
+
+    def latest(self):
+        """(seq, values) of the newest record, or None if the ring is empty."""
+        while True:
+            seq = self.head()
+            if seq == 0:
+                return None
+            values = self.get(seq)
+            if values is not None:
+                return (seq, values)
+            # The writer lapped the ring during the read; try again.
+
+    def read(self, since=0):
+        """[(seq, values)] of the records after record 'since', oldest first."""
+        head = self.head()
+        first = max(since + 1, head - self.slots + 1)
+        self.lost += max(0, first - since - 1)
+        records = []
+        for seq in range(first, head + 1):
+            values = self.get(seq)
+            if values is None:
+                self.lost += 1
+            else:
+                records.append((seq, values))
+        return records
+
+    def close(self):
+        self.map.close()
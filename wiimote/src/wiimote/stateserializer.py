@@ -0,0 +1,231 @@
+from __future__ import absolute_import
+################################################################################
+#
+# File:         stateserializer.py
+# RCS:          $Header: $
+# Description:  Fast path from WIIState instances to the wire format
+#               of wiimote/State messages.
+# Language:     Python
+# Package:      N/A
+# Status:       Experimental (Do Not Distribute)
+#
+################################################################################
+
+"""Direct serialization of wiimote/State messages.
+
+Building a State message field by field and letting genpy serialize
+it costs far more than the rest of the WiiSender loop. StateSerializer
+instead packs the WIIState readings straight into a reusable bytearray
+laid out exactly like genpy's serialization of State, using
+precompiled struct.Struct layouts.
+
+The result is a SerializedState message. It carries the _type, md5sum
+and message definition of State, so it can be handed to a
+rospy.Publisher of State, or written to a rosbag, in place of a State
+instance. Subscribers and bag readers see an ordinary State message.
+"""
+
+import struct
+from io import BytesIO
+
+import genpy
+from std_msgs.msg import Header
+from wiimote.msg import State
+
+from .wiimoteConstants import *
+
+# Wire layout of State after the header. Sizes are fixed, except for
+# the ir_tracking array, which the driver always fills with one entry
+# per IR sensor:
+_VECTOR3 = struct.Struct('<3d')
+_COVARIANCE = struct.Struct('<9d')
+_NUNCHUK_STICKS = struct.Struct('<2f2f')
+_BUTTONS = struct.Struct('<11B')
+_NUNCHUK_BUTTONS = struct.Struct('<2B')
+_LEDS_AND_RUMBLE = struct.Struct('<4BB')
+_ARRAY_LENGTH = struct.Struct('<I')
+_IR_SOURCE = struct.Struct('<2dq')
+_TAIL = struct.Struct('<2f2IQ')
+
+_HEADER = struct.Struct('<3II')
+
+_ANGULAR_VELOCITY_ZEROED = 0
+_ANGULAR_VELOCITY_RAW = _ANGULAR_VELOCITY_ZEROED + _VECTOR3.size
+_ANGULAR_VELOCITY_COVARIANCE = _ANGULAR_VELOCITY_RAW + _VECTOR3.size
+_LINEAR_ACCELERATION_ZEROED = _ANGULAR_VELOCITY_COVARIANCE + _COVARIANCE.size
+_LINEAR_ACCELERATION_RAW = _LINEAR_ACCELERATION_ZEROED + _VECTOR3.size
+_LINEAR_ACCELERATION_COVARIANCE = _LINEAR_ACCELERATION_RAW + _VECTOR3.size
+_NUNCHUK_ACCELERATION_ZEROED = _LINEAR_ACCELERATION_COVARIANCE + _COVARIANCE.size
+_NUNCHUK_ACCELERATION_RAW = _NUNCHUK_ACCELERATION_ZEROED + _VECTOR3.size
+_NUNCHUK_JOYSTICK = _NUNCHUK_ACCELERATION_RAW + _VECTOR3.size
+_BUTTONS_OFFSET = _NUNCHUK_JOYSTICK + _NUNCHUK_STICKS.size
+_NUNCHUK_BUTTONS_OFFSET = _BUTTONS_OFFSET + _BUTTONS.size
+_LEDS_OFFSET = _NUNCHUK_BUTTONS_OFFSET + _NUNCHUK_BUTTONS.size
+_IR_TRACKING = _LEDS_OFFSET + _LEDS_AND_RUMBLE.size
+_IR_SOURCES = _IR_TRACKING + _ARRAY_LENGTH.size
+_TAIL_OFFSET = _IR_SOURCES + NUM_IR_SENSORS * _IR_SOURCE.size
+_BODY_SIZE = _TAIL_OFFSET + _TAIL.size
+
+# Button bits of the Wiimote, in the order in which the
+# wiimote_node has always published them in State.buttons:
+_BUTTON_MASKS = (BTN_1, BTN_2, BTN_PLUS, BTN_MINUS, BTN_A, BTN_B,
+                 BTN_UP, BTN_DOWN, BTN_LEFT, BTN_RIGHT, BTN_HOME)
+
+_ZERO_VECTOR3 = _VECTOR3.pack(0., 0., 0.)
+
+#----------------------------------------
+# Class SerializedState
+#----------------------
+
+class SerializedState(genpy.Message):
+    """A wiimote/State message whose body is already serialized.
+
+    Public instance variables:
+       o header   std_msgs/Header; seq is filled in by rospy on publish
+       o body     bytearray with the wire format of all fields after the header
+    """
+
+    __slots__ = ['header', 'body']
+    _slot_types = ['std_msgs/Header', 'uint8[]']
+    _type = State._type
+    _md5sum = State._md5sum
+    _full_text = State._full_text
+    _has_header = True
+
+    def __init__(self, body=None):
+        super(SerializedState, self).__init__()
+        self.header = Header()
+        if body is None:
+            body = bytearray(_BODY_SIZE)
+        self.body = body
+
+    def serialize(self, buff):
+        """Write the message in State wire format to buff (file-like)."""
+        header = self.header
+        frameId = header.frame_id
+        if not isinstance(frameId, bytes):
+            frameId = frameId.encode('utf-8')
+        buff.write(_HEADER.pack(header.seq, header.stamp.secs, header.stamp.nsecs, len(frameId)))
+        buff.write(frameId)
+        buff.write(self.body)
+
+    def toState(self):
+        """Return an equivalent, regular State message."""
+        buff = BytesIO()
+        self.serialize(buff)
+        msg = State()
+        msg.deserialize(buff.getvalue())
+        return msg
+
+#----------------------------------------
+# Class StateSerializer
+#----------------------
+
+class StateSerializer(object):
+    """Packs WIIState readings directly into the wire format of wiimote/State.
+
+    Covariances are constant for a given sender, so they are packed
+    once at construction. fill() rewrites the remaining fields in
+    place and returns the same SerializedState instance each time;
+    publish or record it before calling fill() again.
+    """
+
+    def __init__(self, linearAccelerationCovariance, angularVelocityCovariance,
+                 gyroAbsenceCovariance, batteryMax):
+        self.msg = SerializedState()
+        self.batteryMax = batteryMax
+        self._angularVelocityCovariance = _COVARIANCE.pack(*angularVelocityCovariance)
+        self._gyroAbsenceCovariance = _COVARIANCE.pack(*gyroAbsenceCovariance)
+        body = self.msg.body
+        _COVARIANCE.pack_into(body, _LINEAR_ACCELERATION_COVARIANCE, *linearAccelerationCovariance)
+        _ARRAY_LENGTH.pack_into(body, _IR_TRACKING, NUM_IR_SENSORS)
+        self._buttonStatus = None
+
+    #----------------------------------------
+    # fill
+    #----------
+
+    def fill(self, wiistate, canonicalAccel, canonicalNunchukAccel, canonicalAngleRate,
+             ledStates, rawBattery, zeroingTime):
+        """Serialize one Wiimote state.
+
+        Parameters:
+            wiistate:              the WIIState to publish
+            canonicalAccel:        accelerometer reading in m/sec^2
+            canonicalNunchukAccel: nunchuk accelerometer reading in m/sec^2, or None
+            canonicalAngleRate:    gyro reading in radians/sec, or None
+            ledStates:             the four LED states
+            rawBattery:            raw battery reading
+            zeroingTime:           time of the most recent zeroing, in seconds
+
+        Return: SerializedState message, reused by the next call
+        """
+
+        msg = self.msg
+        body = msg.body
+
+        if wiistate.motionPlusPresent:
+            _VECTOR3.pack_into(body, _ANGULAR_VELOCITY_ZEROED,
+                               canonicalAngleRate[PHI], canonicalAngleRate[THETA], canonicalAngleRate[PSI])
+            angleRateRaw = wiistate.angleRateRaw
+            _VECTOR3.pack_into(body, _ANGULAR_VELOCITY_RAW,
+                               angleRateRaw[PHI], angleRateRaw[THETA], angleRateRaw[PSI])
+            body[_ANGULAR_VELOCITY_COVARIANCE:_LINEAR_ACCELERATION_ZEROED] = self._angularVelocityCovariance
+        else:
+            body[_ANGULAR_VELOCITY_ZEROED:_ANGULAR_VELOCITY_RAW] = _ZERO_VECTOR3
+            body[_ANGULAR_VELOCITY_RAW:_ANGULAR_VELOCITY_COVARIANCE] = _ZERO_VECTOR3
+            body[_ANGULAR_VELOCITY_COVARIANCE:_LINEAR_ACCELERATION_ZEROED] = self._gyroAbsenceCovariance
+
+        _VECTOR3.pack_into(body, _LINEAR_ACCELERATION_ZEROED,
+                           canonicalAccel[X], canonicalAccel[Y], canonicalAccel[Z])
+        accRaw = wiistate.accRaw
+        _VECTOR3.pack_into(body, _LINEAR_ACCELERATION_RAW, accRaw[X], accRaw[Y], accRaw[Z])
+
+        if wiistate.nunchukPresent:
+            _VECTOR3.pack_into(body, _NUNCHUK_ACCELERATION_ZEROED,
+                               canonicalNunchukAccel[X], canonicalNunchukAccel[Y], canonicalNunchukAccel[Z])
+            nunchukAccRaw = wiistate.nunchukAccRaw
+            _VECTOR3.pack_into(body, _NUNCHUK_ACCELERATION_RAW,
+                               nunchukAccRaw[X], nunchukAccRaw[Y], nunchukAccRaw[Z])
+            stick = wiistate.nunchukStick
+            stickRaw = wiistate.nunchukStickRaw
+            _NUNCHUK_STICKS.pack_into(body, _NUNCHUK_JOYSTICK, stick[0], stick[1], stickRaw[0], stickRaw[1])
+            nunchukButtons = wiistate.nunchukButtonStatus
+            _NUNCHUK_BUTTONS.pack_into(body, _NUNCHUK_BUTTONS_OFFSET,
+                                       (nunchukButtons & BTN_Z) != 0, (nunchukButtons & BTN_C) != 0)
+        else:
+            body[_NUNCHUK_ACCELERATION_ZEROED:_NUNCHUK_ACCELERATION_RAW] = _ZERO_VECTOR3
+            body[_NUNCHUK_ACCELERATION_RAW:_NUNCHUK_JOYSTICK] = _ZERO_VECTOR3
+            _NUNCHUK_STICKS.pack_into(body, _NUNCHUK_JOYSTICK, 0., 0., 0., 0.)
+            _NUNCHUK_BUTTONS.pack_into(body, _NUNCHUK_BUTTONS_OFFSET, 0, 0)
+
+        # Buttons rarely change between samples:
+        buttonStatus = wiistate.buttonStatus
+        if buttonStatus != self._buttonStatus:
+            _BUTTONS.pack_into(body, _BUTTONS_OFFSET, *[(buttonStatus & mask) != 0 for mask in _BUTTON_MASKS])
+            self._buttonStatus = buttonStatus
+
+        # The rumble field has always been published as False:
+        _LEDS_AND_RUMBLE.pack_into(body, _LEDS_OFFSET,
+                                   bool(ledStates[0]), bool(ledStates[1]), bool(ledStates[2]), bool(ledStates[3]),
+                                   False)
+
+        offset = _IR_SOURCES
+        for irSource in wiistate.IRSources:
+            if irSource is None or 'pos' not in irSource:
+                _IR_SOURCE.pack_into(body, offset, State.INVALID_FLOAT, State.INVALID_FLOAT, State.INVALID)
+            else:
+                pos = irSource['pos']
+                _IR_SOURCE.pack_into(body, offset, pos[0], pos[1], irSource.get('size', State.INVALID))
+            offset += _IR_SOURCE.size
+
+        zeroingTimeSecs = int(zeroingTime)
+        zeroingTimeNSecs = int((zeroingTime - zeroingTimeSecs) * 10**9)
+        _TAIL.pack_into(body, _TAIL_OFFSET, rawBattery, rawBattery * 100. / self.batteryMax,
+                        zeroingTimeSecs, zeroingTimeNSecs, 0)
+
+        measureTime = wiistate.time
+        timeSecs = int(measureTime)
+        msg.header.stamp.secs = timeSecs
+        msg.header.stamp.nsecs = int(abs(timeSecs - measureTime) * 10**9)
+        return msg
@@ -53,6 +53,13 @@ while "print stats.mean.__doc__" will print the doc for the Dispatch
 class.  NUMPY FUNCTIONS ('a' prefix) generally have more argument options
 but should otherwise be consistent with the corresponding list functions.
 
+When NumPy is available, the dispatches of the central tendency, moment,
+variability, correlation and support functions for lists, tuples,
+array.array objects, memoryviews and NumPy arrays go to a fourth set of
+functions with a 'v' prefix (see VECTORIZED FUNCTIONS at the end of the
+module).  These convert their arguments to float64 arrays and compute
+with whole-array operations; the 'l' functions remain as the reference.
+
 Disclaimers:  The function list is obviously incomplete and, worse, the
 functions are not optimized.  All functions have been tested (some more
 so than others), but they are far from bulletproof.  Thus, as with any
@@ -223,9 +230,16 @@ from __future__ import print_function
 ##              changed name of skewness and askewness to skew and askew
 ##              fixed (a)histogram (which sometimes counted points <lowerlimit)
 
-import pstat               # required 3rd party module
+try:
+    import pstat           # required 3rd party module
+except ImportError:        # Python 3 has no implicit relative imports
+    from . import pstat
 import math, string, copy  # required python modules
 from types import *
+try:
+    ListType
+except NameError:          # Python 3's types module lacks the builtin aliases
+    ListType, TupleType, IntType, FloatType, StringType = list, tuple, int, float, str
 
 __version__ = 0.6
 
@@ -845,8 +859,8 @@ Returns: Pearson's r value, two-tailed p-value
     if len(x) != len(y):
         raise ValueError('Input values not paired in pearsonr.  Aborting.')
     n = len(x)
-    x = map(float,x)
-    y = map(float,y)
+    x = list(map(float,x))
+    y = list(map(float,y))
     xmean = mean(x)
     ymean = mean(y)
     r_num = n*(summult(x,y)) - sum(x)*sum(y)
@@ -868,7 +882,7 @@ Returns: Lin's CC
     covar = lcov(x,y)*(len(x)-1)/float(len(x))  # correct denom to n
     xvar = lvar(x)*(len(x)-1)/float(len(x))  # correct denom to n
     yvar = lvar(y)*(len(y)-1)/float(len(y))  # correct denom to n
-    lincc = (2 * covar) / ((xvar+yvar) +((amean(x)-amean(y))**2))
+    lincc = (2 * covar) / ((xvar+yvar) +((lmean(x)-lmean(y))**2))
     return lincc
 
 
@@ -974,8 +988,8 @@ Returns: slope, intercept, r, two-tailed prob, sterr-of-estimate
     if len(x) != len(y):
         raise ValueError('Input values not paired in linregress.  Aborting.')
     n = len(x)
-    x = map(float,x)
-    y = map(float,y)
+    x = list(map(float,x))
+    y = list(map(float,y))
     xmean = mean(x)
     ymean = mean(y)
     r_num = float(n*(summult(x,y)) - sum(x)*sum(y))
@@ -4006,8 +4020,7 @@ Usage:   abetai(a,b,x,verbose=1)
 #######  AANOVA CALCULATIONS  #######
 #####################################
 
- import LinearAlgebra, operator
- LA = LinearAlgebra
+ import operator
 
  def aglm(data,para):
     """
@@ -4521,3 +4534,423 @@ Usage:   afindwithin(data)     data in |Stat format
 
 except ImportError:
  pass
+
+
+##########################################################################
+################   VECTORIZED FUNCTIONS ('v' PREFIX)   ##################
+##########################################################################
+
+## The 'v' functions compute the list statistics with whole-array NumPy
+## operations.  Their dispatches accept lists, tuples, array.array
+## objects, memoryviews and 1D NumPy arrays, convert every sequence
+## argument to a 1D float64 array, and return Python floats (lists for
+## vzs and vcumsum), like the 'l' functions.  NumPy arrays of other
+## shapes, and calls with a dimension or keepdims argument, still go to
+## the 'a' functions.  The 'l' functions are kept as the reference
+## implementations (see test/test_stats.py).  Without NumPy the list
+## dispatches above stay in force.
+
+import array
+
+try:
+    import numpy as N
+except ImportError:
+    N = None
+
+SEQUENCE_TYPES = (ListType, TupleType, array.ArrayType, memoryview)
+
+
+def _asvector(seq):
+    """
+Converts a list, tuple, array.array, memoryview or NumPy array to a 1D
+float64 array, without copying float64 buffers.
+
+Usage:   _asvector(seq)
+"""
+    vector = N.asarray(seq, dtype=N.float64)
+    if vector.ndim != 1:
+        raise ValueError("Vectorized stats functions take 1D sequences, got %i dimensions." % vector.ndim)
+    return vector
+
+
+def _argnames(func):
+    code = func.__code__
+    return code.co_varnames[:code.co_argcount]
+
+
+class ArrayDispatch(Dispatch):
+    """
+A Dispatch that sends lists, tuples, array.array objects, memoryviews
+and 1D NumPy arrays to one vectorized function.  The first 'sequences'
+positional arguments are converted with _asvector; the others and the
+keyword arguments are passed on unchanged.  A NumPy array goes to the
+'a' function instead when one of the sequences is not 1D, when a
+dimension or keepdims argument is given, or when the call does not
+fit the vectorized function.
+"""
+
+    def __init__(self, vfunc, afunc, sequences=1):
+        self._vfunc = vfunc
+        self._afunc = afunc
+        self._sequences = sequences
+        self._vnames = _argnames(vfunc)
+        self._positional = len(self._vnames)
+        for (i, name) in enumerate(_argnames(afunc)):
+            if name in ('dimension', 'keepdims'):
+                self._positional = min(self._positional, i)
+                break
+        Dispatch.__init__(self, (self._convert, SEQUENCE_TYPES),
+                                (self._array, (N.ndarray,)))
+
+    def _convert(self, *args, **kw):
+        n = self._sequences
+        vectors = tuple([_asvector(seq) for seq in args[:n]])
+        return self._vfunc(*vectors + args[n:], **kw)
+
+    def _array(self, *args, **kw):
+        if len(args) > self._positional:
+            return self._afunc(*args, **kw)
+        for name in kw:
+            if name not in self._vnames or name in ('dimension', 'keepdims'):
+                return self._afunc(*args, **kw)
+        for seq in args[:self._sequences]:
+            if N.ndim(seq) != 1:
+                return self._afunc(*args, **kw)
+        return self._convert(*args, **kw)
+
+
+####################################
+#######  CENTRAL TENDENCY  #########
+####################################
+
+def vgeometricmean (x):
+    """
+Geometric mean of the values in vector x, as lgeometricmean.
+
+Usage:   vgeometricmean(x)
+"""
+    return float(N.prod(N.power(x, 1.0/len(x))))
+
+
+def vharmonicmean (x):
+    """
+Harmonic mean of the values in vector x, as lharmonicmean.
+
+Usage:   vharmonicmean(x)
+"""
+    return len(x) / float(N.add.reduce(1.0/x))
+
+
+def vmean (x):
+    """
+Arithmetic mean of the values in vector x, as lmean.
+
+Usage:   vmean(x)
+"""
+    return float(N.add.reduce(x)) / len(x)
+
+
+####################################
+############  MOMENTS  #############
+####################################
+
+def vmoment (x, moment=1):
+    """
+nth moment about the mean of vector x, as lmoment.
+
+Usage:   vmoment(x,moment=1)
+"""
+    if moment == 1:
+        return 0.0
+    deviations = x - vmean(x)
+    return float(N.add.reduce(deviations**moment)) / len(x)
+
+
+def vvariation (x):
+    """
+Coefficient of variation of vector x, as lvariation.
+
+Usage:   vvariation(x)
+"""
+    return 100.0*vsamplestdev(x)/vmean(x)
+
+
+def vskew (x):
+    """
+Skewness of vector x, as lskew.
+
+Usage:   vskew(x)
+"""
+    return vmoment(x,3)/pow(vmoment(x,2),1.5)
+
+
+def vkurtosis (x):
+    """
+Kurtosis of vector x, as lkurtosis.
+
+Usage:   vkurtosis(x)
+"""
+    return vmoment(x,4)/pow(vmoment(x,2),2.0)
+
+
+def vdescribe (x):
+    """
+Descriptive statistics of vector x, as ldescribe.
+
+Usage:   vdescribe(x)
+Returns: n, (min,max), mean, standard deviation, skew, kurtosis
+"""
+    return (len(x), (float(x.min()), float(x.max())), vmean(x), vstdev(x),
+            vskew(x), vkurtosis(x))
+
+
+####################################
+#######  VARIABILITY FUNCS  #########
+####################################
+
+def vsamplevar (x):
+    """
+Variance of vector x with N in the denominator, as lsamplevar.
+
+Usage:   vsamplevar(x)
+"""
+    deviations = x - vmean(x)
+    return float(N.dot(deviations, deviations)) / len(x)
+
+
+def vsamplestdev (x):
+    """
+Standard deviation of vector x with N in the denominator, as lsamplestdev.
+
+Usage:   vsamplestdev(x)
+"""
+    return math.sqrt(vsamplevar(x))
+
+
+def vcov (x, y, keepdims=0):
+    """
+Covariance of vectors x and y with N-1 in the denominator, as lcov
+(which also ignores keepdims).
+
+Usage:   vcov(x,y)
+"""
+    return float(N.dot(x - vmean(x), y - vmean(y))) / (len(x)-1)
+
+
+def vvar (x):
+    """
+Variance of vector x with N-1 in the denominator, as lvar.
+
+Usage:   vvar(x)
+"""
+    deviations = x - vmean(x)
+    return float(N.dot(deviations, deviations)) / (len(x)-1)
+
+
+def vstdev (x):
+    """
+Standard deviation of vector x with N-1 in the denominator, as lstdev.
+
+Usage:   vstdev(x)
+"""
+    return math.sqrt(vvar(x))
+
+
+def vsterr (x):
+    """
+Standard error of vector x with N-1 in the denominator, as lsterr.
+
+Usage:   vsterr(x)
+"""
+    return vstdev(x) / math.sqrt(len(x))
+
+
+def vsem (x):
+    """
+Standard error of the mean of vector x, as lsem.
+
+Usage:   vsem(x)
+"""
+    return vstdev(x) / math.sqrt(len(x))
+
+
+def vz (x, score):
+    """
+z-score of score within vector x, as lz.
+
+Usage:   vz(x,score)
+"""
+    return (score - vmean(x)) / vsamplestdev(x)
+
+
+def vzs (x):
+    """
+z-scores of every value in vector x, as lzs.
+
+Usage:   vzs(x)
+Returns: a list of z-scores
+"""
+    return ((x - vmean(x)) / vsamplestdev(x)).tolist()
+
+
+####################################
+#######  CORRELATION FUNCS  ########
+####################################
+
+def vpearsonr (x, y):
+    """
+Pearson correlation coefficient of vectors x and y and its two-tailed
+probability, as lpearsonr.
+
+Usage:   vpearsonr(x,y)
+Returns: Pearson's r value, two-tailed p-value
+"""
+    TINY = 1.0e-30
+    if len(x) != len(y):
+        raise ValueError('Input values not paired in pearsonr.  Aborting.')
+    n = len(x)
+    r_num = n*vsummult(x,y) - vsum(x)*vsum(y)
+    r_den = math.sqrt((n*vss(x) - vsquare_of_sums(x))*(n*vss(y) - vsquare_of_sums(y)))
+    r = r_num / r_den
+    df = n-2
+    t = r*math.sqrt(df/((1.0-r+TINY)*(1.0+r+TINY)))
+    prob = lbetai(0.5*df,0.5,df/float(df+t*t))
+    return r, prob
+
+
+def vlincc (x, y):
+    """
+Lin's concordance correlation coefficient of vectors x and y, as llincc.
+
+Usage:   vlincc(x,y)
+"""
+    n = len(x)
+    covar = vcov(x,y)*(n-1)/float(n)  # correct denom to n
+    xvar = vsamplevar(x)
+    yvar = vsamplevar(y)
+    return (2 * covar) / ((xvar+yvar) + ((vmean(x)-vmean(y))**2))
+
+
+def vlinregress (x, y):
+    """
+Regression line of vector y on vector x, as llinregress.
+
+Usage:   vlinregress(x,y)
+Returns: slope, intercept, r, two-tailed prob, sterr-of-estimate
+"""
+    TINY = 1.0e-20
+    if len(x) != len(y):
+        raise ValueError('Input values not paired in linregress.  Aborting.')
+    n = len(x)
+    r_num = n*vsummult(x,y) - vsum(x)*vsum(y)
+    x_den = n*vss(x) - vsquare_of_sums(x)
+    r_den = math.sqrt(x_den*(n*vss(y) - vsquare_of_sums(y)))
+    r = r_num / r_den
+    df = n-2
+    t = r*math.sqrt(df/((1.0-r+TINY)*(1.0+r+TINY)))
+    prob = lbetai(0.5*df,0.5,df/(df+t*t))
+    slope = r_num / x_den
+    intercept = vmean(y) - slope*vmean(x)
+    sterrest = math.sqrt(1-r*r)*vsamplestdev(y)
+    return slope, intercept, r, prob, sterrest
+
+
+####################################
+#######  SUPPORT FUNCTIONS  ########
+####################################
+
+def vsum (x):
+    """
+Sum of the values in vector x, as lsum.
+
+Usage:   vsum(x)
+"""
+    return float(N.add.reduce(x))
+
+
+def vcumsum (x):
+    """
+Cumulative sums of the values in vector x, as lcumsum.
+
+Usage:   vcumsum(x)
+Returns: a list
+"""
+    return N.add.accumulate(x).tolist()
+
+
+def vss (x):
+    """
+Sum of the squares of the values in vector x, as lss.
+
+Usage:   vss(x)
+"""
+    return float(N.dot(x, x))
+
+
+def vsummult (x, y):
+    """
+Sum of the element by element products of vectors x and y, as lsummult.
+
+Usage:   vsummult(x,y)
+"""
+    if len(x) != len(y):
+        raise ValueError("Lists not equal length in summult.")
+    return float(N.dot(x, y))
+
+
+def vsumdiffsquared (x, y):
+    """
+Sum of the squared differences of vectors x and y, as lsumdiffsquared.
+
+Usage:   vsumdiffsquared(x,y)
+"""
+    differences = x - y
+    return float(N.dot(differences, differences))
+
+
+def vsquare_of_sums (x):
+    """
+Square of the sum of the values in vector x, as lsquare_of_sums.
+
+Usage:   vsquare_of_sums(x)
+"""
+    s = vsum(x)
+    return s*s
+
+
+if N is not None:
+## CENTRAL TENDENCY:
+    geometricmean = ArrayDispatch(vgeometricmean, ageometricmean)
+    harmonicmean = ArrayDispatch(vharmonicmean, aharmonicmean)
+    mean = ArrayDispatch(vmean, amean)
+
+## MOMENTS:
+    moment = ArrayDispatch(vmoment, amoment)
+    variation = ArrayDispatch(vvariation, avariation)
+    skew = ArrayDispatch(vskew, askew)
+    kurtosis = ArrayDispatch(vkurtosis, akurtosis)
+    describe = ArrayDispatch(vdescribe, adescribe)
+
+## VARIABILITY:
+    samplevar = ArrayDispatch(vsamplevar, asamplevar)
+    samplestdev = ArrayDispatch(vsamplestdev, asamplestdev)
+    cov = ArrayDispatch(vcov, acov, 2)
+    var = ArrayDispatch(vvar, avar)
+    stdev = ArrayDispatch(vstdev, astdev)
+    sterr = ArrayDispatch(vsterr, asterr)
+    sem = ArrayDispatch(vsem, asem)
+    z = ArrayDispatch(vz, az)
+    zs = ArrayDispatch(vzs, azs)
+
+## CORRELATION FCNS:
+    pearsonr = ArrayDispatch(vpearsonr, apearsonr, 2)
+    lincc = ArrayDispatch(vlincc, alincc, 2)
+    linregress = ArrayDispatch(vlinregress, alinregress, 2)
+
+## SUPPORT FUNCTIONS:
+    sum = ArrayDispatch(vsum, asum)
+    cumsum = ArrayDispatch(vcumsum, acumsum)
+    ss = ArrayDispatch(vss, ass)
+    summult = ArrayDispatch(vsummult, asummult, 2)
+    sumdiffsquared = ArrayDispatch(vsumdiffsquared, asumdiffsquared, 2)
+    square_of_sums = ArrayDispatch(vsquare_of_sums, asquare_of_sums)
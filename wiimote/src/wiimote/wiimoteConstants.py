@@ -162,6 +162,24 @@ EARTH_GRAVITY = 9.80665             # m/sec^2
 # in radians/sec.
 GYRO_SCALE_FACTOR = 0.001055997
 
+# Optional orientation estimation (see orientation.py).
+# Gain of the accelerometer correction step in the
+# Madgwick filter. Larger values trust the accelerometer
+# more, and so converge faster but are noisier:
+MADGWICK_BETA = 0.1
+
+# Samples further apart than this many seconds restart
+# the gyro integration instead of integrating across the gap:
+MAX_ORIENTATION_FILTER_DT = 0.5
+
+# Covariance of the orientation estimate in radians^2, for
+# roll/pitch with and without a MotionPlus gyro. Yaw is
+# not observable without a magnetometer, so its variance
+# is reported as very large:
+ORIENTATION_TILT_VARIANCE_GYRO = 0.0025
+ORIENTATION_TILT_VARIANCE_ACC  = 0.01
+ORIENTATION_YAW_VARIANCE       = 1.0e6
+
 # Status type of message from Wii to us:
 WII_MSG_TYPE_STATUS      = 0
 WII_MSG_TYPE_BTN         = 1
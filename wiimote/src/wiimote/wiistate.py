@@ -50,6 +50,7 @@ class WIIState(object):
         o acc              A WIIReading instance containing accelerometer measurement corrected by
                              the calibration information that is stored in the Wiimote
         o accRaw           A WIIReading instance containing accelerometer measurement uncorrected
+        o buttonStatus     Bitmask of the buttons that are being held down (BTN_* bits)
         o buttons          A dictionary for which buttons are being held down. That could be
                              multiple buttons. Keys are:
                                    BTN_1, BTN_2, BTN_PLUS, BTN_MINUS, BTN_A, BTN_B,
@@ -60,6 +61,9 @@ class WIIState(object):
                                    IR1, IR2, IR3, IR4
                            Values are 1/0
         o motionPlusPresent True if a gyro Motion+ is plugged into the Wiimote. Else False
+        o orientation      (x, y, z, w) quaternion from the WIIMote orientation filter,
+                             or None if orientation estimation is disabled
+        o orientationCovariance  Row-major 3x3 roll/pitch/yaw covariance of orientation
 
         o nunchukPresent   True if nunchuk is plugged in. Else False
         o nunchukAccRaw    A WIIReading instance with acceleromoter measurement from the nunchuk (raw values)
@@ -67,6 +71,7 @@ class WIIState(object):
         o nunchukStickRaw  A tuple with the two axes of the joystick on the nunchuk, raw readings
         o nunchukStick     A tuple with the two axes of the joystick on the nunchuk, zeroed to be [-1, 1]
         o nunchukButtons   A dictionary for which nunchuk buttons are down. Keys are BTN_C and BTN_Z
+        o nunchukButtonStatus  Bitmask of the nunchuk buttons that are down (BTN_C, BTN_Z bits)
   
       Public methods:
         o setAccelerometerCalibration   Bias setting for accelerometer. This triplet is used to
@@ -98,6 +103,9 @@ class WIIState(object):
     self.angleRate = None
     self.angleRageRaw = None
     self.motionPlusPresent = False
+    self.orientation = None
+    self.orientationCovariance = None
+    self.buttonStatus = buttonStatus
     self.buttons   = {BTN_1: False, BTN_2: False, BTN_PLUS: False,
                       BTN_MINUS: False, BTN_A: False, BTN_B: False,
                       BTN_UP: False, BTN_DOWN: False, BTN_LEFT: False,
@@ -108,6 +116,7 @@ class WIIState(object):
     self.nunchukStick = None
     self.nunchukStickRaw = None
     self.nunchukButtons = {BTN_C: False, BTN_Z: False}
+    self.nunchukButtonStatus = 0
 
     self.classicPresent = False
     self.classicStickLeft = None
@@ -227,6 +236,7 @@ class WIIState(object):
             self.nunchukStick = [joyx,joyy]
 
             nunButtons = nunChuk['buttons']
+            self.nunchukButtonStatus = nunButtons
             self.nunchukButtons[BTN_C]  = (nunButtons & BTN_C) > 0
             self.nunchukButtons[BTN_Z]  = (nunButtons & BTN_Z) > 0
         continue
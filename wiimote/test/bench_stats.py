@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+################################################################################
+#
+# File:         bench_stats.py
+# RCS:          $Header: $
+# Description:  Times the list ('l') stats functions against the vectorized
+#               dispatches on calibration-sized samples.
+# Language:     Python
+# Package:      N/A
+# Status:       Experimental (Do Not Distribute)
+#
+################################################################################
+
+"""Calls/sec of the list and vectorized stats functions.
+
+Usage: bench_stats.py [<sample size> ...]
+
+The default sizes are one axis of a zeroing run (NUM_ZEROING_READINGS),
+its three axes together, and a ten times longer calibration log. Run
+with the wiimote package on the PYTHONPATH (e.g. from a sourced catkin
+workspace) and NumPy installed.
+"""
+
+from __future__ import print_function
+import array
+import sys
+import timeit
+
+from wiimote import stats
+from wiimote.wiimoteConstants import NUM_ZEROING_READINGS
+from test_stats import calibrationReadings, ListDispatches
+
+FUNCTIONS = [('mean', 1), ('var', 1), ('stdev', 1), ('sem', 1), ('describe', 1),
+             ('zs', 1), ('cov', 2), ('pearsonr', 2), ('linregress', 2), ('summult', 2)]
+
+def callsPerSec(call):
+    elapsed = min(timeit.repeat(call, number=20, repeat=5)) / 20
+    return 1. / elapsed
+
+def readings(size, seed):
+    values = []
+    while len(values) < size:
+        values += calibrationReadings(seed + len(values))
+    return values[:size]
+
+if __name__ == "__main__":
+    if stats.N is None:
+        sys.exit("NumPy is not available; the dispatches use the list functions.")
+    sizes = [int(arg) for arg in sys.argv[1:]] or \
+            [NUM_ZEROING_READINGS, 3 * NUM_ZEROING_READINGS, 10 * NUM_ZEROING_READINGS]
+    print("%-12s %6s %14s %14s %14s %8s %8s" %
+          ("function", "n", "list/s", "dispatch/s", "array('h')/s", "list x", "h x"))
+    for size in sizes:
+        x = readings(size, 0)
+        y = readings(size, 1000)
+        xh = array.array('h', x)
+        yh = array.array('h', y)
+        for (name, sequences) in FUNCTIONS:
+            args = (x, y)[:sequences]
+            argsh = (xh, yh)[:sequences]
+            dispatch = getattr(stats, name)
+            with ListDispatches():
+                before = callsPerSec(lambda: getattr(stats, 'l' + name)(*args))
+            after = callsPerSec(lambda: dispatch(*args))
+            buffered = callsPerSec(lambda: dispatch(*argsh))
+            print("%-12s %6i %14.0f %14.0f %14.0f %7.1fx %7.1fx" %
+                  (name, size, before, after, buffered, after / before, buffered / before))
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+################################################################################
+#
+# File:         test_instrumentation.py
+# RCS:          $Header: $
+# Description:  Checks the latency histograms and the instrumentation
+#               registry: percentiles, the overflow bucket, reset and
+#               reports, also while another thread records.
+# Language:     Python
+# Package:      N/A
+# Status:       Experimental (Do Not Distribute)
+#
+################################################################################
+
+import threading
+import unittest
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from wiimote.instrumentation import LatencyHistogram, Instrumentation
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def setUp(self):
+        # Bucket edges at 1, 2, 4 and 8 ms, then the overflow bucket:
+        self.hist = LatencyHistogram('test', minValue=0.001, numBuckets=4)
+
+    def test_percentiles(self):
+        for value in [0.0005, 0.0015, 0.002, 0.003, 0.005, 0.020]:
+            self.hist.record(value)
+        self.assertEqual(self.hist.counts, [1, 2, 1, 1, 1])
+        self.assertEqual(self.hist.count, 6)
+        self.assertAlmostEqual(self.hist.mean(), 0.032 / 6)
+        self.assertAlmostEqual(self.hist.percentile(1. / 6), 0.001)
+        self.assertAlmostEqual(self.hist.percentile(0.5), 0.002)
+        self.assertAlmostEqual(self.hist.percentile(4. / 6), 0.004)
+        self.assertAlmostEqual(self.hist.percentile(5. / 6), 0.008)
+
+    def test_overflow_bucket(self):
+        self.hist.record(0.0015)
+        self.hist.record(0.5)
+        self.assertEqual(self.hist.counts, [0, 1, 0, 0, 1])
+        self.assertAlmostEqual(self.hist.percentile(0.99), 0.5)
+        self.assertAlmostEqual(self.hist.maxValue, 0.5)
+
+    def test_percentile_capped_by_maximum(self):
+        self.hist.record(0.0015)
+        self.assertAlmostEqual(self.hist.percentile(0.5), 0.0015)
+
+    def test_empty(self):
+        self.assertEqual(self.hist.percentile(0.5), 0.)
+        self.assertEqual(self.hist.mean(), 0.)
+
+    def test_reset(self):
+        for value in [0.0005, 0.003, 0.020]:
+            self.hist.record(value)
+        self.hist.reset()
+        self.assertEqual(self.hist.counts, [0] * 5)
+        self.assertEqual((self.hist.count, self.hist.total, self.hist.maxValue), (0, 0., 0.))
+        self.assertEqual(self.hist.percentile(0.99), 0.)
+        self.hist.record(0.003)
+        self.assertAlmostEqual(self.hist.percentile(0.5), 0.003)
+
+    def test_summary(self):
+        for value in [0.001, 0.003]:
+            self.hist.record(value)
+        self.assertEqual(self.hist.summary(),
+                         [('count', '2'), ('mean_ms', '2.000'), ('p50_ms', '1.000'),
+                          ('p99_ms', '3.000'), ('max_ms', '3.000')])
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.instrumentation = Instrumentation()
+
+    def test_report(self):
+        second = self.instrumentation.histogram('b')
+        first = self.instrumentation.histogram('a')
+        self.assertTrue(self.instrumentation.histogram('b') is second)
+        self.instrumentation.registerCounter('drops')
+        self.instrumentation.count('drops')
+        self.instrumentation.count('drops', 2)
+        first.record(0.001)
+        report = self.instrumentation.report()
+        self.assertEqual([name for (name, values) in report], ['a', 'b', 'counters'])
+        self.assertEqual(report[0][1], first.summary())
+        self.assertEqual(report[2][1], [('drops', '3')])
+        stream = StringIO()
+        self.instrumentation.dump(stream)
+        self.assertTrue('drops=3' in stream.getvalue())
+
+    def test_reset(self):
+        hist = self.instrumentation.histogram('a')
+        hist.record(0.001)
+        self.instrumentation.registerCounter('drops')
+        self.instrumentation.count('drops')
+        startTime = self.instrumentation.startTime
+        self.instrumentation.reset()
+        self.assertEqual(hist.count, 0)
+        self.assertEqual(self.instrumentation.counters, {'drops': 0})
+        self.assertTrue(self.instrumentation.startTime >= startTime)
+
+    def test_reset_while_recording(self):
+        hist = self.instrumentation.histogram('a')
+        self.instrumentation.registerCounter('drops')
+        def recorder():
+            for indx in range(20000):
+                hist.record(0.001 * (indx % 7))
+                self.instrumentation.count('drops')
+        thread = threading.Thread(target=recorder)
+        thread.start()
+        while thread.is_alive():
+            self.instrumentation.report()
+            self.instrumentation.reset()
+        thread.join()
+        self.assertEqual(hist.count, sum(hist.counts))
+        self.assertTrue(hist.count <= 20000)
+        self.assertTrue(self.instrumentation.counters['drops'] <= 20000)
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('wiimote', 'test_instrumentation', TestLatencyHistogram)
+    rosunit.unitrun('wiimote', 'test_instrumentation', TestInstrumentation)
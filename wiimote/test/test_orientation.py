@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+################################################################################
+#
+# File:         test_orientation.py
+# RCS:          $Header: $
+# Description:  Checks the orientation filter: tilt initialization,
+#               convergence to gravity, gyro integration, reset and
+#               the guards against out of order and stale samples.
+# Language:     Python
+# Package:      N/A
+# Status:       Experimental (Do Not Distribute)
+#
+################################################################################
+
+import unittest
+from math import cos, pi, sin
+
+from wiimote.wiimoteConstants import *
+from wiimote.orientation import OrientationFilter
+
+def tiltQuaternion(roll, pitch, yaw=0.):
+    """(x, y, z, w) of the ROS roll/pitch/yaw (fixed axes x, y, z) rotation."""
+    (cr, sr) = (cos(roll / 2.), sin(roll / 2.))
+    (cp, sp) = (cos(pitch / 2.), sin(pitch / 2.))
+    (cy, sy) = (cos(yaw / 2.), sin(yaw / 2.))
+    return (sr * cp * cy - cr * sp * sy,
+            cr * sp * cy + sr * cp * sy,
+            cr * cp * sy - sr * sp * cy,
+            cr * cp * cy + sr * sp * sy)
+
+def gravityReading(roll, pitch):
+    """Accelerometer reading of a device at rest with the given tilt."""
+    return (-sin(pitch), sin(roll) * cos(pitch), cos(roll) * cos(pitch))
+
+def bodyUp(quaternion):
+    """The world z axis in the body frame of quaternion."""
+    (x, y, z, w) = quaternion
+    return (2. * (x * z - w * y), 2. * (y * z + w * x), 1. - 2. * (x * x + y * y))
+
+class TestOrientationFilter(unittest.TestCase):
+
+    def assertQuaternion(self, actual, expected, places=6):
+        # q and -q are the same rotation:
+        sign = 1. if sum(a * e for (a, e) in zip(actual, expected)) >= 0. else -1.
+        for (a, e) in zip(actual, expected):
+            self.assertAlmostEqual(sign * a, e, places)
+
+    def test_tilt_on_first_sample(self):
+        for (roll, pitch) in [(0., 0.), (0.5, 0.), (0., 0.5), (-0.3, 0.7), (2.5, -1.)]:
+            acc = gravityReading(roll, pitch)
+            for gyro in [(None, None, None), (1., 2., 3.)]:
+                filt = OrientationFilter()
+                self.assertTrue(filt.update(acc[X], acc[Y], acc[Z], gyro[0], gyro[1], gyro[2], 10.))
+                self.assertQuaternion(filt.quaternion(), tiltQuaternion(roll, pitch))
+                for (up, a) in zip(bodyUp(filt.quaternion()), acc):
+                    self.assertAlmostEqual(up, a)
+        filt = OrientationFilter()
+        filt.update(0., 0., 9.8, None, None, None, 10.)
+        self.assertTrue(filt.covariance is filt.tiltCovariance)
+        filt.update(0., 0., 9.8, 0., 0., 0., 10.01)
+        self.assertTrue(filt.covariance is filt.gyroCovariance)
+
+    def test_zero_acceleration(self):
+        filt = OrientationFilter()
+        self.assertFalse(filt.update(0., 0., 0., None, None, None, 10.))
+        self.assertFalse(filt.update(0., 0., 0., 0., 0., 0., 10.))
+
+    def test_converges_to_gravity(self):
+        filt = OrientationFilter()
+        filt.update(0., 0., 1., 0., 0., 0., 0.)
+        acc = gravityReading(0.5, -0.3)
+        errors = []
+        for indx in range(1, 1001):
+            filt.update(acc[X], acc[Y], acc[Z], 0., 0., 0., indx * 0.01)
+            errors.append(max(abs(up - a) for (up, a) in zip(bodyUp(filt.quaternion()), acc)))
+        self.assertTrue(errors[0] > 0.4)
+        self.assertTrue(errors[100] < errors[0])
+        # Each step moves by beta * dt, so the estimate settles within a few steps of gravity:
+        self.assertTrue(max(errors[-100:]) < 4. * filt.beta * 0.01)
+
+    def test_integrates_gyro(self):
+        filt = OrientationFilter(beta=0.)
+        filt.update(0., 0., 1., 0., 0., 0., 0.)
+        for indx in range(1, 101):
+            filt.update(0., 0., 1., 0., 0., 0.5, indx * 0.01)
+        self.assertQuaternion(filt.quaternion(), tiltQuaternion(0., 0., 0.5), 3)
+
+        filt = OrientationFilter(beta=0.)
+        filt.update(0., 0., 1., 0., 0., 0., 0.)
+        for indx in range(1, 51):
+            filt.update(0., 0., 1., pi / 2., 0., 0., indx * 0.01)
+        self.assertQuaternion(filt.quaternion(), tiltQuaternion(pi / 4., 0.), 3)
+
+    def test_reset(self):
+        filt = OrientationFilter()
+        filt.update(0., 0., 1., 0., 0., 0., 0.)
+        for indx in range(1, 11):
+            filt.update(0., 0., 1., 0., 0., 1., indx * 0.01)
+        self.assertNotAlmostEqual(filt.quaternion()[Z], 0.)
+        filt.reset()
+        # The first sample after a reset only sets the tilt; its rate is not integrated:
+        filt.update(0., 0., 1., 0., 0., 1., 0.11)
+        self.assertQuaternion(filt.quaternion(), (0., 0., 0., 1.))
+        filt.update(0., 0., 1., 0., 0., 1., 0.12)
+        self.assertQuaternion(filt.quaternion(), tiltQuaternion(0., 0., 0.01), 4)
+
+    def test_out_of_order_samples_are_skipped(self):
+        filt = OrientationFilter(beta=0.)
+        filt.update(0., 0., 1., 0., 0., 0., 1.)
+        self.assertTrue(filt.update(0., 0., 1., 0., 0., 1., 1.))
+        self.assertTrue(filt.update(0., 0., 1., 0., 0., 1., 0.99))
+        self.assertQuaternion(filt.quaternion(), (0., 0., 0., 1.))
+        # The clock restarts at the skipped sample:
+        filt.update(0., 0., 1., 0., 0., 1., 1.)
+        self.assertQuaternion(filt.quaternion(), tiltQuaternion(0., 0., 0.01), 4)
+
+    def test_stale_samples_are_skipped(self):
+        filt = OrientationFilter(beta=0.)
+        filt.update(0., 0., 1., 0., 0., 0., 1.)
+        gap = 1. + MAX_ORIENTATION_FILTER_DT + 0.1
+        self.assertTrue(filt.update(0., 0., 1., 0., 0., 1., gap))
+        self.assertQuaternion(filt.quaternion(), (0., 0., 0., 1.))
+        filt.update(0., 0., 1., 0., 0., 1., gap + 0.01)
+        self.assertQuaternion(filt.quaternion(), tiltQuaternion(0., 0., 0.01), 4)
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('wiimote', 'test_orientation', TestOrientationFilter)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+################################################################################
+#
+# File:         test_scheduler.py
+# RCS:          $Header: $
+# Description:  Checks the deadlines, phase staggering and catch-up
+#               policies of the sender scheduler against a fake clock.
+# Language:     Python
+# Package:      N/A
+# Status:       Experimental (Do Not Distribute)
+#
+################################################################################
+
+import unittest
+
+from wiimote.scheduler import FixedRateScheduler, CATCHUP_SKIP, CATCHUP_BURST
+
+class FakeClock(object):
+    """A clock that only advances when slept on or told to."""
+
+    def __init__(self, now=100.):
+        self.now = now
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, duration):
+        self.sleeps.append(duration)
+        self.now += duration
+
+    def scheduler(self, catchup=CATCHUP_SKIP, maxBurst=10):
+        return FixedRateScheduler(catchup=catchup, maxBurst=maxBurst, clock=self.time, sleep=self.sleep)
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_phases_are_staggered(self):
+        scheduler = self.clock.scheduler()
+        tickers = [scheduler.ticker('topic%i' % indx, 100) for indx in range(4)]
+        for (indx, ticker) in enumerate(tickers):
+            self.assertAlmostEqual(ticker.phase, 0.0025 * indx)
+        for ticker in tickers:
+            ticker.wait()
+            self.assertAlmostEqual((self.clock.now - scheduler.epoch - ticker.phase) / ticker.period,
+                                   round((self.clock.now - scheduler.epoch - ticker.phase) / ticker.period))
+
+    def test_started_tickers_keep_their_phase(self):
+        scheduler = self.clock.scheduler()
+        first = scheduler.ticker('first', 100)
+        second = scheduler.ticker('second', 100)
+        second.wait()
+        third = scheduler.ticker('third', 100)
+        self.assertAlmostEqual(second.phase, 0.005)
+        self.assertAlmostEqual(first.phase, 0.)
+        self.assertAlmostEqual(third.phase, 0.01 * 2 / 3)
+
+    def test_deadlines_do_not_drift_with_work(self):
+        ticker = self.clock.scheduler().ticker('topic', 100)
+        ticker.wait()
+        start = self.clock.now
+        for indx in range(10):
+            self.clock.now += 0.004 # Work done in the loop
+            self.assertEqual(ticker.wait(), 0)
+        self.assertAlmostEqual(self.clock.now - start, 0.1)
+        self.assertAlmostEqual(self.clock.sleeps[-1], 0.006)
+        self.assertEqual(ticker.overruns, 0)
+
+    def test_skip_drops_missed_deadlines(self):
+        ticker = self.clock.scheduler(CATCHUP_SKIP).ticker('topic', 100)
+        ticker.wait()
+        deadline = self.clock.now
+        self.clock.now += 0.025
+        self.assertEqual(ticker.wait(), 2)
+        self.assertEqual((ticker.overruns, ticker.skipped), (1, 1))
+        ticker.wait()
+        self.assertAlmostEqual(self.clock.now, deadline + 0.03)
+
+    def test_burst_catches_up(self):
+        ticker = self.clock.scheduler(CATCHUP_BURST).ticker('topic', 100)
+        ticker.wait()
+        deadline = self.clock.now
+        self.clock.now += 0.025
+        sleeps = len(self.clock.sleeps)
+        self.assertEqual(ticker.wait(), 2)
+        self.assertEqual(ticker.wait(), 1)
+        self.assertEqual(len(self.clock.sleeps), sleeps)
+        self.assertEqual(ticker.wait(), 0)
+        self.assertAlmostEqual(self.clock.now, deadline + 0.03)
+        self.assertEqual(ticker.skipped, 0)
+
+    def test_burst_limit(self):
+        ticker = self.clock.scheduler(CATCHUP_BURST, maxBurst=2).ticker('topic', 100)
+        ticker.wait()
+        self.clock.now += 0.035
+        self.assertEqual(ticker.wait(), 3)
+        self.assertEqual(ticker.skipped, 2)
+
+    def test_clock_jumping_back(self):
+        ticker = self.clock.scheduler().ticker('topic', 100)
+        ticker.wait()
+        self.clock.now -= 50.
+        self.assertEqual(ticker.wait(), 0)
+        self.assertTrue(self.clock.sleeps[-1] <= ticker.period)
+        self.assertEqual(ticker.overruns, 0)
+
+    def test_achieved_rate(self):
+        ticker = self.clock.scheduler().ticker('topic', 50)
+        for indx in range(51):
+            ticker.wait()
+        self.assertAlmostEqual(ticker.achievedRate(), 50.)
+        ticker.resync()
+        self.clock.now += 10. # Idle on purpose
+        ticker.wait()
+        self.assertAlmostEqual(ticker.achievedRate(), 50.)
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, FixedRateScheduler, catchup='later')
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('wiimote', 'test_scheduler', TestScheduler)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+################################################################################
+#
+# File:         test_shmring.py
+# RCS:          $Header: $
+# Description:  Checks the shared-memory ring of Wiimote states: record
+#               contents, sequence numbers, overwritten and torn slots.
+# Language:     Python
+# Package:      N/A
+# Status:       Experimental (Do Not Distribute)
+#
+################################################################################
+
+import os
+import shutil
+import struct
+import tempfile
+import time
+import unittest
+
+from wiimote.wiimoteConstants import *
+from wiimote.wiistate import WIIState
+from wiimote.shmring import RingWriter, RingReader, StateRing
+from wiimote.shmring import STATE_FORMAT, STATE_FIELDS, PRESENT_MOTIONPLUS, PRESENT_NUNCHUK
+
+class TestRing(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'ring')
+        self.writer = RingWriter(self.path, '=dI', slots=4)
+        self.reader = RingReader(self.path)
+
+    def tearDown(self):
+        self.reader.close()
+        self.writer.close()
+        shutil.rmtree(self.dir)
+
+    def test_empty(self):
+        self.assertEqual(self.reader.latest(), None)
+        self.assertEqual(self.reader.read(), [])
+
+    def test_latest_and_read(self):
+        for i in range(3):
+            self.writer.write(float(i), i)
+        self.assertEqual(self.reader.latest(), (3, (2., 2)))
+        self.assertEqual(self.reader.read(since=1), [(2, (1., 1)), (3, (2., 2))])
+
+    def test_overwritten_records_are_lost(self):
+        for i in range(9):
+            self.writer.write(float(i), i)
+        self.assertEqual([seq for (seq, values) in self.reader.read()], [6, 7, 8, 9])
+        self.assertEqual(self.reader.lost, 5)
+
+    def test_torn_slot_is_rejected(self):
+        self.writer.write(1., 1)
+        self.writer.map[64:72] = b'\x07' + b'\0' * 7
+        self.assertEqual(self.reader.get(1), None)
+
+# The ring layout shared with ps3joy_core.shmring: a ring of two slots
+# holding one "=dh" record (1.5, -2). Bytes 24 to 32 hold the creation time.
+SHARED_LAYOUT = (b"JSRING1\0" + struct.pack("=IIQ", 2, 32, 1) + b"\0" * 8 + b"=dh".ljust(32, b"\0") +
+                 struct.pack("=Qdh", 1, 1.5, -2) + b"\0" * 6 + struct.pack("=Q", 1) +
+                 b"\0" * 32)
+
+class TestRingFormat(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'ring')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_layout(self):
+        start = time.time()
+        writer = RingWriter(self.path, '=dh', slots=2)
+        writer.write(1.5, -2)
+        writer.close()
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        self.assertEqual(data[:24] + data[32:], SHARED_LAYOUT[:24] + SHARED_LAYOUT[32:])
+        self.assertTrue(start <= struct.unpack_from('=d', data, 24)[0] <= time.time())
+        with open(self.path, 'wb') as f:
+            f.write(SHARED_LAYOUT)
+        reader = RingReader(self.path)
+        self.assertEqual(reader.latest(), (1, (1.5, -2)))
+        reader.close()
+
+    def test_ps3joy_reads_wiimote_ring(self):
+        try:
+            from ps3joy_core.shmring import ring_reader
+        except ImportError:
+            self.skipTest("ps3joy is not on the path")
+        writer = RingWriter(self.path, '=dh', slots=2)
+        writer.write(1.5, -2)
+        reader = ring_reader(self.path)
+        self.assertEqual(reader.latest(), (1, (1.5, -2)))
+        reader.close()
+        writer.close()
+
+class TestStateRing(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'wiimote')
+        self.ring = StateRing(self.path)
+        self.reader = RingReader(self.path)
+
+    def tearDown(self):
+        self.reader.close()
+        self.ring.close()
+        shutil.rmtree(self.dir)
+
+    def latest(self):
+        (seq, values) = self.reader.latest()
+        return dict(zip(STATE_FIELDS, values))
+
+    def test_wiimote_only(self):
+        wiistate = WIIState([(WII_MSG_TYPE_ACC, (126, 129, 152))], 1262304012.5, False, BTN_A | BTN_HOME)
+        self.ring.write(wiistate)
+        self.assertEqual(self.reader.format, STATE_FORMAT)
+        record = self.latest()
+        self.assertEqual(record['time'], 1262304012.5)
+        self.assertEqual(record['buttons'], BTN_A | BTN_HOME)
+        self.assertEqual(record['present'], 0)
+        expected = wiistate.acc.scale(EARTH_GRAVITY)
+        self.assertAlmostEqual(record['acc_z'], expected[Z])
+        self.assertEqual(record['angular_velocity_x'], 0.)
+
+    def test_extensions_then_bare(self):
+        withExtensions = WIIState([(WII_MSG_TYPE_ACC, (110, 140, 131)),
+                                   (WII_MSG_TYPE_MOTIONPLUS, {'angle_rate': (7993, 8120, 8051)}),
+                                   (WII_MSG_TYPE_NUNCHUK, {'acc': (130, 125, 170),
+                                                           'stick': (200, 31),
+                                                           'buttons': BTN_Z})],
+                                  1262304013.0, False, BTN_1)
+        self.ring.write(withExtensions)
+        record = self.latest()
+        self.assertEqual(record['present'], PRESENT_MOTIONPLUS | PRESENT_NUNCHUK)
+        self.assertAlmostEqual(record['angular_velocity_y'],
+                               withExtensions.angleRate.scale(GYRO_SCALE_FACTOR)[THETA])
+        self.assertEqual(record['nunchuk_buttons'], BTN_Z)
+        self.assertEqual([record['nunchuk_stick_x'], record['nunchuk_stick_y']], withExtensions.nunchukStick)
+        # Extension fields must not leak into the next record:
+        self.ring.write(WIIState([(WII_MSG_TYPE_ACC, (126, 129, 152))], 1262304013.01, False, 0))
+        record = self.latest()
+        self.assertEqual(record['present'], 0)
+        self.assertEqual(record['nunchuk_acc_x'], 0.)
+        self.assertEqual(record['nunchuk_buttons'], 0)
+
+    def test_fill_allocates_no_lists_or_arrays(self):
+        try:
+            import tracemalloc
+            tracemalloc.reset_peak
+        except (ImportError, AttributeError):
+            self.skipTest("tracemalloc.reset_peak needs Python 3.9")
+        wiistate = WIIState([(WII_MSG_TYPE_ACC, (110, 140, 131)),
+                             (WII_MSG_TYPE_MOTIONPLUS, {'angle_rate': (7993, 8120, 8051)}),
+                             (WII_MSG_TYPE_NUNCHUK, {'acc': (130, 125, 170),
+                                                     'stick': (200, 31),
+                                                     'buttons': BTN_Z})],
+                            1262304013.0, False, BTN_1)
+        wiistate.orientation = (0., 0., 0., 1.)
+        values = self.ring.fill(wiistate)
+        tracemalloc.start()
+        try:
+            peaks = []
+            for i in range(20):
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                self.ring.fill(wiistate)
+                peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        finally:
+            tracemalloc.stop()
+        self.assertTrue(self.ring.fill(wiistate) is values)
+        # Only the scalars of the scaled readings, far less than one list of
+        # the 15 reading fields plus three scaled arrays:
+        self.assertTrue(min(peaks) <= 256, peaks)
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('wiimote', 'test_shmring', TestRing)
+    rosunit.unitrun('wiimote', 'test_shmring', TestRingFormat)
+    rosunit.unitrun('wiimote', 'test_shmring', TestStateRing)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+################################################################################
+#
+# File:         test_state_serializer.py
+# RCS:          $Header: $
+# Description:  Checks that StateSerializer output is byte-for-byte
+#               identical to genpy's serialization of wiimote/State.
+# Language:     Python
+# Package:      N/A
+# Status:       Experimental (Do Not Distribute)
+#
+################################################################################
+
+import unittest
+from io import BytesIO
+
+import rospy
+from wiimote.msg import IrSourceInfo
+from wiimote.msg import State
+
+from wiimote.wiimoteConstants import *
+from wiimote.wiistate import WIIState
+from wiimote.stateserializer import StateSerializer
+
+BATTERY_MAX = 208
+
+LINEAR_ACCELERATION_COVARIANCE = [0.0104, 0., 0.,
+                                  0., 0.0089, 0.,
+                                  0., 0., 0.0121]
+ANGULAR_VELOCITY_COVARIANCE = [0.0016, 0., 0.,
+                               0., 0.0019, 0.,
+                               0., 0., 0.0024]
+GYRO_ABSENCE_COVARIANCE = [-1., 0., 0.,
+                           0., 0., 0.,
+                           0., 0., 0.]
+
+def referenceState(wiistate, canonicalAccel, canonicalNunchukAccel, canonicalAngleRate,
+                   ledStates, rawBattery, zeroingTime):
+    """Build a State message field by field, the way WiiSender used to."""
+
+    zeroingTimeSecs = int(zeroingTime)
+    zeroingTimeNSecs = int((zeroingTime - zeroingTimeSecs) * 10**9)
+    msg = State(header=None,
+                angular_velocity_zeroed=None,
+                angular_velocity_raw=None,
+                angular_velocity_covariance=ANGULAR_VELOCITY_COVARIANCE,
+                linear_acceleration_zeroed=None,
+                linear_acceleration_raw=None,
+                linear_acceleration_covariance=LINEAR_ACCELERATION_COVARIANCE,
+                nunchuk_acceleration_zeroed=None,
+                nunchuk_acceleration_raw=None,
+                nunchuk_joystick_zeroed=None,
+                nunchuk_joystick_raw=None,
+                buttons=[False,False,False,False,False,False,False,False,False,False],
+                nunchuk_buttons=[False,False],
+                rumble=False,
+                LEDs=None,
+                ir_tracking = None,
+                raw_battery=None,
+                percent_battery=None,
+                zeroing_time=rospy.Time(zeroingTimeSecs, zeroingTimeNSecs),
+                errors=0)
+
+    if wiistate.motionPlusPresent:
+        msg.angular_velocity_zeroed.x = canonicalAngleRate[PHI]
+        msg.angular_velocity_zeroed.y = canonicalAngleRate[THETA]
+        msg.angular_velocity_zeroed.z = canonicalAngleRate[PSI]
+        msg.angular_velocity_raw.x = wiistate.angleRateRaw[PHI]
+        msg.angular_velocity_raw.y = wiistate.angleRateRaw[THETA]
+        msg.angular_velocity_raw.z = wiistate.angleRateRaw[PSI]
+    else:
+        msg.angular_velocity_covariance = GYRO_ABSENCE_COVARIANCE
+
+    msg.linear_acceleration_zeroed.x = canonicalAccel[X]
+    msg.linear_acceleration_zeroed.y = canonicalAccel[Y]
+    msg.linear_acceleration_zeroed.z = canonicalAccel[Z]
+    msg.linear_acceleration_raw.x = wiistate.accRaw[X]
+    msg.linear_acceleration_raw.y = wiistate.accRaw[Y]
+    msg.linear_acceleration_raw.z = wiistate.accRaw[Z]
+
+    if wiistate.nunchukPresent:
+        msg.nunchuk_acceleration_zeroed.x = canonicalNunchukAccel[X]
+        msg.nunchuk_acceleration_zeroed.y = canonicalNunchukAccel[Y]
+        msg.nunchuk_acceleration_zeroed.z = canonicalNunchukAccel[Z]
+        msg.nunchuk_acceleration_raw.x = wiistate.nunchukAccRaw[X]
+        msg.nunchuk_acceleration_raw.y = wiistate.nunchukAccRaw[Y]
+        msg.nunchuk_acceleration_raw.z = wiistate.nunchukAccRaw[Z]
+        msg.nunchuk_joystick_zeroed = wiistate.nunchukStick
+        msg.nunchuk_joystick_raw = wiistate.nunchukStickRaw
+        msg.nunchuk_buttons = [wiistate.nunchukButtons[BTN_Z], wiistate.nunchukButtons[BTN_C]]
+
+    msg.buttons = [wiistate.buttons[BTN_1], wiistate.buttons[BTN_2],
+                   wiistate.buttons[BTN_PLUS], wiistate.buttons[BTN_MINUS],
+                   wiistate.buttons[BTN_A], wiistate.buttons[BTN_B],
+                   wiistate.buttons[BTN_UP], wiistate.buttons[BTN_DOWN],
+                   wiistate.buttons[BTN_LEFT], wiistate.buttons[BTN_RIGHT],
+                   wiistate.buttons[BTN_HOME]]
+    for indx in range(len(msg.LEDs)):
+        msg.LEDs[indx] = bool(ledStates[indx])
+
+    msg.raw_battery = rawBattery
+    msg.percent_battery = msg.raw_battery * 100./BATTERY_MAX
+
+    for irSource in wiistate.IRSources:
+        if irSource is None or 'pos' not in irSource:
+            msg.ir_tracking.append(IrSourceInfo(State.INVALID_FLOAT, State.INVALID_FLOAT, State.INVALID))
+        else:
+            msg.ir_tracking.append(IrSourceInfo(irSource['pos'][0], irSource['pos'][1],
+                                                irSource.get('size', State.INVALID)))
+
+    timeSecs = int(wiistate.time)
+    msg.header.stamp.secs = timeSecs
+    msg.header.stamp.nsecs = int(abs(timeSecs - wiistate.time) * 10**9)
+    return msg
+
+def serialize(msg, seq):
+    msg.header.seq = seq
+    buff = BytesIO()
+    msg.serialize(buff)
+    return buff.getvalue()
+
+class TestStateSerializer(unittest.TestCase):
+
+    def setUp(self):
+        self.serializer = StateSerializer(LINEAR_ACCELERATION_COVARIANCE,
+                                          ANGULAR_VELOCITY_COVARIANCE,
+                                          GYRO_ABSENCE_COVARIANCE,
+                                          BATTERY_MAX)
+
+    def assertSameWireFormat(self, wiistate, ledStates=(True, False, False, True),
+                             rawBattery=187, zeroingTime=1262304000.125):
+        canonicalAccel = wiistate.acc.scale(EARTH_GRAVITY)
+        canonicalNunchukAccel = None
+        if wiistate.nunchukPresent:
+            canonicalNunchukAccel = wiistate.nunchukAcc.scale(EARTH_GRAVITY)
+        canonicalAngleRate = None
+        if wiistate.motionPlusPresent:
+            canonicalAngleRate = wiistate.angleRate.scale(GYRO_SCALE_FACTOR)
+        args = (wiistate, canonicalAccel, canonicalNunchukAccel, canonicalAngleRate,
+                ledStates, rawBattery, zeroingTime)
+
+        expected = serialize(referenceState(*args), 42)
+        actual = serialize(self.serializer.fill(*args), 42)
+        self.assertEqual(expected, actual)
+
+    def test_wiimote_only(self):
+        wiistate = WIIState([(WII_MSG_TYPE_ACC, (126, 129, 152))],
+                            1262304012.3456, False, 0)
+        self.assertSameWireFormat(wiistate)
+
+    def test_all_extensions(self):
+        wiistate = WIIState([(WII_MSG_TYPE_ACC, (110, 140, 131)),
+                             (WII_MSG_TYPE_IR, [{'pos': (512, 384), 'size': 3},
+                                                {'pos': (100, 700)},
+                                                {},
+                                                None]),
+                             (WII_MSG_TYPE_MOTIONPLUS, {'angle_rate': (7993, 8120, 8051)}),
+                             (WII_MSG_TYPE_NUNCHUK, {'acc': (130, 125, 170),
+                                                     'stick': (200, 31),
+                                                     'buttons': BTN_Z})],
+                            1262304012.9, True, BTN_A | BTN_PLUS | BTN_HOME)
+        self.assertSameWireFormat(wiistate, ledStates=(False, True, True, False))
+
+    def test_reuse(self):
+        # Fields written by an earlier fill() must not leak into the next one:
+        withExtensions = WIIState([(WII_MSG_TYPE_ACC, (110, 140, 131)),
+                                   (WII_MSG_TYPE_MOTIONPLUS, {'angle_rate': (7993, 8120, 8051)}),
+                                   (WII_MSG_TYPE_NUNCHUK, {'acc': (130, 125, 170),
+                                                           'stick': (200, 31),
+                                                           'buttons': BTN_C | BTN_Z})],
+                                  1262304013.01, False, BTN_1 | BTN_LEFT)
+        bare = WIIState([(WII_MSG_TYPE_ACC, (126, 129, 152))],
+                        1262304013.02, False, BTN_2)
+        self.assertSameWireFormat(withExtensions)
+        self.assertSameWireFormat(bare)
+        self.assertSameWireFormat(withExtensions)
+
+    def test_round_trip(self):
+        wiistate = WIIState([(WII_MSG_TYPE_ACC, (126, 129, 152))],
+                            1262304014.5, False, BTN_B)
+        msg = self.serializer.fill(wiistate, wiistate.acc.scale(EARTH_GRAVITY), None, None,
+                                   (True, True, False, False), 100, 0.)
+        state = msg.toState()
+        self.assertEqual(State._type, msg._type)
+        self.assertEqual(state.header.stamp.secs, 1262304014)
+        self.assertEqual(list(state.LEDs), [True, True, False, False])
+        self.assertTrue(state.buttons[5])
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('wiimote', 'test_state_serializer', TestStateSerializer)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+################################################################################
+#
+# File:         test_stats.py
+# RCS:          $Header: $
+# Description:  Checks that the vectorized ('v') stats functions and their
+#               dispatches agree with the list ('l') reference functions
+#               for every supported argument type.
+# Language:     Python
+# Package:      N/A
+# Status:       Experimental (Do Not Distribute)
+#
+################################################################################
+
+import array
+import random
+import unittest
+
+from wiimote import stats
+from wiimote.wiimoteConstants import NUM_ZEROING_READINGS
+
+# Names whose dispatches go to the vectorized functions, with the extra
+# positional arguments to test them with:
+ONE_SEQUENCE = [('geometricmean', ()), ('harmonicmean', ()), ('mean', ()),
+                ('moment', (2,)), ('moment', (3,)), ('moment', (4,)),
+                ('variation', ()), ('skew', ()), ('kurtosis', ()), ('describe', ()),
+                ('samplevar', ()), ('samplestdev', ()), ('var', ()), ('stdev', ()),
+                ('sterr', ()), ('sem', ()), ('z', (130,)), ('zs', ()),
+                ('sum', ()), ('cumsum', ()), ('ss', ()), ('square_of_sums', ())]
+TWO_SEQUENCES = ['cov', 'pearsonr', 'lincc', 'linregress', 'summult', 'sumdiffsquared']
+VECTORIZED = sorted(set([name for (name, args) in ONE_SEQUENCE] + TWO_SEQUENCES))
+
+def calibrationReadings(seed):
+    """Raw accelerometer-like readings, as collected while zeroing."""
+    rng = random.Random(seed)
+    return [int(round(rng.gauss(128, 2))) for i in range(NUM_ZEROING_READINGS)]
+
+class ListDispatches(object):
+    """While active, the vectorized dispatches go to the 'l' functions instead."""
+
+    def __enter__(self):
+        self.saved = dict((n, getattr(stats, n)) for n in VECTORIZED)
+        for n in VECTORIZED:
+            setattr(stats, n, stats.Dispatch((getattr(stats, 'l' + n), (list, tuple))))
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        for (n, dispatch) in self.saved.items():
+            setattr(stats, n, dispatch)
+
+def listReference(name, *args):
+    """Call stats.l<name> using only 'l' functions."""
+    with ListDispatches():
+        return getattr(stats, 'l' + name)(*args)
+
+def conversions(values):
+    """The same values as every sequence type the dispatches accept."""
+    result = [list(values), tuple(values),
+              array.array('h', values), array.array('d', values),
+              memoryview(array.array('d', values))]
+    if stats.N is not None:
+        result += [stats.N.array(values, dtype=stats.N.int16),
+                   stats.N.array(values, dtype=stats.N.float64)]
+    return result
+
+@unittest.skipIf(stats.N is None, "NumPy is not available")
+class TestVectorizedStats(unittest.TestCase):
+
+    def setUp(self):
+        self.x = calibrationReadings(0)
+        self.y = [value + reading - 128 for (value, reading) in zip(self.x, calibrationReadings(1))]
+
+    def assertClose(self, actual, expected, message):
+        if isinstance(expected, (list, tuple)):
+            self.assertEqual(len(actual), len(expected), message)
+            for (a, e) in zip(actual, expected):
+                self.assertClose(a, e, message)
+        else:
+            self.assertTrue(abs(actual - expected) <= 1e-9 * max(1., abs(expected)),
+                            "%s: %r != %r" % (message, actual, expected))
+
+    def test_one_sequence(self):
+        for (name, args) in ONE_SEQUENCE:
+            expected = listReference(name, self.x, *args)
+            for seq in conversions(self.x):
+                message = "%s(%s)" % (name, type(seq).__name__)
+                self.assertClose(getattr(stats, name)(seq, *args), expected, message)
+
+    def test_two_sequences(self):
+        for name in TWO_SEQUENCES:
+            expected = listReference(name, self.x, self.y)
+            for (x, y) in zip(conversions(self.x), conversions(self.y)):
+                message = "%s(%s)" % (name, type(x).__name__)
+                self.assertClose(getattr(stats, name)(x, y), expected, message)
+            # The second sequence may be of another type:
+            self.assertClose(getattr(stats, name)(stats.N.array(self.x), tuple(self.y)), expected, name)
+
+    def test_results_are_python_values(self):
+        seq = stats.N.array(self.x, dtype=stats.N.int16)
+        self.assertEqual(type(stats.mean(seq)), float)
+        self.assertEqual(type(stats.zs(seq)), list)
+        self.assertEqual(type(stats.pearsonr(seq, seq)[0]), float)
+
+    def test_known_values(self):
+        self.assertAlmostEqual(stats.var([1, 2, 3, 4]), 5 / 3.)
+        self.assertAlmostEqual(stats.samplevar((1, 2, 3, 4)), 1.25)
+        self.assertEqual(stats.cumsum(array.array('h', [1, 2, 3])), [1., 3., 6.])
+        (slope, intercept, r, prob, sterrest) = stats.linregress([0, 1, 2, 3], [1, 3, 5, 7])
+        self.assertAlmostEqual(slope, 2.)
+        self.assertAlmostEqual(intercept, 1.)
+        self.assertAlmostEqual(r, 1.)
+
+    def test_dispatch_errors(self):
+        self.assertRaises(TypeError, stats.mean, "1234")
+        self.assertRaises(ValueError, stats.mean, [[1, 2], [3, 4]])
+        self.assertRaises(ValueError, stats.pearsonr, [1, 2, 3], [1, 2])
+        self.assertRaises(ValueError, stats.summult, [1, 2, 3], [1, 2])
+
+    def test_multidimensional_arrays(self):
+        a = stats.N.array([[1., 2.], [3., 4.]])
+        self.assertEqual(stats.mean(a), stats.amean(a))
+        self.assertEqual(stats.var(a), stats.avar(a))
+        self.assertEqual(stats.sum(a), 10.)
+        self.assertAlmostEqual(stats.cov(a, a), stats.acov(a, a))
+
+    def test_dimension_arguments(self):
+        a = stats.N.array([[1., 2.], [3., 4.]])
+        self.assertEqual(list(stats.mean(a, 0)), [2., 3.])
+        self.assertEqual(list(stats.mean(a, dimension=1)), [1.5, 3.5])
+        self.assertEqual(stats.mean(a, 1, keepdims=1).shape, (2, 1))
+        self.assertEqual(list(stats.moment(a, 2, 0)), [1., 1.])
+        self.assertEqual(stats.cov(a, a, 0), stats.acov(a, a, 0))
+        x = stats.N.array(self.x, dtype=stats.N.float64)
+        self.assertEqual(stats.mean(x, 0), stats.amean(x, 0))
+        self.assertEqual(stats.stdev(x, dimension=0), stats.astdev(x, dimension=0))
+
+    def test_list_functions_are_kept(self):
+        for name in VECTORIZED:
+            self.assertTrue(callable(getattr(stats, 'l' + name)), name)
+            self.assertTrue(isinstance(getattr(stats, name), stats.ArrayDispatch), name)
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('wiimote', 'test_stats', TestVectorizedStats)